@@ -0,0 +1,547 @@
+"""
+compression.py
+
+Decompression of downloaded FASTA files. The format is detected from the magic bytes of the file
+rather than its extension (gzip, BGZF, zstd, xz and bzip2 are recognized; anything else is taken
+to be plain text), and each format is decompressed with the fastest implementation available:
+a multi-threaded command-line tool when one is on the PATH (pigz, bgzip, zstd, xz -T0, lbzip2),
+otherwise the Python standard library (or the zstandard package for zstd).
+
+Blocked gzip (BGZF) and gzip files made of many members (concatenated .gz files, pigz --independent)
+are inflated in-process on a thread pool when no multi-threaded tool handles them: zlib releases
+the GIL while inflating, so the blocks or members are decompressed in parallel and written out in
+their original order. A plain single-member gzip file cannot be split and is streamed on one thread.
+
+A file can be decompressed to disk, or streamed into another process (makeblastdb reading its
+input from stdin) so the uncompressed FASTA never touches the disk. Either way the throughput
+is measured and reported.
+
+Authors: Paulo Nuin, Adam Wright
+Date: October 2026
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from subprocess import PIPE, Popen
+from typing import IO, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # the zstd command-line tool is used instead when installed
+    zstandard = None
+
+from fasta_tools import HeaderRewriter
+
+COMPRESSED_SUFFIXES = (".gz", ".bgz", ".zst", ".xz", ".bz2")
+CHUNK_SIZE = 1024 * 1024  # bytes copied per read when decompressing
+
+# Magic bytes at the start of each compressed format
+MAGIC = {
+    "gzip": b"\x1f\x8b",
+    "zstd": b"\x28\xb5\x2f\xfd",
+    "xz": b"\xfd7zXZ\x00",
+    "bz2": b"BZh",
+}
+
+THREADS = str(os.cpu_count() or 1)
+
+# In-process parallel inflation of BGZF and multi-member gzip
+PARALLEL_WORKERS = os.cpu_count() or 1
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024  # smaller files are not worth starting a pool for
+BGZF_BATCH = 64  # BGZF blocks (at most 64 KB each) inflated per task
+MAX_MEMBER_BYTES = 32 * 1024 * 1024  # larger gzip members are streamed rather than held in memory
+
+# Command-line decompressors writing to stdout, fastest first, per format
+TOOLS: Dict[str, List[List[str]]] = {
+    "bgzf": [["bgzip", "-dc", "-@", THREADS], ["pigz", "-dc"], ["gzip", "-dc"]],
+    "gzip": [["pigz", "-dc"], ["gzip", "-dc"]],
+    "zstd": [["zstd", "-dcq", "-T" + THREADS]],
+    "xz": [["xz", "-dc", "-T0"]],
+    "bz2": [["lbzip2", "-dc", "-n", THREADS], ["pbzip2", "-dc"], ["bzip2", "-dc"]],
+}
+
+# In-process fallbacks when none of the tools are installed
+OPENERS: Dict[str, Callable[[str], IO[bytes]]] = {
+    "bgzf": lambda path: gzip.open(path, "rb"),
+    "gzip": lambda path: gzip.open(path, "rb"),
+    "xz": lambda path: lzma.open(path, "rb"),
+    "bz2": lambda path: bz2.open(path, "rb"),
+}
+# What the in-process decompressors raise on corrupt input
+CORRUPTION_ERRORS: Tuple[type, ...] = (OSError, EOFError, lzma.LZMAError, zlib.error)
+if zstandard is not None:
+    OPENERS["zstd"] = lambda path: zstandard.ZstdDecompressor().stream_reader(
+        open(path, "rb"), closefd=True
+    )
+    CORRUPTION_ERRORS += (zstandard.ZstdError,)
+
+# Bytes and seconds of all decompressions of the run, per format
+STATS: Dict[str, Dict[str, float]] = {}
+_STATS_LOCK = threading.Lock()
+
+
+class DecompressionError(Exception):
+    """Raised when a file cannot be decompressed."""
+
+
+def detect_format(path: str) -> str:
+    """
+    Identifies the compression of a file by its magic bytes.
+
+    Returns:
+        str: "gzip", "bgzf" (blocked gzip, as written by bgzip), "zstd", "xz", "bz2" or "none"
+    """
+    with open(path, "rb") as f:
+        head = f.read(18)
+    for name, magic in MAGIC.items():
+        if head.startswith(magic):
+            # BGZF is gzip with an extra field holding a "BC" subfield (the block size)
+            if name == "gzip" and len(head) >= 14 and head[3] & 0x04 and head[12:14] == b"BC":
+                return "bgzf"
+            return name
+    return "none"
+
+
+def decompressed_name(name: str) -> str:
+    """Name of a file once decompressed: "genome.fa.gz" becomes "genome.fa"."""
+    for suffix in COMPRESSED_SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def gzip_member_offsets(data: bytes) -> List[int]:
+    """
+    Offsets in data where a gzip member may start: 0, and every later gzip header signature.
+
+    A signature can also occur by chance inside compressed data, so these are only candidates;
+    the real boundaries are where inflating the previous member ends.
+    """
+    offsets = [0]
+    position = data.find(b"\x1f\x8b\x08", 1)
+    while position != -1:
+        # The reserved flag bits of a real header are zero
+        if position + 3 < len(data) and not data[position + 3] & 0xE0:
+            offsets.append(position)
+        position = data.find(b"\x1f\x8b\x08", position + 1)
+    return offsets
+
+
+def _is_multimember(path: str) -> bool:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return len(gzip_member_offsets(data)) > 1
+
+
+def _parallel_method(fmt: str, path: Optional[str]) -> Optional[str]:
+    """"parallel-<fmt>" if path is worth inflating on a thread pool, otherwise None."""
+    if PARALLEL_WORKERS < 2 or fmt not in ("bgzf", "gzip"):
+        return None
+    if path is None or Path(path).stat().st_size < PARALLEL_MIN_BYTES:
+        return None
+    if fmt == "gzip" and not _is_multimember(path):
+        return None
+    return f"parallel-{fmt}"
+
+
+def implementation(fmt: str, path: Optional[str] = None) -> Optional[str]:
+    """
+    Name of the tool or module that decompresses fmt here, or None if nothing can.
+
+    Given the path of the file, a large BGZF or multi-member gzip file is inflated on a thread
+    pool ("parallel-bgzf", "parallel-gzip") unless bgzip, which is multi-threaded itself, is
+    installed.
+    """
+    if fmt == "none":
+        return "copy"
+    tools = [command[0] for command in TOOLS.get(fmt, []) if shutil.which(command[0])]
+    if tools and tools[0] == "bgzip":
+        return "bgzip"
+    parallel = _parallel_method(fmt, path)
+    if parallel is not None:
+        return parallel
+    if tools:
+        return tools[0]
+    if fmt in OPENERS:
+        return f"python-{fmt}"
+    return None
+
+
+def _inflate_bgzf_blocks(data: bytes, blocks: List[Tuple[int, int]]) -> bytes:
+    """Inflates a run of BGZF blocks, given as (start, end) offsets, checking their CRCs."""
+    out = []
+    for start, end in blocks:
+        xlen = struct.unpack_from("<H", data, start + 10)[0]
+        try:
+            inflated = zlib.decompress(data[start + 12 + xlen : end - 8], -15)
+        except zlib.error as e:
+            raise DecompressionError(f"Corrupt BGZF block at offset {start}: {str(e)}") from e
+        crc, size = struct.unpack_from("<II", data, end - 8)
+        if zlib.crc32(inflated) != crc or len(inflated) != size:
+            raise DecompressionError(f"CRC mismatch in BGZF block at offset {start}")
+        out.append(inflated)
+    return b"".join(out)
+
+
+def _bgzf_batches(data: bytes) -> Iterator[List[Tuple[int, int]]]:
+    """Walks the BGZF block headers of data, yielding the blocks in batches of BGZF_BATCH."""
+    batch: List[Tuple[int, int]] = []
+    start = 0
+    while start < len(data):
+        if data[start : start + 4] != b"\x1f\x8b\x08\x04" or start + 18 > len(data):
+            raise DecompressionError(f"Not a BGZF block at offset {start}")
+        xlen = struct.unpack_from("<H", data, start + 10)[0]
+        extra = data[start + 12 : start + 12 + xlen]
+        position, block_size = 0, None
+        while position + 4 <= len(extra):
+            length = struct.unpack_from("<H", extra, position + 2)[0]
+            if extra[position : position + 2] == b"BC" and length == 2:
+                block_size = struct.unpack_from("<H", extra, position + 4)[0] + 1
+            position += 4 + length
+        if block_size is None or start + block_size > len(data):
+            raise DecompressionError(f"Truncated BGZF block at offset {start}")
+        batch.append((start, start + block_size))
+        if len(batch) == BGZF_BATCH:
+            yield batch
+            batch = []
+        start += block_size
+    if batch:
+        yield batch
+
+
+def _parallel_bgzf(data: bytes, pool: ThreadPoolExecutor, window: int) -> Iterator[bytes]:
+    pending: deque = deque()
+    for batch in _bgzf_batches(data):
+        pending.append(pool.submit(_inflate_bgzf_blocks, data, batch))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _inflate_member(data: bytes, start: int) -> Optional[Tuple[bytes, int]]:
+    """
+    Inflates the gzip member at start.
+
+    Returns:
+        (content, end offset), or None if no valid member starts there
+    """
+    inflater = zlib.decompressobj(31)
+    out = []
+    position = start
+    try:
+        while not inflater.eof:
+            if position >= len(data):
+                return None
+            chunk = data[position : position + CHUNK_SIZE]
+            position += len(chunk)
+            out.append(inflater.decompress(chunk))
+    except zlib.error:
+        return None
+    return b"".join(out), position - len(inflater.unused_data)
+
+
+def _stream_member(data: bytes, start: int, end: List[int]) -> Iterator[bytes]:
+    """Inflates the gzip member at start piece by piece, storing where it ends in end[0]."""
+    inflater = zlib.decompressobj(31)
+    position = start
+    try:
+        while not inflater.eof:
+            if position >= len(data):
+                raise DecompressionError(f"Truncated gzip member at offset {start}")
+            chunk = data[position : position + CHUNK_SIZE]
+            position += len(chunk)
+            yield inflater.decompress(chunk)
+    except zlib.error as e:
+        raise DecompressionError(f"Corrupt gzip member at offset {start}: {str(e)}") from e
+    end[0] = position - len(inflater.unused_data)
+
+
+def _parallel_gzip(data: bytes, pool: ThreadPoolExecutor, window: int) -> Iterator[bytes]:
+    """
+    Inflates the members of a multi-member gzip file ahead of time on pool, following the chain
+    of real member boundaries and discarding candidates that turn out to be inside a member.
+    """
+    starts = gzip_member_offsets(data)
+    bounds = dict(zip(starts, starts[1:] + [len(data)]))
+    upcoming = deque(starts)
+    futures: Dict[int, object] = {}
+    position = 0
+    while position < len(data):
+        while upcoming and len(futures) < window:
+            start = upcoming.popleft()
+            if start >= position and bounds[start] - start <= MAX_MEMBER_BYTES:
+                futures[start] = pool.submit(_inflate_member, data, start)
+        if position not in bounds:
+            if not data[position:].strip(b"\x00"):
+                break  # zero padding after the last member
+            raise DecompressionError(f"Trailing garbage after gzip member at offset {position}")
+        future = futures.pop(position, None)
+        if future is None:
+            # Too large to hold in memory: inflate it here as the output is consumed
+            end = [position]
+            yield from _stream_member(data, position, end)
+            position = end[0]
+        else:
+            result = future.result()
+            if result is None:
+                raise DecompressionError(f"Corrupt gzip member at offset {position}")
+            content, position = result
+            yield content
+        for start in [start for start in futures if start < position]:
+            futures.pop(start).cancel()
+
+
+def parallel_chunks(path: str, fmt: str, workers: int = PARALLEL_WORKERS) -> Iterator[bytes]:
+    """
+    Decompressed content of a BGZF or multi-member gzip file, in order, inflated on workers threads.
+
+    Raises:
+        DecompressionError: If a block or member is corrupt or the file is truncated
+    """
+    inflate = _parallel_bgzf if fmt == "bgzf" else _parallel_gzip
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inflate") as pool:
+            yield from inflate(data, pool, workers * 2)
+
+
+class _ChunkReader(io.RawIOBase):
+    """Read-only binary stream over an iterator of byte strings."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, b"")
+            if not chunk:
+                return 0
+            self._buffer = memoryview(chunk)
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            self._chunks.close()
+        super().close()
+
+
+class _CheckedReader(io.RawIOBase):
+    """
+    Raw stream over an in-process decompressor that reports corrupt input as
+    DecompressionError. Only the decompressor's reads are checked, so errors of whoever
+    consumes the stream (a closed pipe, say) pass through unchanged.
+    """
+
+    def __init__(self, stream: IO[bytes], path: str, fmt: str):
+        self._stream = stream
+        self._path = path
+        self._format = fmt
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        try:
+            return self._stream.readinto(buffer)
+        except CORRUPTION_ERRORS as e:
+            raise DecompressionError(f"Corrupt {self._format} file {self._path}: {str(e)}") from e
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stream.close()
+        super().close()
+
+
+class DecompressionStats:
+    """What one decompression read and wrote, how, and how fast."""
+
+    def __init__(self, source: str, fmt: str, method: str):
+        self.source = source
+        self.format = fmt
+        self.method = method
+        self.compressed_bytes = Path(source).stat().st_size
+        self.bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Uncompressed bytes produced per second."""
+        return self.bytes / max(self.seconds, 1e-6)
+
+    def describe(self) -> str:
+        return (
+            f"{Path(self.source).name} ({self.format} via {self.method}): "
+            f"{self.compressed_bytes / 1024 / 1024:.1f} MB -> {self.bytes / 1024 / 1024:.1f} MB "
+            f"in {self.seconds:.1f} s ({self.throughput / 1024 / 1024:.1f} MB/s)"
+        )
+
+
+@contextmanager
+def open_decompressed(
+    path: str, fmt: Optional[str] = None, method: Optional[str] = None
+) -> Iterator[IO[bytes]]:
+    """
+    Opens path for reading its decompressed content, with the fastest implementation available
+    (or with method, as returned by implementation()).
+
+    Raises:
+        DecompressionError: If the format cannot be decompressed here, or the tool fails
+    """
+    fmt = fmt or detect_format(path)
+    method = method or implementation(fmt, path)
+    if method is None:
+        raise DecompressionError(f"No decompressor available for {fmt} file {path}")
+
+    if fmt == "none":
+        with open(path, "rb") as stream:
+            yield stream
+        return
+
+    if method.startswith("python-"):
+        stream = io.BufferedReader(_CheckedReader(OPENERS[fmt](path), path, fmt), CHUNK_SIZE)
+        try:
+            yield stream
+        finally:
+            stream.close()
+        return
+
+    if method.startswith("parallel-"):
+        stream = io.BufferedReader(_ChunkReader(parallel_chunks(path, fmt)), CHUNK_SIZE)
+        try:
+            yield stream
+        finally:
+            stream.close()
+        return
+
+    command = next(c for c in TOOLS[fmt] if c[0] == method)
+    process = Popen([*command, path], stdout=PIPE, stderr=PIPE)
+    try:
+        yield process.stdout
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read().decode("utf-8", "replace").strip()
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise DecompressionError(f"{method} failed on {path} ({returncode}): {stderr}")
+
+
+def _record(stats: DecompressionStats) -> None:
+    with _STATS_LOCK:
+        totals = STATS.setdefault(stats.format, {"files": 0, "bytes": 0, "seconds": 0.0})
+        totals["files"] += 1
+        totals["bytes"] += stats.bytes
+        totals["seconds"] += stats.seconds
+
+
+def stream_decompressed(
+    path: str,
+    sink: IO[bytes],
+    edit_header: Optional[Callable[[bytes], bytes]] = None,
+    tap: Optional[Callable[[bytes], None]] = None,
+) -> DecompressionStats:
+    """
+    Writes the decompressed content of path to sink (a file, or the stdin of a process).
+
+    Args:
+        path: Compressed (or plain) FASTA file
+        sink: Binary stream the FASTA is written to
+        edit_header: If given, called with every header line (without its newline) and
+            returns the line to write instead (see fasta_tools.header_editor)
+        tap: If given, called with everything written to sink (e.g. FastaScanner.feed)
+
+    Returns:
+        DecompressionStats: Sizes, method and throughput of the decompression
+    """
+    fmt = detect_format(path)
+    method = implementation(fmt, path)
+    stats = DecompressionStats(path, fmt, method or "none")
+    started = time.monotonic()
+    rewriter = HeaderRewriter(edit_header) if edit_header is not None else None
+    with open_decompressed(path, fmt, method) as stream:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            stats.bytes += len(chunk)
+            if rewriter is not None:
+                chunk = rewriter.feed(chunk)
+            sink.write(chunk)
+            if tap is not None:
+                tap(chunk)
+        if rewriter is not None:
+            last = rewriter.finish()
+            sink.write(last)
+            if tap is not None:
+                tap(last)
+    stats.seconds = time.monotonic() - started
+    _record(stats)
+    return stats
+
+
+def decompress_file(
+    source: str,
+    dest: str,
+    logger,
+    edit_header: Optional[Callable[[bytes], bytes]] = None,
+    remove_source: bool = True,
+    tap: Optional[Callable[[bytes], None]] = None,
+) -> DecompressionStats:
+    """
+    Decompresses source into dest, replacing dest only once it is complete.
+
+    Args:
+        source: Downloaded file
+        dest: Path of the decompressed FASTA
+        logger: Entry-specific logger
+        edit_header: Optional rewrite of header lines (see stream_decompressed)
+        remove_source: Whether to delete source afterwards (as gunzip does)
+        tap: Optional consumer of the decompressed bytes (see stream_decompressed)
+
+    Raises:
+        DecompressionError: If the file is corrupt or cannot be decompressed here
+    """
+    tmp_file = f"{dest}.tmp"
+    try:
+        with open(tmp_file, "wb") as sink:
+            stats = stream_decompressed(source, sink, edit_header, tap)
+        os.replace(tmp_file, dest)
+    except Exception:
+        Path(tmp_file).unlink(missing_ok=True)
+        raise
+    logger.info(f"Decompressed {stats.describe()}")
+    if remove_source and Path(source).resolve() != Path(dest).resolve():
+        # Only this link goes away; a cached copy hardlinked to it is untouched
+        Path(source).unlink()
+    return stats
+
+
+def decompression_stats() -> Dict[str, Dict[str, float]]:
+    """Returns the per-format totals of the run, with their throughput in MB/s."""
+    with _STATS_LOCK:
+        return {
+            fmt: {
+                **totals,
+                "mb_per_s": round(totals["bytes"] / 1024 / 1024 / max(totals["seconds"], 1e-6), 1),
+            }
+            for fmt, totals in STATS.items()
+        }
@@ -10,17 +10,54 @@ Date: Started July 2023, Refactored [Current Date]
 """
 
 import json
+import os
 import re
 import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 from shutil import rmtree
 from subprocess import PIPE, Popen
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import click
 import yaml
 
+from compression import (
+    DecompressionError,
+    decompress_file,
+    decompression_stats,
+    detect_format,
+    open_decompressed,
+    stream_decompressed,
+)
+from download_cache import close_download_cache
+from fasta_tools import (
+    FastaScanner,
+    FastaStats,
+    SeqidChecker,
+    read_seqids,
+    scan_fasta,
+    seqids_of,
+)
+from ftp_sessions import close_ftp_pool
+from http_transfer import close_engine
+from locks import configure_locks, get_lock_manager
+from run_planner import (
+    SHARED_DIR,
+    SharedDownloads,
+    config_json_files,
+    format_bytes,
+    format_seconds,
+    plan_downloads,
+    preflight,
+    provider_json_file,
+    summarize_preflight,
+)
+from mirrors import HedgedDownload, configure_mirrors, entry_sources, rank_sources
+from retry_policy import configure_retries, get_retry_policy
 from terminal import (
     log_error,
     log_success,
@@ -31,30 +68,84 @@ from terminal import (
     print_progress_line,
     print_status,
     show_summary,
+    show_table,
 )
+from transfer_scheduler import TransferScheduler, configure_scheduler, get_scheduler
 from utils import (
-    cleanup_fasta_files,
+    DOWNLOAD_SETTINGS,
+    DOWNLOAD_STATUS,
+    configure_downloads,
     copy_config_file,
     copy_config_to_production,
     copy_to_production,
     extendable_logger,
     get_files_ftp,
     get_files_http,
+    get_files_local,
     get_mod_from_json,
+    get_remote_validators,
+    is_download_cached,
+    local_source,
     s3_sync,
     setup_detailed_logger,
     slack_message,
+    store_fasta_files,
     update_genome_browser_map,
 )
 from validation import DatabaseValidator
+from workspaces import EntryWorkspace, get_workspaces
 
 # Global variables
 SLACK_MESSAGES: List[Dict[str, str]] = []
 FAILURE_DETAILS: List[Dict[str, str]] = []  # Track detailed failure information
 PROCESSED_DATABASES: List[Tuple[str, str]] = []  # Track (MOD, environment) pairs that were processed
+NOT_MODIFIED: List[str] = []  # Entries whose source file is unchanged since the last run
+FASTA_STATS: Dict[str, Dict] = {}  # Scan record of the FASTA of each built entry, by entry name
+SHARED_DOWNLOADS: Optional[SharedDownloads] = None  # Run-wide de-duplication of downloads
+PREFETCH_DIR = "../data/prefetch"  # Scratch space of --prefetch runs, emptied as files are cached
 LOGGER = setup_detailed_logger("create_blast_db", "blast_db_creation.log")
 
 
+def database_path(environment: str, mod: str, config_entry: Dict) -> str:
+    """
+    Returns the directory the BLAST database of an entry is written to.
+
+    Args:
+        environment: The deployment environment (dev, stage, prod)
+        mod: The model organism database identifier
+        config_entry: Configuration dictionary containing database details
+
+    Returns:
+        str: Database directory, ending with a slash
+    """
+    blast_title = config_entry["blast_title"]
+    sanitized_blast_title = re.sub(r"\W+", "_", blast_title).strip("_")
+
+    # SGD main (non-fungal) uses seqcol_type for top-level organization
+    if "seqcol_type" in config_entry:
+        seqcol_type = config_entry['seqcol_type']
+        sanitized_seqcol_type = re.sub(r"\W+", "_", seqcol_type).strip("_")
+        return f"../data/blast/{mod}/{environment}/databases/{sanitized_seqcol_type}/{sanitized_blast_title}/"
+    # Legacy seqcol field (used by some MODs)
+    if "seqcol" in config_entry:
+        return f"../data/blast/{mod}/{environment}/databases/{config_entry['seqcol']}/{sanitized_blast_title}/"
+    # Default: use genus/species organization
+    return (
+        f"../data/blast/{mod}/{environment}/databases/{config_entry['genus']}/{config_entry['species']}/"
+        f"{sanitized_blast_title.replace(' ', '_')}/"
+    )
+
+
+def database_exists(environment: str, mod: str, config_entry: Dict) -> bool:
+    """
+    Checks whether makeblastdb output for an entry is already present.
+    """
+    fasta_file = Path(config_entry["uri"]).name
+    db_name = fasta_file.replace("".join(Path(fasta_file).suffixes), "db")
+    db_dir = Path(database_path(environment, mod, config_entry))
+    return db_dir.is_dir() and any(db_dir.glob(f"{db_name}.*"))
+
+
 def create_db_structure(
     environment: str, mod: str, config_entry: Dict, logger
 ) -> Tuple[str, str]:
@@ -75,27 +166,9 @@ def create_db_structure(
         f"Starting database structure creation for {config_entry['blast_title']}"
     )
 
-    blast_title = config_entry["blast_title"]
-    sanitized_blast_title = re.sub(r"\W+", "_", blast_title).strip("_")
-
     # Determine the path based on config
-    # SGD main (non-fungal) uses seqcol_type for top-level organization
-    if "seqcol_type" in config_entry:
-        seqcol_type = config_entry['seqcol_type']
-        sanitized_seqcol_type = re.sub(r"\W+", "_", seqcol_type).strip("_")
-        db_path = f"../data/blast/{mod}/{environment}/databases/{sanitized_seqcol_type}/{sanitized_blast_title}/"
-        logger.info(f"Using seqcol_type path structure: {db_path}")
-    # Legacy seqcol field (used by some MODs)
-    elif "seqcol" in config_entry:
-        db_path = f"../data/blast/{mod}/{environment}/databases/{config_entry['seqcol']}/{sanitized_blast_title}/"
-        logger.info(f"Using seqcol path structure: {db_path}")
-    # Default: use genus/species organization
-    else:
-        db_path = (
-            f"../data/blast/{mod}/{environment}/databases/{config_entry['genus']}/{config_entry['species']}/"
-            f"{sanitized_blast_title.replace(' ', '_')}/"
-        )
-        logger.info(f"Using species path structure: {db_path}")
+    db_path = database_path(environment, mod, config_entry)
+    logger.info(f"Using database path: {db_path}")
 
     config_path = f"../data/config/{mod}/{environment}"
 
@@ -116,20 +189,101 @@ def create_db_structure(
     return db_path, config_path
 
 
-def run_makeblastdb(config_entry: Dict, output_dir: str, logger, mod_code: str) -> bool:
+def record_fasta_stats(entry: Dict, stats: FastaStats, logger) -> None:
+    """Keeps the scan record of the FASTA of entry for the run summary and logs it."""
+    FASTA_STATS[entry["blast_title"]] = stats.to_dict()
+    logger.info(f"FASTA stats: {stats.describe()}")
+    if stats.error:
+        logger.warning(f"FASTA problem: {stats.error}")
+        print_status(f"FASTA problem: {stats.error}", "warning")
+
+
+def seqids_in_download(path: str) -> Iterator[bytes]:
+    """The sequence IDs of a downloaded (possibly compressed) FASTA file."""
+    with open_decompressed(path) as stream:
+        yield from read_seqids(stream)
+
+
+def stream_into_makeblastdb(
+    command: str,
+    source: str,
+    workspace: EntryWorkspace,
+    logger,
+    scanner: Optional[FastaScanner] = None,
+) -> Tuple[bytes, bytes, int]:
+    """
+    Runs a makeblastdb command reading "-in -" and feeds it the decompressed source.
+
+    Its output goes to files in the workspace rather than pipes, so makeblastdb can never
+    block on a full stdout pipe while it is being fed. A scanner, if given, sees the FASTA
+    on its way in.
+
+    Returns:
+        Tuple of the stdout, stderr and return code of makeblastdb
+    """
+    stdout_file, stderr_file = workspace.file("makeblastdb.out"), workspace.file("makeblastdb.err")
+    failure = b""
+    with open(stdout_file, "wb") as out, open(stderr_file, "wb") as err:
+        p = Popen(command, shell=True, stdin=PIPE, stdout=out, stderr=err)
+        try:
+            stats = stream_decompressed(
+                source, p.stdin, tap=scanner.feed if scanner is not None else None
+            )
+            logger.info(f"Streamed into makeblastdb: {stats.describe()}")
+            print_status(f"Streamed {stats.describe()}", "info")
+        except BrokenPipeError:
+            # makeblastdb quit early; its stderr says why
+            logger.error("makeblastdb stopped reading its input")
+        except DecompressionError as e:
+            logger.error(f"Decompression failed: {str(e)}")
+            failure = f"Decompression failed: {str(e)}\n".encode()
+            p.kill()
+        finally:
+            try:
+                p.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = p.wait()
+    stdout, stderr = Path(stdout_file).read_bytes(), Path(stderr_file).read_bytes()
+    Path(stdout_file).unlink()
+    Path(stderr_file).unlink()
+    return stdout, stderr + failure, returncode
+
+
+def run_makeblastdb(
+    config_entry: Dict,
+    output_dir: str,
+    logger,
+    mod_code: str,
+    workspace: Optional[EntryWorkspace] = None,
+    stream_input: bool = False,
+) -> bool:
     """
-    Runs the makeblastdb command to create a BLAST database.
+    Runs the makeblastdb command to create a BLAST database from the FASTA file in the
+    workspace of the entry.
+
+    With stream_input, the download is decompressed in-process and piped into makeblastdb
+    on stdin, so no uncompressed copy of the FASTA is written to disk.
     """
     start_time = datetime.now()
     fasta_file = Path(config_entry["uri"]).name
-    unzipped_fasta = f"../data/{fasta_file.replace('.gz', '')}"
+    if workspace is None:
+        workspace = get_workspaces().acquire(config_entry, mod_code)
+    unzipped_fasta = workspace.fasta_path
+    # A FASTA decompressed earlier (e.g. kept with --store-files) is streamed as is
+    stream_source = (
+        unzipped_fasta if Path(unzipped_fasta).exists() else workspace.download_path
+    )
 
     logger.info(f"Starting makeblastdb process for {fasta_file}")
     logger.info(f"Configuration: {json.dumps(config_entry, indent=2)}")
 
     try:
-        # Check if unzipped FASTA exists
-        if not Path(unzipped_fasta).exists():
+        # Check if the input FASTA exists
+        if stream_input and not Path(stream_source).exists():
+            logger.error(f"Downloaded FASTA file not found: {stream_source}")
+            return False
+        if not stream_input and not Path(unzipped_fasta).exists():
             logger.error(f"Unzipped FASTA file not found: {unzipped_fasta}")
             return False
 
@@ -147,7 +301,8 @@ def run_makeblastdb(config_entry: Dict, output_dir: str, logger, mod_code: str)
         extensions = "".join(Path(fasta_file).suffixes)
 
         makeblast_command = (
-            f"makeblastdb -in {unzipped_fasta} -dbtype {config_entry['seqtype']} "
+            f"makeblastdb -in {'-' if stream_input else unzipped_fasta} "
+            f"-dbtype {config_entry['seqtype']} "
             f"-title '{sanitized_blast_title}' "
             f"-out {output_dir}/{fasta_file.replace(extensions, 'db')} "
             f"-taxid {config_entry['taxon_id'].replace('NCBITaxon:', '')} "
@@ -158,8 +313,16 @@ def run_makeblastdb(config_entry: Dict, output_dir: str, logger, mod_code: str)
         print_status(f"Command: {makeblast_command}", "info")
 
         # Run makeblastdb
-        p = Popen(makeblast_command, shell=True, stdout=PIPE, stderr=PIPE)
-        stdout, stderr = p.communicate()
+        if stream_input:
+            scanner = FastaScanner()
+            stdout, stderr, returncode = stream_into_makeblastdb(
+                makeblast_command, stream_source, workspace, logger, scanner
+            )
+            record_fasta_stats(config_entry, scanner.finish(), logger)
+        else:
+            p = Popen(makeblast_command, shell=True, stdout=PIPE, stderr=PIPE)
+            stdout, stderr = p.communicate()
+            returncode = p.returncode
 
         # Log command output
         if stdout:
@@ -171,9 +334,9 @@ def run_makeblastdb(config_entry: Dict, output_dir: str, logger, mod_code: str)
             logger.warning(f"makeblastdb stderr: {stderr_str}")
             print_status(f"makeblastdb stderr: {stderr_str.strip()}", "warning")
 
-        if p.returncode != 0:
+        if returncode != 0:
             error_msg = stderr.decode("utf-8")
-            logger.error(f"makeblastdb command failed with return code {p.returncode}")
+            logger.error(f"makeblastdb command failed with return code {returncode}")
             logger.error(f"Command: {makeblast_command}")
             logger.error(f"Error output: {error_msg}")
 
@@ -181,11 +344,11 @@ def run_makeblastdb(config_entry: Dict, output_dir: str, logger, mod_code: str)
             print_error_details(
                 "BLAST Database Creation Error",
                 {
-                    "Return Code": p.returncode,
+                    "Return Code": returncode,
                     "Command": makeblast_command,
                     "Error Output": error_msg,
                     "Output Directory": output_dir,
-                    "FASTA File": unzipped_fasta,
+                    "FASTA File": stream_source if stream_input else unzipped_fasta,
                 },
             )
 
@@ -207,7 +370,7 @@ def run_makeblastdb(config_entry: Dict, output_dir: str, logger, mod_code: str)
             Path(unzipped_fasta).unlink()
 
         # Clean up original gzipped file
-        original_gzip = f"../data/{fasta_file}"
+        original_gzip = workspace.download_path
         if Path(original_gzip).exists():
             file_size = Path(original_gzip).stat().st_size
             logger.info(
@@ -225,6 +388,154 @@ def run_makeblastdb(config_entry: Dict, output_dir: str, logger, mod_code: str)
         return False
 
 
+def show_run_plan(
+    config_yaml: Optional[str],
+    input_json: Optional[str],
+    environment: Optional[str],
+    db_list: Optional[List[str]] = None,
+    limit_dbs: Optional[int] = None,
+    download_workers: int = 1,
+) -> Dict:
+    """
+    Preflight: resolves the size of every file the run would fetch and prints the plan.
+
+    Remote sizes are resolved concurrently (HEAD requests on the pooled HTTP engine, cached
+    directory listings for FTP); nothing is downloaded.
+
+    Returns:
+        Dict: Totals of the plan (bytes to fetch, footprint, predicted durations)
+    """
+    print_header("Run Plan")
+    start_time = datetime.now()
+    plan = plan_downloads(config_yaml, input_json, environment, db_list, limit_dbs)
+    rows = preflight(
+        plan,
+        lambda uri: get_remote_validators(uri, LOGGER),
+        # Files staged on local disk cost nothing to fetch either
+        lambda uri, md5sum: local_source(uri) is not None or is_download_cached(uri, md5sum),
+    )
+
+    show_table(
+        f"{plan.distinct()} distinct files for {plan.total_references()} entries",
+        ["File", "Entries", "Type", "Size", "Decompressed (est.)", "Build (est.)", "Status"],
+        [
+            [
+                Path(row.uri).name,
+                row.consumers,
+                row.seqtype,
+                format_bytes(row.size),
+                format_bytes(row.decompressed_bytes()),
+                format_seconds(row.build_seconds()),
+                "cached" if row.cached else row.error or "fetch",
+            ]
+            for row in rows
+        ],
+    )
+
+    totals = summarize_preflight(rows, download_workers)
+    show_summary(
+        "Run Plan",
+        {
+            "Entries": totals["entries"],
+            "Distinct Files": totals["distinct_files"],
+            "Cached Files": totals["cached_files"],
+            "Unresolved Files": totals["unresolved_files"],
+            "Bytes To Fetch": format_bytes(totals["fetch_bytes"]),
+            "Decompressed Footprint (est.)": format_bytes(totals["decompressed_bytes"]),
+            "Peak Scratch Space (est.)": format_bytes(totals["largest_decompressed_bytes"]),
+            "Download Time (est.)": format_seconds(totals["download_seconds"]),
+            "Build Time (est.)": format_seconds(totals["build_seconds"]),
+        },
+        datetime.now() - start_time,
+    )
+    LOGGER.info(f"Run plan: {json.dumps(totals)}")
+    return totals
+
+
+def prefetch_to_cache(
+    config_yaml: Optional[str],
+    input_json: Optional[str],
+    environment: Optional[str],
+    db_list: Optional[List[str]] = None,
+    limit_dbs: Optional[int] = None,
+    download_workers: int = 2,
+    skip_md5_check: bool = False,
+) -> Dict[str, int]:
+    """
+    Prefetch-only run: downloads and verifies every distinct file of the plan into the
+    download cache and stops there, so a later run builds without touching the network.
+
+    Files already in the cache or staged on local disk are left alone. Downloads run on
+    download_workers threads, within the per-host connection caps and bandwidth limits.
+
+    Returns:
+        Dict[str, int]: Number of files "fetched", "cached" (already), "local" and "failed"
+    """
+    print_header("Prefetching Into Download Cache")
+    start_time = datetime.now()
+    if not DOWNLOAD_SETTINGS["cache_dir"] or DOWNLOAD_SETTINGS["cache_max_bytes"] <= 0:
+        raise ValueError("--prefetch needs the download cache (--cache-dir, --cache-size-gb)")
+
+    plan = plan_downloads(config_yaml, input_json, environment, db_list, limit_dbs)
+    mods = {
+        json_file: mod or get_mod_from_json(json_file)
+        for json_file, _, mod in config_json_files(config_yaml, input_json, environment)
+    }
+    # Per process, so concurrent prefetch runs do not share scratch files
+    scratch = Path(PREFETCH_DIR) / str(os.getpid())
+    scratch.mkdir(parents=True, exist_ok=True)
+    Path("../logs").mkdir(parents=True, exist_ok=True)
+    print_status(f"Prefetching {plan.distinct()} distinct files", "info")
+
+    def _warm(item) -> str:
+        (uri, md5sum), references = item
+        json_file, _, entry = references[0]
+        if any(local_source(source) is not None for source in entry_sources(entry)):
+            return "local"
+        if is_download_cached(uri, md5sum):
+            return "cached"
+
+        logger = setup_entry_logger(entry)
+        target = scratch / f"{md5sum or 'nomd5'}_{Path(uri).name}"
+        try:
+            fetched = fetch_entry_file(
+                entry, mods[json_file], logger, skip_md5_check=skip_md5_check, target=str(target)
+            )
+        finally:
+            # The cache keeps its own link to the file
+            target.unlink(missing_ok=True)
+        if fetched:
+            log_success(f"Prefetched {Path(uri).name}")
+            return "fetched"
+        log_error(f"Prefetch failed: {uri}")
+        return "failed"
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, download_workers), thread_name_prefix="prefetch"
+    ) as pool:
+        outcomes = list(pool.map(_warm, plan.references.items()))
+    try:
+        scratch.rmdir()
+        scratch.parent.rmdir()
+    except OSError:
+        pass
+
+    counts = {name: outcomes.count(name) for name in ("fetched", "cached", "local", "failed")}
+    show_summary(
+        "Prefetch",
+        {
+            "Distinct Files": plan.distinct(),
+            "Fetched": counts["fetched"],
+            "Already Cached": counts["cached"],
+            "Staged Locally": counts["local"],
+            "Failed": counts["failed"],
+        },
+        datetime.now() - start_time,
+    )
+    LOGGER.info(f"Prefetch: {json.dumps(counts)}")
+    return counts
+
+
 def list_databases_from_config(config_file: str) -> None:
     """
     Lists all database names from either a YAML or JSON configuration file.
@@ -273,16 +584,36 @@ def process_files(
     cleanup: bool = False,
     limit_dbs: Optional[int] = None,
     skip_md5_check: bool = False,
+    prefetch_depth: int = 0,
+    download_workers: int = 2,
+    skip_unchanged: bool = False,
+    stream_input: bool = False,
 ) -> None:
     """
     Process configuration files with enhanced logging.
+
+    A planning pass first resolves the distinct (URI, md5) pairs referenced by all
+    providers and environments, so each file is downloaded once per run.
     """
+    global SHARED_DOWNLOADS
     LOGGER.info("Starting configuration file processing")
     LOGGER.info(
-        f"Parameters: check_only={check_only}, store_files={store_files}, cleanup={cleanup}, skip_md5_check={skip_md5_check}"
+        f"Parameters: check_only={check_only}, store_files={store_files}, cleanup={cleanup}, skip_md5_check={skip_md5_check}, "
+        f"prefetch_depth={prefetch_depth}, download_workers={download_workers}"
     )
 
     try:
+        plan = plan_downloads(config_yaml, input_json, environment, db_list, limit_dbs)
+        LOGGER.info(
+            f"Download plan: {plan.distinct()} distinct files for {plan.total_references()} entries"
+        )
+        if plan.distinct() < plan.total_references():
+            print_status(
+                f"{plan.total_references()} entries reference {plan.distinct()} distinct files",
+                "info",
+            )
+        SHARED_DOWNLOADS = SharedDownloads(plan, f"{SHARED_DIR}/{os.getpid()}")
+
         if config_yaml:
             LOGGER.info(f"Processing YAML config: {config_yaml}")
             with open(config_yaml) as f:
@@ -293,10 +624,7 @@ def process_files(
                 LOGGER.info(f"Processing provider: {provider['name']}")
 
                 for env in provider["environments"]:
-                    json_file = (
-                        Path(config_yaml).parent
-                        / f"{provider['name']}/databases.{provider['name']}.{env}.json"
-                    )
+                    json_file = provider_json_file(config_yaml, provider["name"], env)
 
                     if json_file.exists():
                         LOGGER.info(f"Found JSON file: {json_file}")
@@ -310,6 +638,10 @@ def process_files(
                             cleanup,
                             limit_dbs,
                             skip_md5_check,
+                            prefetch_depth,
+                            download_workers,
+                            skip_unchanged,
+                            stream_input,
                         )
                     else:
                         LOGGER.warning(f"JSON file not found: {json_file}")
@@ -322,12 +654,263 @@ def process_files(
         elif input_json:
             LOGGER.info(f"Processing single JSON file: {input_json}")
             process_json_entries(
-                input_json, environment, None, db_list, check_only, store_files, cleanup, limit_dbs, skip_md5_check
+                input_json,
+                environment,
+                None,
+                db_list,
+                check_only,
+                store_files,
+                cleanup,
+                limit_dbs,
+                skip_md5_check,
+                prefetch_depth,
+                download_workers,
+                skip_unchanged,
+                stream_input,
             )
 
     except Exception as e:
         LOGGER.error(f"Failed to process configuration files: {str(e)}", exc_info=True)
         raise
+    finally:
+        if SHARED_DOWNLOADS is not None:
+            LOGGER.info(f"Shared download stats: {SHARED_DOWNLOADS.close()}")
+            SHARED_DOWNLOADS = None
+
+
+def setup_entry_logger(entry: Dict):
+    """
+    Creates the entry-specific logger used by both the download and build stages.
+    """
+    date_to_add = datetime.now().strftime("%Y_%b_%d")
+    log_path = f"../logs/{entry['genus']}_{entry['species']}_{entry['seqtype']}_{date_to_add}.log"
+    return extendable_logger(entry["blast_title"], log_path)
+
+
+def download_entry(
+    entry: Dict,
+    mod_code: str,
+    logger,
+    store_files: bool = False,
+    skip_md5_check: bool = False,
+    workspace: Optional[EntryWorkspace] = None,
+) -> bool:
+    """
+    Downloads and verifies the FASTA file for a single database entry into its workspace.
+
+    Args:
+        entry: Database entry configuration
+        mod_code: Model organism database identifier
+        logger: Entry-specific logger instance
+        store_files: Whether to store original files
+        skip_md5_check: Whether to skip MD5 checksum verification
+        workspace: Workspace of the entry (acquired from the run when not supplied)
+
+    Returns:
+        bool: True if the file was downloaded (and verified), False otherwise
+    """
+    if workspace is None:
+        workspace = get_workspaces().acquire(entry, mod_code)
+    workspace.create()
+    target = workspace.download_path
+
+    def _fetch() -> bool:
+        return fetch_entry_file(
+            entry, mod_code, logger, store_files, skip_md5_check, target=target
+        )
+
+    if SHARED_DOWNLOADS is not None:
+        # A file referenced by several entries of the run is only fetched once
+        return SHARED_DOWNLOADS.fetch(entry, _fetch, target, logger)
+    return _fetch()
+
+
+def fetch_entry_file(
+    entry: Dict,
+    mod_code: str,
+    logger,
+    store_files: bool = False,
+    skip_md5_check: bool = False,
+    target: Optional[str] = None,
+) -> bool:
+    """
+    Provides the FASTA file of an entry at target, from local disk or over FTP or HTTP(S).
+
+    A local copy (a file:// source, or a source found in the local mirror) is used before
+    any network source. Entries listing "mirrors" are fetched as a hedged download from the
+    fastest source. Whichever source provides it, the file lands at target (by default
+    ../data/<name of the entry's own URI>).
+    """
+    target = target or f"../data/{Path(entry['uri']).name}"
+    sources = entry_sources(entry)
+    source = None
+    for uri in sources:
+        if local_source(uri) is not None and get_files_local(
+            uri,
+            entry["md5sum"],
+            logger,
+            mod=mod_code,
+            store_files=store_files,
+            skip_md5_check=skip_md5_check,
+            file_name=target,
+        ):
+            source = uri
+            break
+
+    network = [uri for uri in sources if not uri.startswith("file://")]
+    if source is None and len(network) == 1:
+        if not fetch_source(
+            network[0],
+            entry["md5sum"],
+            mod_code,
+            logger,
+            store_files,
+            skip_md5_check,
+            file_name=target,
+        ):
+            return False
+        source = network[0]
+    elif source is None and network:
+        Path(target).parent.mkdir(parents=True, exist_ok=True)
+        ranked = rank_sources(network, lambda uri: get_remote_validators(uri, logger), logger)
+        hedge = HedgedDownload(
+            ranked,
+            target,
+            lambda uri, file_name, progress: fetch_source(
+                uri,
+                entry["md5sum"],
+                mod_code,
+                logger,
+                skip_md5_check=skip_md5_check,
+                file_name=file_name,
+                progress=progress,
+            ),
+            logger,
+        )
+        if not hedge.run():
+            return False
+        source = hedge.winner.uri
+        if store_files:
+            store_fasta_files(target, logger, store_files)
+    elif source is None:
+        logger.error(f"No usable source for {entry['uri']}")
+        return False
+
+    # Later stages look the entry up by its own URI
+    if source != entry["uri"]:
+        DOWNLOAD_STATUS[entry["uri"]] = DOWNLOAD_STATUS.get(source, "downloaded")
+    return True
+
+
+def fetch_source(
+    uri: str,
+    md5sum: str,
+    mod_code: str,
+    logger,
+    store_files: bool = False,
+    skip_md5_check: bool = False,
+    file_name: Optional[str] = None,
+    progress=None,
+) -> bool:
+    """
+    Downloads one source URI over FTP or HTTP(S).
+    """
+    if uri.startswith("ftp://"):
+        return get_files_ftp(
+            uri,
+            md5sum,
+            logger,
+            mod=mod_code,
+            store_files=store_files,
+            skip_md5_check=skip_md5_check,
+            file_name=file_name,
+            progress=progress,
+        )
+    return get_files_http(
+        uri,
+        md5sum,
+        logger,
+        mod=mod_code,
+        store_files=store_files,
+        skip_md5_check=skip_md5_check,
+        file_name=file_name,
+        progress=progress,
+    )
+
+
+class DownloadPrefetcher:
+    """
+    Downloads upcoming entries on a bounded worker pool while earlier entries are built.
+
+    At most `depth` downloads are in flight or waiting to be consumed at any time, which
+    caps the scratch space used by prefetched files. Each entry downloads into its own
+    workspace, which process_entry picks up and releases once the entry is built.
+    """
+
+    def __init__(
+        self,
+        entries: List[Dict],
+        mod_code: str,
+        depth: int,
+        workers: int,
+        store_files: bool = False,
+        skip_md5_check: bool = False,
+        environment: Optional[str] = None,
+    ):
+        self.mod_code = mod_code
+        self.environment = environment
+        self.depth = max(1, depth)
+        self.store_files = store_files
+        self.skip_md5_check = skip_md5_check
+        self.pending = deque(entries)
+        self.in_flight: Dict[int, Tuple[Dict, object, Future]] = {}
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="download"
+        )
+        LOGGER.info(
+            f"Download prefetch enabled: depth={self.depth}, workers={max(1, workers)}"
+        )
+
+    def _fill(self) -> None:
+        """Submits pending entries until the prefetch queue is full."""
+        while self.pending and len(self.in_flight) < self.depth:
+            entry = self.pending.popleft()
+            logger = setup_entry_logger(entry)
+            workspace = get_workspaces().acquire(entry, self.mod_code, self.environment)
+            future = self.executor.submit(
+                download_entry,
+                entry,
+                self.mod_code,
+                logger,
+                self.store_files,
+                self.skip_md5_check,
+                workspace,
+            )
+            self.in_flight[id(entry)] = (entry, logger, future)
+            LOGGER.info(f"Prefetching {entry['blast_title']} into {workspace.path}")
+
+    def take(self, entry: Dict) -> Tuple[Future, object]:
+        """
+        Returns the download future and logger for an entry, scheduling it if needed.
+        """
+        self._fill()
+        _, logger, future = self.in_flight.pop(id(entry))
+        self._fill()
+        return future, logger
+
+    def close(self) -> None:
+        """
+        Cancels downloads that have not started, waits for running ones and releases the
+        workspaces of entries that were never taken.
+        """
+        self.pending.clear()
+        for _, _, future in self.in_flight.values():
+            future.cancel()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for entry, logger, _ in self.in_flight.values():
+            workspaces = get_workspaces()
+            workspaces.release(workspaces.acquire(entry, self.mod_code, self.environment), logger)
+        self.in_flight.clear()
 
 
 def process_entry(
@@ -337,6 +920,10 @@ def process_entry(
     check_only: bool = False,
     store_files: bool = False,
     skip_md5_check: bool = False,
+    prefetched: Optional[Future] = None,
+    logger=None,
+    skip_unchanged: bool = False,
+    stream_input: bool = False,
 ) -> bool:
     """
     Process a single database entry with comprehensive logging and progress display.
@@ -348,6 +935,12 @@ def process_entry(
         check_only: Whether to only check parse_seqids
         store_files: Whether to store original files
         skip_md5_check: Whether to skip MD5 checksum verification
+        prefetched: Future of a download already started by DownloadPrefetcher
+        logger: Entry-specific logger (created when not supplied)
+        skip_unchanged: Whether to skip the build when the source file is not modified
+            and the database already exists
+        stream_input: Whether to pipe the decompressed download into makeblastdb instead
+            of writing the uncompressed FASTA to disk
 
     Returns:
         bool: Success status
@@ -357,38 +950,30 @@ def process_entry(
     entry_name = entry["blast_title"]
 
     # Setup entry-specific logging
-    date_to_add = datetime.now().strftime("%Y_%b_%d")
-    log_path = f"../logs/{entry['genus']}_{entry['species']}_{entry['seqtype']}_{date_to_add}.log"
-    logger = extendable_logger(entry_name, log_path)
+    if logger is None:
+        logger = setup_entry_logger(entry)
 
     logger.info(f"Starting processing of entry: {entry_name}")
     logger.info(
         f"Configuration details: {json.dumps({k: v for k, v in entry.items() if k != 'uri'}, indent=2)}"
     )
 
+    workspaces = get_workspaces()
+    workspace = workspaces.acquire(entry, mod_code, environment)
+    logger.info(f"Workspace: {workspace.path}")
+
     try:
         fasta_file = Path(entry["uri"]).name
-        unzipped_fasta = f"../data/{fasta_file.replace('.gz', '')}"
+        unzipped_fasta = workspace.fasta_path
 
-        # Download file
-        print_status(f"Downloading {fasta_file}...", "info")
-        if entry["uri"].startswith("ftp://"):
-            success = get_files_ftp(
-                entry["uri"],
-                entry["md5sum"],
-                logger,
-                mod=mod_code,
-                store_files=store_files,
-                skip_md5_check=skip_md5_check,
-            )
+        # Download file (or wait for the prefetched download)
+        if prefetched is not None:
+            print_status(f"Waiting for prefetched download of {fasta_file}...", "info")
+            success = prefetched.result()
         else:
-            success = get_files_http(
-                entry["uri"],
-                entry["md5sum"],
-                logger,
-                mod=mod_code,
-                store_files=store_files,
-                skip_md5_check=skip_md5_check,
+            print_status(f"Downloading {fasta_file}...", "info")
+            success = download_entry(
+                entry, mod_code, logger, store_files, skip_md5_check, workspace
             )
 
         if not success:
@@ -405,34 +990,77 @@ def process_entry(
             return False
 
         log_success("File download complete")
+        workspaces.measure(workspace)
+
+        unchanged = DOWNLOAD_STATUS.get(entry["uri"]) == "not_modified"
+        if unchanged:
+            NOT_MODIFIED.append(entry_name)
+            print_status(f"{fasta_file} not modified since last run", "info")
 
         # Create database if not check_only
-        if not check_only:
+        if (
+            unchanged
+            and skip_unchanged
+            and not check_only
+            and database_exists(environment, mod_code, entry)
+        ):
+            logger.info("Source not modified and database exists, skipping build")
+            log_success("Database up to date, build skipped")
+        elif not check_only:
             # Create database structure
             print_status("Creating database...", "info")
             output_dir, config_dir = create_db_structure(
                 environment, mod_code, entry, logger
             )
 
-            # Unzip file if needed
-            if (
-                not Path(unzipped_fasta).exists()
-                and Path(f"../data/{fasta_file}").exists()
-            ):
-                logger.info(f"Unzipping {fasta_file}")
-                unzip_command = f"gunzip -v ../data/{fasta_file}"
-                logger.info(f"Executing unzip command: {unzip_command}")
-                print_status(f"Command: {unzip_command}", "info")
-                p = Popen(unzip_command, shell=True, stdout=PIPE, stderr=PIPE)
-                stdout, stderr = p.communicate()
-                
-                if stdout:
-                    stdout_str = stdout.decode("utf-8")
-                    logger.info(f"gunzip stdout: {stdout_str}")
-                    print_status(f"gunzip output: {stdout_str.strip()}", "success")
-
-                if p.returncode != 0:
-                    error_msg = f"Unzip failed: {stderr.decode('utf-8')}"
+            # Decompress the download, unless it is streamed straight into makeblastdb,
+            # scanning the FASTA as it is written. Its IDs are checked against the limits of
+            # -parse_seqids (used for every MOD but ZFIN) before makeblastdb gets to fail on them.
+            fasta_stats = None
+            seqids = SeqidChecker() if mod_code != "ZFIN" else None
+            reread = partial(seqids_of, unzipped_fasta)
+            # Judged by content: a compressed download whose name lacks a compression suffix
+            # shares its path with the FASTA and is decompressed in place
+            fasta_ready = (
+                Path(unzipped_fasta).exists() and detect_format(unzipped_fasta) == "none"
+            )
+            if not stream_input and not fasta_ready and Path(workspace.download_path).exists():
+                print_status(f"Decompressing {fasta_file}...", "info")
+                scanner = FastaScanner(seqids)
+                try:
+                    stats = decompress_file(
+                        workspace.download_path, unzipped_fasta, logger, tap=scanner.feed
+                    )
+                except (DecompressionError, OSError) as e:
+                    error_msg = f"Decompression failed: {str(e)}"
+                    log_error(error_msg)
+                    FAILURE_DETAILS.append(
+                        {
+                            "entry": entry_name,
+                            "error": error_msg,
+                            "stage": "unzip",
+                            "uri": entry.get("uri", "unknown"),
+                        }
+                    )
+                    return False
+                print_status(f"Decompressed {stats.describe()}", "success")
+                workspaces.measure(workspace)
+                fasta_stats = scanner.finish()
+            elif not stream_input and fasta_ready:
+                fasta_stats = scan_fasta(unzipped_fasta, seqids=seqids)
+            elif seqids is not None:
+                # makeblastdb will read the FASTA as it is decompressed, so the IDs get a
+                # pass of their own first
+                reread = partial(
+                    seqids_in_download,
+                    unzipped_fasta if Path(unzipped_fasta).exists() else workspace.download_path,
+                )
+                print_status(f"Checking sequence IDs of {fasta_file}...", "info")
+                try:
+                    for seq_id in reread():
+                        seqids.add(seq_id)
+                except (DecompressionError, OSError) as e:
+                    error_msg = f"Decompression failed: {str(e)}"
                     log_error(error_msg)
                     FAILURE_DETAILS.append(
                         {
@@ -444,8 +1072,41 @@ def process_entry(
                     )
                     return False
 
+            if fasta_stats is not None:
+                record_fasta_stats(entry, fasta_stats, logger)
+                if not fasta_stats.sequences:
+                    error_msg = f"No sequences in {fasta_file}: {fasta_stats.error}"
+                    log_error(error_msg)
+                    FAILURE_DETAILS.append(
+                        {
+                            "entry": entry_name,
+                            "error": error_msg,
+                            "stage": "validate",
+                            "uri": entry.get("uri", "unknown"),
+                        }
+                    )
+                    return False
+
+            if seqids is not None and seqids.ids:
+                report = seqids.finish(reread)
+                logger.info(f"parse_seqids preflight: {report.describe()}")
+                if not report.ok:
+                    error_msg = f"IDs rejected by -parse_seqids: {report.describe()}"
+                    log_error(error_msg)
+                    FAILURE_DETAILS.append(
+                        {
+                            "entry": entry_name,
+                            "error": error_msg,
+                            "stage": "preflight",
+                            "uri": entry.get("uri", "unknown"),
+                        }
+                    )
+                    return False
+
             # Run makeblastdb
-            if not run_makeblastdb(entry, output_dir, logger, mod_code):
+            if not run_makeblastdb(
+                entry, output_dir, logger, mod_code, workspace, stream_input
+            ):
                 error_msg = "Database creation failed"
                 log_error(error_msg)
                 FAILURE_DETAILS.append(
@@ -483,28 +1144,6 @@ def process_entry(
                 )
                 logger.info(f"Parse seqids check: {entry_name} - mandatory -parse_seqids")
 
-        # Clean up files
-        try:
-            if Path(unzipped_fasta).exists():
-                if check_only or not store_files:
-                    file_size = Path(unzipped_fasta).stat().st_size
-                    logger.info(
-                        f"Cleaning up unzipped file: {unzipped_fasta} (size: {file_size:,} bytes)"
-                    )
-                    Path(unzipped_fasta).unlink()
-
-            original_gzip = f"../data/{fasta_file}"
-            if Path(original_gzip).exists() and not store_files:
-                file_size = Path(original_gzip).stat().st_size
-                logger.info(
-                    f"Cleaning up original gzipped file: {original_gzip} (size: {file_size:,} bytes)"
-                )
-                Path(original_gzip).unlink()
-
-        except Exception as e:
-            log_error("Cleanup failed", e)
-            logger.error(f"Cleanup failed: {str(e)}", exc_info=True)
-
         # Log completion
         duration = datetime.now() - start_time
         logger.info(f"Entry processing completed in {duration}")
@@ -530,6 +1169,13 @@ def process_entry(
             }
         )
         return False
+    finally:
+        # Clean up files; stored originals stay until the end-of-run cleanup
+        try:
+            workspaces.release(workspace, logger, keep_files=store_files)
+        except Exception as e:
+            log_error("Cleanup failed", e)
+            logger.error(f"Cleanup failed: {str(e)}", exc_info=True)
 
 
 def process_json_entries(
@@ -542,9 +1188,19 @@ def process_json_entries(
     cleanup: bool = True,
     limit_dbs: Optional[int] = None,
     skip_md5_check: bool = False,
+    prefetch_depth: int = 0,
+    download_workers: int = 2,
+    skip_unchanged: bool = False,
+    stream_input: bool = False,
 ) -> bool:
     """
     Process entries from a JSON configuration file with enhanced progress display.
+
+    When prefetch_depth is greater than zero, downloads for upcoming entries run on a
+    pool of download_workers threads while earlier entries are being built. With
+    skip_unchanged, entries whose source file is not modified since the last run and
+    whose database already exists are not rebuilt. With stream_input, downloads are
+    decompressed straight into makeblastdb.
     """
     print_header("Processing JSON Entries")
     start_time = datetime.now()
@@ -553,6 +1209,7 @@ def process_json_entries(
     if skip_md5_check:
         LOGGER.warning("MD5 checksum verification is DISABLED for this run")
 
+    output_lock = None
     try:
         with open(json_file, "r") as f:
             db_coordinates = json.load(f)
@@ -566,6 +1223,10 @@ def process_json_entries(
 
         print_status(f"Using MOD code: {mod_code}", "info")
 
+        # Another run building the same MOD/environment finishes before this one starts
+        output_lock = get_lock_manager().output(mod_code, environment, LOGGER)
+        output_lock.acquire()
+
         # Create logs directory
         Path("../logs").mkdir(parents=True, exist_ok=True)
 
@@ -580,27 +1241,68 @@ def process_json_entries(
         total_entries = len(entries)
         processed = 0
         successful = 0
+        not_modified_before = len(NOT_MODIFIED)
 
         print_status(f"Found {total_entries} entries to process", "info")
 
+        # Start downloading upcoming entries in the background if requested
+        prefetcher = None
+        if prefetch_depth > 0:
+            selected = [
+                entry
+                for entry in entries
+                if not db_list or entry.get("blast_title", "Unknown") in db_list
+            ]
+            prefetcher = DownloadPrefetcher(
+                selected,
+                mod_code,
+                prefetch_depth,
+                download_workers,
+                store_files,
+                skip_md5_check,
+                environment,
+            )
+            print_status(
+                f"Prefetching up to {prefetch_depth} downloads with {download_workers} workers",
+                "info",
+            )
+
         # Process entries without progress bars for cleaner output
-        for entry in entries:
-            processed += 1
-            entry_name = entry.get("blast_title", "Unknown")
+        try:
+            for entry in entries:
+                processed += 1
+                entry_name = entry.get("blast_title", "Unknown")
 
-            if db_list and entry_name not in db_list:
-                log_warning(f"Skipping {entry_name} (not in requested list)")
-                continue
+                if db_list and entry_name not in db_list:
+                    log_warning(f"Skipping {entry_name} (not in requested list)")
+                    continue
 
-            try:
-                if process_entry(entry, mod_code, environment, check_only, store_files, skip_md5_check):
-                    successful += 1
-                    print_progress_line(processed, total_entries, entry_name, "success")
-                else:
+                try:
+                    prefetched, entry_logger = (
+                        prefetcher.take(entry) if prefetcher else (None, None)
+                    )
+                    if process_entry(
+                        entry,
+                        mod_code,
+                        environment,
+                        check_only,
+                        store_files,
+                        skip_md5_check,
+                        prefetched=prefetched,
+                        logger=entry_logger,
+                        skip_unchanged=skip_unchanged,
+                        stream_input=stream_input,
+                    ):
+                        successful += 1
+                        print_progress_line(processed, total_entries, entry_name, "success")
+                    else:
+                        print_progress_line(processed, total_entries, entry_name, "error")
+                except Exception as e:
+                    log_error(f"Failed to process entry {entry_name}", e)
                     print_progress_line(processed, total_entries, entry_name, "error")
-            except Exception as e:
-                log_error(f"Failed to process entry {entry_name}", e)
-                print_progress_line(processed, total_entries, entry_name, "error")
+        finally:
+            if prefetcher:
+                prefetcher.close()
 
         # After all entries are processed successfully, copy the configuration file
         if successful > 0 and not check_only:
@@ -624,10 +1326,10 @@ def process_json_entries(
                             f"Failed to update mapping for {entry['blast_title']}"
                         )
 
-        # Clean up all FASTA files after processing if cleanup is enabled
+        # Remove the workspaces still held (stored originals) if cleanup is enabled
         if cleanup and not check_only:
             try:
-                cleanup_fasta_files(Path("../data"), LOGGER)
+                LOGGER.info(f"Workspace stats: {get_workspaces().cleanup(LOGGER)}")
                 LOGGER.info("Cleanup completed successfully")
             except Exception as e:
                 log_error("Cleanup failed", e)
@@ -635,6 +1337,12 @@ def process_json_entries(
         # Show final summary
         duration = datetime.now() - start_time
         failed_count = processed - successful
+        not_modified = len(NOT_MODIFIED) - not_modified_before
+        scanned = [
+            FASTA_STATS[entry["blast_title"]]
+            for entry in entries
+            if entry.get("blast_title") in FASTA_STATS
+        ]
 
         show_summary(
             "JSON Processing",
@@ -643,6 +1351,9 @@ def process_json_entries(
                 "Processed": processed,
                 "Successful": successful,
                 "Failed": failed_count,
+                "Not Modified": not_modified,
+                "Sequences": f"{sum(stats['sequences'] for stats in scanned):,}",
+                "Residues": f"{sum(stats['residues'] for stats in scanned):,}",
                 "Success Rate": f"{(successful / total_entries * 100):.1f}%"
                 if total_entries > 0
                 else "0%",
@@ -673,6 +1384,7 @@ def process_json_entries(
             f"• *Processed:* {processed}\n"
             f"• *Successful:* {successful}\n"
             f"• *Failed:* {failed_count}\n"
+            f"• *Not Modified:* {not_modified}\n"
             f"• *Success Rate:* {(successful / total_entries * 100):.1f}%\n"
             f"• *Cleanup Performed:* {cleanup and not check_only}\n"
             f"• *Duration:* {duration}"
@@ -693,6 +1405,9 @@ def process_json_entries(
     except Exception as e:
         log_error(f"Failed to process JSON file {json_file}", e)
         return False
+    finally:
+        if output_lock is not None:
+            output_lock.release()
 
 
 def show_failure_summary() -> None:
@@ -767,6 +1482,26 @@ def send_slack_messages_in_batches(
             LOGGER.error(f"Failed to send Slack batch {i // batch_size + 1}: {str(e)}")
 
 
+def configure_transfer_limits(config_yaml: Optional[str]) -> TransferScheduler:
+    """
+    Sets per-host connection caps, bandwidth limits, adaptive concurrency bounds, the retry
+    policy and mirror hedging from the "transfer" section of the global YAML (defaults apply
+    when there is no such section).
+    """
+    settings = None
+    if config_yaml and Path(config_yaml).exists():
+        with open(config_yaml) as f:
+            settings = (yaml.safe_load(f) or {}).get("transfer")
+    scheduler = configure_scheduler(settings, LOGGER)
+    configure_retries((settings or {}).get("retry"))
+    configure_mirrors((settings or {}).get("mirrors"))
+
+    # The HTTP connection pool must not be tighter than the most generous host cap
+    configure_downloads(http_connections_per_host=scheduler.max_connections())
+    LOGGER.info(f"Transfer limits: {json.dumps(settings or {})}")
+    return scheduler
+
+
 @click.command()
 @click.option("-g", "--config_yaml", help="YAML file with all MODs configuration")
 @click.option("-j", "--input_json", help="JSON file input coordinates")
@@ -830,6 +1565,92 @@ def send_slack_messages_in_batches(
     is_flag=True,
     default=False,
 )
+@click.option(
+    "--prefetch-depth",
+    help="Number of upcoming entries to download while earlier ones build (0 = sequential)",
+    type=click.IntRange(min=0),
+    default=0,
+)
+@click.option(
+    "--download-workers",
+    help="Number of parallel download workers used with --prefetch-depth",
+    type=click.IntRange(min=1),
+    default=2,
+)
+@click.option(
+    "--http-engine",
+    help="HTTP downloader: pooled in-process engine (native) or one wget process per file",
+    type=click.Choice(["native", "wget"]),
+    default="native",
+)
+@click.option(
+    "--ftp-engine",
+    help="FTP downloader: pooled sessions with cached listings (native) or one wget process per file",
+    type=click.Choice(["native", "wget"]),
+    default="native",
+)
+@click.option(
+    "--download-segments",
+    help="Fetch large files as N parallel byte ranges (HTTP Range / FTP REST); 1 disables",
+    type=click.IntRange(min=1),
+    default=1,
+)
+@click.option(
+    "--segment-threshold-mb",
+    help="Minimum file size in MB for a segmented download",
+    type=click.IntRange(min=1),
+    default=256,
+)
+@click.option(
+    "--cache-dir",
+    help="Persistent download cache and record of last-seen remote validators",
+    default="../cache",
+)
+@click.option(
+    "--cache-size-gb",
+    help="Size budget of the download cache in GB, least recently used files are evicted (0 disables caching files)",
+    type=click.FloatRange(min=0),
+    default=50,
+)
+@click.option(
+    "--plan",
+    "plan_only",
+    help="Preflight: size every file the run would fetch, print the plan and exit",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--skip-unchanged",
+    help="Do not rebuild databases whose source file is not modified since the last run",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--prefetch",
+    "prefetch_only",
+    help="Only download and verify every file of the run into the download cache, then exit",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--local-mirror",
+    help="Directory of staged source files (<host>/<path> or flat) used before the network",
+    type=click.Path(file_okay=False),
+    default=None,
+)
+@click.option(
+    "--stream-decompress",
+    "stream_input",
+    help="Decompress downloads straight into makeblastdb instead of writing the FASTA to disk",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--lock-timeout",
+    help="Seconds to wait for a MOD/environment locked by a concurrent run (default: wait)",
+    type=click.IntRange(min=0),
+    default=None,
+)
 def create_dbs(
     config_yaml: str,
     input_json: str,
@@ -847,6 +1668,20 @@ def create_dbs(
     validate: bool,
     validation_path: str,
     skip_md5_check: bool,
+    prefetch_depth: int,
+    download_workers: int,
+    http_engine: str,
+    ftp_engine: str,
+    download_segments: int,
+    segment_threshold_mb: int,
+    cache_dir: str,
+    cache_size_gb: float,
+    skip_unchanged: bool,
+    plan_only: bool,
+    local_mirror: Optional[str],
+    prefetch_only: bool,
+    lock_timeout: Optional[int],
+    stream_input: bool,
 ) -> None:
     """
     Main function that runs the pipeline for processing configuration files and creating BLAST databases.
@@ -856,6 +1691,37 @@ def create_dbs(
     LOGGER.info(
         f"Parameters: environment={environment}, mod={mod}, store_files={store_files}, cleanup={cleanup}, skip_md5_check={skip_md5_check}"
     )
+    if prefetch_depth > 0:
+        LOGGER.info(
+            f"Download prefetch: depth={prefetch_depth}, workers={download_workers}"
+        )
+    configure_downloads(
+        http_engine=http_engine,
+        ftp_engine=ftp_engine,
+        segments=download_segments,
+        segment_threshold=segment_threshold_mb * 1024 * 1024,
+        cache_dir=cache_dir,
+        cache_max_bytes=int(cache_size_gb * 1024 * 1024 * 1024),
+        local_mirror=local_mirror,
+    )
+    LOGGER.info(
+        f"HTTP engine: {http_engine}, FTP engine: {ftp_engine}, "
+        f"segments: {download_segments} (threshold {segment_threshold_mb} MB)"
+    )
+    LOGGER.info(f"Download cache: {cache_dir} ({cache_size_gb} GB), skip_unchanged={skip_unchanged}")
+    if local_mirror:
+        LOGGER.info(f"Local mirror: {local_mirror}")
+    configure_locks(timeout=lock_timeout)
+    scheduler = configure_transfer_limits(config_yaml)
+    if scheduler.adaptive is not None and prefetch_depth > 0:
+        # Host caps do the throttling; the pool only has to be large enough to fill them
+        download_workers = max(download_workers, scheduler.max_connections())
+        prefetch_depth = max(prefetch_depth, download_workers)
+        LOGGER.info(
+            f"Adaptive download concurrency: {scheduler.adaptive.min_limit}-"
+            f"{scheduler.adaptive.max_limit} connections per host, "
+            f"prefetch depth={prefetch_depth}, workers={download_workers}"
+        )
 
     if skip_md5_check:
         LOGGER.warning("MD5 checksum verification is DISABLED - use with caution")
@@ -883,6 +1749,50 @@ def create_dbs(
             click.echo(create_dbs.get_help(ctx=None))
             return
 
+        if plan_only:
+            if config_yaml or input_json:
+                show_run_plan(
+                    config_yaml,
+                    input_json,
+                    environment,
+                    db_list,
+                    limit_dbs,
+                    max(1, download_workers if prefetch_depth > 0 else 1),
+                )
+            else:
+                msg = "Please provide either a YAML (-g) or JSON (-j) configuration file to plan a run."
+                LOGGER.error(msg)
+                print_status(msg, "error")
+            close_engine()
+            close_ftp_pool()
+            return
+
+        if prefetch_only:
+            if not (config_yaml or input_json):
+                msg = "Please provide either a YAML (-g) or JSON (-j) configuration file to prefetch."
+                LOGGER.error(msg)
+                print_status(msg, "error")
+                return
+            try:
+                counts = prefetch_to_cache(
+                    config_yaml,
+                    input_json,
+                    environment,
+                    db_list,
+                    limit_dbs,
+                    download_workers,
+                    skip_md5_check,
+                )
+            finally:
+                close_engine()
+                close_ftp_pool()
+                cache_stats = close_download_cache()
+                if cache_stats:
+                    LOGGER.info(f"Download cache stats: {cache_stats}")
+            if counts["failed"]:
+                raise RuntimeError(f"{counts['failed']} files could not be prefetched")
+            return
+
         if config_yaml:
             LOGGER.info(f"Processing YAML config: {config_yaml}")
             process_files(
@@ -895,6 +1805,10 @@ def create_dbs(
                 cleanup,
                 limit_dbs,
                 skip_md5_check,
+                prefetch_depth,
+                download_workers,
+                skip_unchanged,
+                stream_input,
             )
         elif input_json:
             LOGGER.info(f"Processing JSON config: {input_json}")
@@ -908,8 +1822,33 @@ def create_dbs(
                 cleanup,
                 limit_dbs,
                 skip_md5_check,
+                prefetch_depth,
+                download_workers,
+                skip_unchanged,
+                stream_input,
             )
 
+        transfer_stats = close_engine()
+        if transfer_stats:
+            LOGGER.info(f"HTTP transfer engine stats: {transfer_stats}")
+        ftp_stats = close_ftp_pool()
+        if ftp_stats:
+            LOGGER.info(f"FTP session pool stats: {ftp_stats}")
+        cache_stats = close_download_cache()
+        if cache_stats:
+            LOGGER.info(f"Download cache stats: {cache_stats}")
+        scheduler_stats = get_scheduler().stats
+        if scheduler_stats["transfers"]:
+            LOGGER.info(f"Transfer scheduler stats: {scheduler_stats}")
+            LOGGER.info(f"Retry policy stats: {get_retry_policy().stats}")
+        workspace_stats = get_workspaces().stats
+        if workspace_stats["workspaces"]:
+            LOGGER.info(f"Workspace stats: {workspace_stats}")
+        LOGGER.info(f"Lock stats: {get_lock_manager().stats}")
+        codec_stats = decompression_stats()
+        if codec_stats:
+            LOGGER.info(f"Decompression stats: {codec_stats}")
+
         # Handle Slack updates with better error checking and batching
         if update_slack and not check_parse_seqids and SLACK_MESSAGES:
             try:
@@ -995,30 +1934,32 @@ def create_dbs(
                         mod_name,
                         env_name,
                     ) in copy_operations:
-                        if copy_type == "databases":
-                            if copy_to_production(
-                                source_path, mod_name, env_name, LOGGER
-                            ):
-                                print_status(
-                                    f"Copied {mod_name}/{env_name} databases to production",
-                                    "success",
-                                )
-                            else:
-                                log_error(
-                                    f"Failed to copy {mod_name}/{env_name} databases to production"
-                                )
-                        else:
-                            if copy_config_to_production(
-                                source_path, mod_name, env_name, LOGGER
-                            ):
-                                print_status(
-                                    f"Copied {mod_name}/{env_name} config to production",
-                                    "success",
-                                )
+                        # Not while another run is rebuilding what is being published
+                        with get_lock_manager().output(mod_name, env_name, LOGGER):
+                            if copy_type == "databases":
+                                if copy_to_production(
+                                    source_path, mod_name, env_name, LOGGER
+                                ):
+                                    print_status(
+                                        f"Copied {mod_name}/{env_name} databases to production",
+                                        "success",
+                                    )
+                                else:
+                                    log_error(
+                                        f"Failed to copy {mod_name}/{env_name} databases to production"
+                                    )
                             else:
-                                log_error(
-                                    f"Failed to copy {mod_name}/{env_name} config to production"
-                                )
+                                if copy_config_to_production(
+                                    source_path, mod_name, env_name, LOGGER
+                                ):
+                                    print_status(
+                                        f"Copied {mod_name}/{env_name} config to production",
+                                        "success",
+                                    )
+                                else:
+                                    log_error(
+                                        f"Failed to copy {mod_name}/{env_name} config to production"
+                                    )
 
             except Exception as e:
                 log_error("Failed to copy to production", e)
@@ -0,0 +1,328 @@
+"""
+download_cache.py
+
+Persistent, content-addressed cache of downloaded files. Entries are keyed by the expected MD5
+from the configuration, or by the URI plus remote validators when there is no checksum to trust.
+Cached files are materialized into ../data by reflink or hardlink (falling back to a copy), and
+least-recently-used entries are evicted to keep the cache within a byte budget. The cache may be
+shared by concurrent runs: the index is updated under a file lock, re-reading what other runs
+wrote, and each object has its own lock, shared while it is read and exclusive while it is
+written, so an object in use is never evicted. Alongside the
+cache, the validators each URI had on its last successful download are recorded so the next run
+can ask the server (or compare the FTP listing) whether the file changed.
+
+Authors: Paulo Nuin, Adam Wright
+Date: October 2026
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from locks import FileLock
+
+# ioctl request that clones the extents of one file into another (Btrfs, XFS)
+FICLONE = 0x40049409
+MD5_PATTERN = re.compile(r"^[0-9a-fA-F]{32}$")
+
+
+def cache_key(
+    uri: str, md5sum: Optional[str] = None, validators: Optional[Dict] = None
+) -> Optional[str]:
+    """
+    Builds the cache key of a download.
+
+    Args:
+        uri: Source URI of the file
+        md5sum: Expected MD5 checksum, used as the key when it is a valid digest
+        validators: Remote "size", "etag" and "modified" values, used with the URI otherwise
+
+    Returns:
+        Optional[str]: "md5-<digest>" or "uri-<sha256>", or None if nothing identifies the content
+    """
+    if md5sum and MD5_PATTERN.match(md5sum):
+        return f"md5-{md5sum.lower()}"
+    validators = validators or {}
+    if validators.get("size") and (validators.get("etag") or validators.get("modified")):
+        identity = [uri, validators["size"], validators.get("etag"), validators.get("modified")]
+        return "uri-" + hashlib.sha256(json.dumps(identity).encode()).hexdigest()
+    return None
+
+
+def reflink(src: str, dest: str) -> None:
+    """Creates dest as a copy-on-write clone of src, raising OSError if unsupported."""
+    with open(src, "rb") as source, open(dest, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.unlink(dest)
+            raise
+
+
+def materialize(src: str, dest: str, symlink: bool = False) -> str:
+    """
+    Places the content of src at dest without copying data where the filesystem allows it.
+
+    Tries a reflink, then a hardlink, then (if symlink is set, for sources that outlive dest)
+    a symbolic link, then a plain copy. Any existing dest is replaced.
+
+    Returns:
+        str: "reflink", "hardlink", "symlink" or "copy"
+    """
+    Path(dest).unlink(missing_ok=True)
+    try:
+        reflink(src, dest)
+        return "reflink"
+    except OSError:
+        pass
+    try:
+        os.link(src, dest)
+        return "hardlink"
+    except OSError:
+        pass
+    if symlink:
+        try:
+            os.symlink(os.path.abspath(src), dest)
+            return "symlink"
+        except OSError:
+            pass
+    shutil.copyfile(src, dest)
+    return "copy"
+
+
+class DownloadCache:
+    """
+    On-disk cache directory holding objects/<key> files and an index.json with their size,
+    source URI and last use time. Safe to share between the download worker threads and
+    between processes.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.locks = self.root / "locks"
+        self.index_file = self.root / "index.json"
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0, "bytes_served": 0}
+        self._lock = threading.Lock()
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.index: Dict[str, Dict] = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict]:
+        try:
+            with open(self.index_file, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        # Drop entries whose object was removed behind the cache's back
+        return {
+            key: entry
+            for key, entry in index.items()
+            if (self.objects / key).is_file()
+            and (self.objects / key).stat().st_size == entry.get("size")
+        }
+
+    def _save_index(self) -> None:
+        tmp_file = self.index_file.with_suffix(".json.tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp_file, self.index_file)
+
+    def _object_lock(self, key: str, shared: bool = False) -> FileLock:
+        return FileLock(self.locks / f"{key}.lock", shared=shared)
+
+    def _update_index(self, change: Callable[[], None]) -> None:
+        """Applies change to the index as currently on disk and saves it, under the index lock."""
+        with self._lock, FileLock(self.root / "index.lock"):
+            self.index = self._load_index()
+            change()
+            self._save_index()
+
+    def total_bytes(self) -> int:
+        """Returns the size of all cached objects."""
+        return sum(entry["size"] for entry in self.index.values())
+
+    def get(self, key: str, dest: str) -> Optional[str]:
+        """
+        Materializes the cached object for key at dest.
+
+        Returns:
+            Optional[str]: How the file was placed ("reflink", "hardlink", "copy"), or None on a miss
+        """
+        path = self.objects / key
+        found = {}
+
+        def _touch() -> None:
+            entry = self.index.get(key)
+            if entry is not None and path.is_file() and path.stat().st_size == entry["size"]:
+                entry["last_used"] = time.time()
+                found.update(entry)
+            else:
+                self.index.pop(key, None)
+
+        # Holding the object's lock shared keeps other runs from evicting or rewriting it
+        with self._object_lock(key, shared=True):
+            self._update_index(_touch)
+            if not found:
+                with self._lock:
+                    self.stats["misses"] += 1
+                return None
+            method = materialize(str(path), dest)
+        with self._lock:
+            self.stats["hits"] += 1
+            self.stats["bytes_served"] += found["size"]
+        return method
+
+    def put(self, key: str, src: str, uri: Optional[str] = None) -> bool:
+        """
+        Adds a verified download to the cache, evicting older entries to make room.
+
+        Returns:
+            bool: False if the file is larger than the whole cache budget
+        """
+        size = Path(src).stat().st_size
+        if size > self.max_bytes:
+            return False
+        with self._object_lock(key):
+            tmp_path = self.objects / f".{key}.{os.getpid()}.tmp"
+            materialize(src, str(tmp_path))
+
+            def _add() -> None:
+                self._evict(self.max_bytes - size, keep=key)
+                os.replace(tmp_path, self.objects / key)
+                self.index[key] = {"size": size, "uri": uri, "last_used": time.time()}
+
+            self._update_index(_add)
+        with self._lock:
+            self.stats["stored"] += 1
+        return True
+
+    def evict(self, budget: Optional[int] = None) -> int:
+        """Evicts least-recently-used entries until the cache fits budget (default max_bytes)."""
+        evicted = []
+        self._update_index(
+            lambda: evicted.append(self._evict(self.max_bytes if budget is None else budget))
+        )
+        return evicted[0]
+
+    def _evict(self, budget: int, keep: Optional[str] = None) -> int:
+        """Evicts entries until the cache fits budget; objects in use by any run are skipped."""
+        evicted = 0
+        total = self.total_bytes() - (self.index[keep]["size"] if keep in self.index else 0)
+        for key in sorted(self.index, key=lambda k: self.index[k]["last_used"]):
+            if total <= budget:
+                break
+            if key == keep:
+                continue
+            lock = self._object_lock(key)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                (self.objects / key).unlink(missing_ok=True)
+            finally:
+                lock.release()
+            total -= self.index.pop(key)["size"]
+            evicted += 1
+        self.stats["evicted"] += evicted
+        return evicted
+
+
+class ValidatorStore:
+    """
+    JSON record of the validators and cache key each URI had on its last successful download.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.records: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, uri: str) -> Optional[Dict]:
+        """Returns what was recorded for uri, or None."""
+        with self._lock:
+            record = self.records.get(uri)
+            return dict(record) if record else None
+
+    def record(self, uri: str, validators: Optional[Dict], key: Optional[str]) -> None:
+        """
+        Records the validators and cache key of a completed download.
+
+        When validators is None (e.g. a cache hit that did not touch the network) the
+        previously recorded validators are kept.
+        """
+        with self._lock, FileLock(self.path.with_suffix(".lock")):
+            # Other runs sharing the cache may have recorded URIs since this store was loaded
+            self.records = self._load()
+            entry = self.records.get(uri, {})
+            if validators is not None:
+                entry.update(
+                    {
+                        name: validators.get(name)
+                        for name in ("size", "etag", "modified", "ranges")
+                    }
+                )
+            entry["key"] = key
+            entry["checked"] = time.time()
+            self.records[uri] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.path.with_suffix(".json.tmp")
+            with open(tmp_file, "w") as f:
+                json.dump(self.records, f, indent=1)
+            os.replace(tmp_file, self.path)
+
+
+_CACHE: Optional[DownloadCache] = None
+_VALIDATORS: Optional[ValidatorStore] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_download_cache(root: Optional[str], max_bytes: int) -> Optional[DownloadCache]:
+    """Returns the shared download cache, or None when caching is disabled."""
+    global _CACHE
+    if not root or max_bytes <= 0:
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None or _CACHE.root != Path(root):
+            _CACHE = DownloadCache(root, max_bytes)
+        _CACHE.max_bytes = max_bytes
+        return _CACHE
+
+
+def get_validator_store(root: Optional[str]) -> Optional[ValidatorStore]:
+    """Returns the shared record of last-seen validators kept in root, or None without a root."""
+    global _VALIDATORS
+    if not root:
+        return None
+    with _CACHE_LOCK:
+        path = Path(root) / "validators.json"
+        if _VALIDATORS is None or _VALIDATORS.path != path:
+            _VALIDATORS = ValidatorStore(path)
+        return _VALIDATORS
+
+
+def close_download_cache() -> Optional[Dict[str, int]]:
+    """Releases the shared download cache and returns its counters, if it was used."""
+    global _CACHE, _VALIDATORS
+    with _CACHE_LOCK:
+        cache, _CACHE = _CACHE, None
+        _VALIDATORS = None
+    if cache is None:
+        return None
+    stats = dict(cache.stats)
+    stats["bytes_cached"] = cache.total_bytes()
+    return stats
@@ -0,0 +1,636 @@
+"""
+fasta_tools.py
+
+Single-pass scanning of FASTA files. FastaScanner is fed the bytes of a FASTA file in chunks of any
+size (read from disk with a large buffer, or tapped from a decompression stream on its way into
+makeblastdb) and, in that one pass, checks the structure of the file, classifies the style of its
+sequence IDs, counts sequences and residues and collects the length distribution (N50) and the
+longest ID. The resulting FastaStats is what later stages and the run summary use instead of
+reading the file again.
+
+HeaderClassifier decides whether the IDs of a file need makeblastdb -parse_seqids with one compiled
+pattern run over whole chunks, so the headers are matched in C rather than one by one; it can stop
+at the first structured ID, decide from the first N headers, or count every header.
+
+SeqidChecker is the preflight of makeblastdb -parse_seqids, which fails (after the whole build)
+on IDs that are too long or repeated. It is fed the ID of every header, by a FastaScanner or by
+read_seqids, and keeps only a 64-bit hash of each; duplicates are found by sorting the hashes
+with numpy, and the IDs behind a repeated hash are read again to tell real duplicates from hash
+collisions, so millions of IDs take tens of MB.
+
+HeaderRewriter rewrites the header lines of a FASTA stream the same way, chunk by chunk, copying
+sequence lines through untouched; it serves both rewrite_headers (a file, replaced atomically) and
+the edit_header hook of a decompression stream on its way into makeblastdb.
+
+Authors: Paulo Nuin, Adam Wright
+Date: October 2026
+"""
+
+import os
+import re
+import time
+from array import array
+from pathlib import Path
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+SCAN_BUFFER = 8 * 1024 * 1024  # bytes read per chunk when scanning a file
+MAX_SEQID_LENGTH = 50  # longest local ID makeblastdb -parse_seqids accepts
+MAX_REPORTED = 10  # offending IDs listed in a preflight report
+
+# Database tags of NCBI-style sequence IDs ("gi|", "ref|", "lcl|", ...)
+SEQID_PREFIXES = frozenset(
+    [b"lcl", b"ref", b"gb", b"emb", b"dbj", b"pir", b"prf", b"sp", b"pdb", b"pat", b"bbs",
+     b"gnl", b"gi"]
+)
+
+# A header with a structured seqid: a database tag ("ref|", "gi|", ...) or two "|" separators
+SEQID_HEADER = re.compile(
+    rb"^>(?:(?:" + b"|".join(sorted(SEQID_PREFIXES)) + rb")\||[^\n]*\|[^\n]*\|)", re.M
+)
+HEADER_LINE = re.compile(rb"^>[^\n]*", re.M)
+HEADER_ID = re.compile(rb"^>[ \t]*([^\s]*)", re.M)
+
+
+def id_style(header: bytes) -> str:
+    """
+    Classifies a header line (without its ">").
+
+    Returns:
+        str: "ncbi" (the ID starts with a database tag such as "ref|"), "pipe" (the header holds
+        two or more "|" separated fields) or "plain"
+    """
+    bar = header.find(b"|")
+    if bar == -1:
+        return "plain"
+    if header[:bar] in SEQID_PREFIXES:
+        return "ncbi"
+    return "pipe" if header.find(b"|", bar + 1) != -1 else "plain"
+
+
+class FastaStats:
+    """What a scan found in a FASTA file: its validity, sequence counts and length distribution."""
+
+    def __init__(self):
+        self.sequences = 0
+        self.residues = 0
+        self.empty_sequences = 0
+        self.min_length = 0
+        self.max_length = 0
+        self.n50 = 0
+        self.longest_id = ""
+        self.header_styles: Dict[str, int] = {"ncbi": 0, "pipe": 0, "plain": 0}
+        self.error: Optional[str] = None
+        self.bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def valid(self) -> bool:
+        """Whether the file is well-formed FASTA with at least one sequence."""
+        return self.error is None and self.sequences > 0
+
+    @property
+    def mean_length(self) -> float:
+        return self.residues / self.sequences if self.sequences else 0.0
+
+    @property
+    def seqid_headers(self) -> int:
+        """Headers whose ID makeblastdb -parse_seqids interprets as a structured seqid."""
+        return self.header_styles["ncbi"] + self.header_styles["pipe"]
+
+    def to_dict(self) -> Dict:
+        """Compact record of the scan for logs and the run summary."""
+        return {
+            "valid": self.valid,
+            "error": self.error,
+            "sequences": self.sequences,
+            "residues": self.residues,
+            "empty_sequences": self.empty_sequences,
+            "min_length": self.min_length,
+            "max_length": self.max_length,
+            "mean_length": round(self.mean_length, 1),
+            "n50": self.n50,
+            "longest_id": self.longest_id,
+            "longest_id_length": len(self.longest_id),
+            "header_styles": dict(self.header_styles),
+            "seqid_fraction": round(self.seqid_headers / self.sequences, 4) if self.sequences else 0.0,
+        }
+
+    def describe(self) -> str:
+        return (
+            f"{self.sequences:,} sequences, {self.residues:,} residues, "
+            f"lengths {self.min_length:,}-{self.max_length:,} (N50 {self.n50:,}), "
+            f"longest ID {len(self.longest_id)} chars, headers {self.header_styles}"
+        )
+
+
+class FastaScanner:
+    """
+    Incremental FASTA scanner.
+
+    Usage:
+        scanner = FastaScanner()
+        for chunk in chunks:
+            scanner.feed(chunk)
+        stats = scanner.finish()
+
+    Chunks may split lines anywhere. Sequence bytes are only counted (with bytes.count, which
+    needs no copy), so the cost of a scan is dominated by reading the file. The ID of every
+    header is passed on to seqids, if given.
+    """
+
+    def __init__(self, seqids: Optional["SeqidChecker"] = None):
+        self.stats = FastaStats()
+        self.seqids = seqids
+        self._lengths = array("Q")
+        self._length: Optional[int] = None  # residues of the current record; None before the first
+        self._carry = b""  # a header line split by the end of the last chunk
+        self._mid_line = False  # whether the next chunk continues a sequence line
+        self._line = 1
+        self._record_line = 0
+        self._longest = 0  # bytes in the longest ID so far
+        self._started = time.monotonic()
+
+    def _fail(self, message: str, line: Optional[int] = None) -> None:
+        if self.stats.error is None:
+            self.stats.error = f"line {line or self._line}: {message}"
+
+    def _end_record(self) -> None:
+        if self._length is None:
+            return
+        if self._length == 0:
+            self.stats.empty_sequences += 1
+            self._fail("header without a sequence", self._record_line)
+        self._lengths.append(self._length)
+
+    def _header(self, header: bytes) -> None:
+        """Ends the current record and starts the one of header (">" excluded)."""
+        self._end_record()
+        self._length = 0
+        self._record_line = self._line
+        if header.endswith(b"\r"):
+            header = header[:-1]
+        self.stats.sequences += 1
+        self.stats.header_styles[id_style(header)] += 1
+        fields = header.split(None, 1)
+        seq_id = fields[0] if fields else b""
+        if not seq_id:
+            self._fail("header without an ID")
+        elif self.seqids is not None:
+            self.seqids.add(seq_id)
+        if len(seq_id) > self._longest:
+            self._longest = len(seq_id)
+            self.stats.longest_id = seq_id.decode("utf-8", "replace")
+        self._line += 1
+
+    def _sequence(self, data: bytes, start: int, end: int, blanks: List[bytes]) -> None:
+        newlines = data.count(b"\n", start, end)
+        residues = end - start - newlines
+        for blank in blanks:
+            residues -= data.count(blank, start, end)
+        if self._length is None:
+            if residues:
+                self._fail("sequence data before the first header")
+        else:
+            self._length += residues
+        self._line += newlines
+
+    def feed(self, data: bytes) -> None:
+        """Scans the next chunk of the file."""
+        self.stats.bytes += len(data)
+        if self._carry:
+            data, self._carry = self._carry + data, b""
+        # Characters other than newlines that are not residues, if the chunk has any at all
+        blanks = [blank for blank in (b"\r", b" ", b"\t") if blank in data]
+        position = 0
+        if self._mid_line:
+            newline = data.find(b"\n")
+            position = len(data) if newline == -1 else newline + 1
+            self._sequence(data, 0, position, blanks)
+            self._mid_line = newline == -1
+        # Complete lines: headers are found by the regex, the sequence between them is counted
+        end = max(data.rfind(b"\n", position) + 1, position)
+        for header in HEADER_LINE.finditer(data, position, end):
+            start, stop = header.span()
+            if start > position:
+                self._sequence(data, position, start, blanks)
+            self._header(data[start + 1 : stop])
+            position = stop + 1
+        if position < end:
+            self._sequence(data, position, end, blanks)
+        # A partial last line: a header is kept for the next chunk, sequence is counted now
+        if end < len(data):
+            if data[end] == 0x3E:  # ">"
+                self._carry = data[end:]
+            else:
+                self._sequence(data, end, len(data), blanks)
+                self._mid_line = True
+
+    def finish(self) -> FastaStats:
+        """Completes the scan and returns its statistics."""
+        if self._carry:
+            self._header(self._carry[1:])
+            self._carry = b""
+        self._end_record()
+        stats = self.stats
+        if stats.sequences == 0:
+            self._fail("no sequences found")
+        lengths = np.sort(np.frombuffer(self._lengths, dtype=np.uint64))[::-1]
+        if len(lengths):
+            stats.residues = int(lengths.sum())
+            stats.max_length, stats.min_length = int(lengths[0]), int(lengths[-1])
+            # N50: the length at which the longest sequences add up to half of all residues
+            half = np.searchsorted(np.cumsum(lengths), (stats.residues + 1) // 2)
+            stats.n50 = int(lengths[half])
+        stats.seconds = time.monotonic() - self._started
+        return stats
+
+
+def scan_fasta(
+    path: str, buffer_size: int = SCAN_BUFFER, seqids: Optional["SeqidChecker"] = None
+) -> FastaStats:
+    """
+    Scans a FASTA file in one pass, feeding its IDs to seqids if given.
+
+    Raises:
+        FileNotFoundError: If path does not exist
+    """
+    scanner = FastaScanner(seqids)
+    with open(Path(path), "rb", buffering=0) as f:
+        while True:
+            chunk = f.read(buffer_size)
+            if not chunk:
+                break
+            scanner.feed(chunk)
+    return scanner.finish()
+
+
+class HeaderClassification:
+    """How many headers a classification looked at and how many had a structured seqid."""
+
+    def __init__(self):
+        self.headers = 0
+        self.matched = 0
+        self.complete = False  # whether every header of the file was looked at
+
+    @property
+    def fraction(self) -> float:
+        return self.matched / self.headers if self.headers else 0.0
+
+    @property
+    def needs_parse_seqids(self) -> bool:
+        return self.matched > 0
+
+    def describe(self) -> str:
+        scope = "all" if self.complete else "first"
+        return (
+            f"{self.matched:,} of {scope} {self.headers:,} headers have structured IDs "
+            f"({self.fraction:.1%})"
+        )
+
+
+class _HeaderLines:
+    """
+    Cuts a stream of chunks into runs of complete lines for header matching. A header line split
+    by the end of a chunk is carried over to the next one; the rest of a split sequence line is
+    skipped instead, so a long unwrapped sequence is never accumulated.
+    """
+
+    def __init__(self):
+        self._carry = b""
+        self._mid_line = False  # whether the next chunk continues a sequence line
+
+    def split(self, data: bytes) -> Tuple[bytes, int, int]:
+        """Returns a buffer and the [start, end) range of its complete lines."""
+        buffer = self._carry + data if self._carry else data
+        start = 0
+        if self._mid_line:
+            start = buffer.find(b"\n") + 1
+            if start == 0:
+                return buffer, 0, 0
+        end = max(buffer.rfind(b"\n", start) + 1, start)
+        tail = buffer[end:]
+        self._mid_line = bool(tail) and not tail.startswith(b">")
+        self._carry = tail if tail.startswith(b">") else b""
+        return buffer, start, end
+
+    def rest(self) -> bytes:
+        """A last header line that had no newline, completed with one."""
+        tail, self._carry = self._carry, b""
+        return tail + b"\n" if tail else b""
+
+
+class HeaderClassifier:
+    """
+    Classifies the headers of a FASTA stream fed in chunks.
+
+    Modes:
+        default          stop at the first header with a structured ID (exact yes/no answer)
+        sample=N         decide from the first N headers only
+        verify=True      look at every header, so the fraction is exact
+
+    feed() returns True once the classifier has seen enough.
+    """
+
+    def __init__(self, sample: Optional[int] = None, verify: bool = False):
+        self.sample = None if verify else sample
+        self.verify = verify
+        self.result = HeaderClassification()
+        self._lines = _HeaderLines()
+        self.done = False
+
+    def feed(self, data: bytes) -> bool:
+        if self.done:
+            return True
+        self._classify(*self._lines.split(data))
+        return self.done
+
+    def _classify(self, buffer: bytes, start: int, end: int) -> None:
+        if start >= end:
+            return
+        result = self.result
+        if self.sample is not None:
+            for header in HEADER_LINE.finditer(buffer, start, end):
+                result.headers += 1
+                if SEQID_HEADER.match(header.group()):
+                    result.matched += 1
+                if result.headers >= self.sample:
+                    self.done = True
+                    return
+        elif self.verify:
+            result.headers += buffer.count(b"\n>", start, end) + buffer.startswith(b">", start)
+            result.matched += len(SEQID_HEADER.findall(buffer, start, end))
+        else:
+            match = SEQID_HEADER.search(buffer, start, end)
+            stop = end if match is None else match.start() + 1
+            result.headers += buffer.count(b"\n>", start, stop) + buffer.startswith(b">", start)
+            if match is not None:
+                result.matched += 1
+                self.done = True
+
+    def finish(self) -> HeaderClassification:
+        """Classifies a last header line without a newline and returns the result."""
+        if not self.done:
+            tail = self._lines.rest()
+            self._classify(tail, 0, len(tail))
+        self.result.complete = not self.done or self.verify
+        return self.result
+
+
+def classify_headers(
+    path: str,
+    sample: Optional[int] = None,
+    verify: bool = False,
+    buffer_size: int = SCAN_BUFFER,
+) -> HeaderClassification:
+    """
+    Classifies the headers of a FASTA file (see HeaderClassifier for the modes).
+
+    Raises:
+        FileNotFoundError: If path does not exist
+    """
+    classifier = HeaderClassifier(sample, verify)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            chunk = f.read(buffer_size)
+            if not chunk or classifier.feed(chunk):
+                break
+    return classifier.finish()
+
+
+def read_seqids(stream: IO[bytes], buffer_size: int = SCAN_BUFFER) -> Iterator[bytes]:
+    """The ID of every header of a binary FASTA stream, in order."""
+    lines = _HeaderLines()
+    while True:
+        chunk = stream.read(buffer_size)
+        if not chunk:
+            break
+        buffer, start, end = lines.split(chunk)
+        for match in HEADER_ID.finditer(buffer, start, end):
+            yield match.group(1)
+    for match in HEADER_ID.finditer(lines.rest()):
+        yield match.group(1)
+
+
+class SeqidReport:
+    """Outcome of a -parse_seqids preflight: IDs that would make makeblastdb fail."""
+
+    def __init__(self, ids: int, max_length: int):
+        self.ids = ids
+        self.max_length = max_length
+        self.too_long = 0
+        self.too_long_examples: List[str] = []
+        self.duplicates = 0
+        self.duplicate_examples: List[str] = []
+        self.collisions = 0  # repeated hashes of different IDs, ruled out by the re-check
+
+    @property
+    def ok(self) -> bool:
+        return not self.too_long and not self.duplicates
+
+    def to_dict(self) -> Dict:
+        return {
+            "ids": self.ids,
+            "too_long": self.too_long,
+            "too_long_examples": self.too_long_examples,
+            "duplicates": self.duplicates,
+            "duplicate_examples": self.duplicate_examples,
+        }
+
+    def describe(self) -> str:
+        if self.ok:
+            return f"{self.ids:,} IDs, all unique and at most {self.max_length} characters"
+        problems = []
+        if self.too_long:
+            problems.append(
+                f"{self.too_long:,} IDs longer than {self.max_length} characters "
+                f"({', '.join(self.too_long_examples)})"
+            )
+        if self.duplicates:
+            problems.append(
+                f"{self.duplicates:,} duplicated IDs ({', '.join(self.duplicate_examples)})"
+            )
+        return f"{self.ids:,} IDs: " + "; ".join(problems)
+
+
+class SeqidChecker:
+    """
+    Collects the IDs of a FASTA file and checks them against the limits of -parse_seqids.
+
+    Usage:
+        checker = SeqidChecker()
+        scan_fasta(path, seqids=checker)
+        report = checker.finish(lambda: seqids_of(path))
+
+    finish() is given a way to read the IDs again, used only if two IDs share a hash.
+    IDs with a database tag (gi|, ref|, ...) are parsed into parts by makeblastdb, so only
+    the others are held to the local ID length limit.
+    """
+
+    def __init__(self, max_length: int = MAX_SEQID_LENGTH):
+        self.max_length = max_length
+        self.ids = 0
+        self.too_long = 0
+        self.too_long_examples: List[str] = []
+        self._hashes = array("q")
+
+    def add(self, seq_id: bytes) -> None:
+        self.ids += 1
+        self._hashes.append(hash(seq_id))
+        if len(seq_id) > self.max_length and id_style(seq_id) != "ncbi":
+            self.too_long += 1
+            if len(self.too_long_examples) < MAX_REPORTED:
+                self.too_long_examples.append(seq_id.decode("utf-8", "replace"))
+
+    def finish(self, reread: Optional[Callable[[], Iterable[bytes]]] = None) -> SeqidReport:
+        """
+        Finds the duplicated IDs and returns the report.
+
+        Args:
+            reread: Returns the IDs again, to resolve repeated hashes into the IDs behind them.
+                Without it, every repeated hash is counted as a duplicate
+        """
+        report = SeqidReport(self.ids, self.max_length)
+        report.too_long, report.too_long_examples = self.too_long, self.too_long_examples
+        hashes = np.sort(np.frombuffer(self._hashes, dtype=np.int64))
+        self._hashes = array("q")
+        repeated = set(np.unique(hashes[1:][hashes[1:] == hashes[:-1]]).tolist())
+        del hashes
+        if not repeated:
+            return report
+        if reread is None:
+            report.duplicates = len(repeated)
+            return report
+
+        seen: Dict[bytes, int] = {}
+        for seq_id in reread():
+            if hash(seq_id) in repeated:
+                seen[seq_id] = seen.get(seq_id, 0) + 1
+        duplicated = [seq_id for seq_id, count in seen.items() if count > 1]
+        report.duplicates = len(duplicated)
+        report.duplicate_examples = [
+            seq_id.decode("utf-8", "replace") for seq_id in duplicated[:MAX_REPORTED]
+        ]
+        report.collisions = len(repeated) - len({hash(seq_id) for seq_id in duplicated})
+        return report
+
+
+def seqids_of(path: str, buffer_size: int = SCAN_BUFFER) -> Iterator[bytes]:
+    """The IDs of a plain FASTA file (see read_seqids)."""
+    with open(path, "rb", buffering=0) as f:
+        yield from read_seqids(f, buffer_size)
+
+
+def check_seqids(path: str, max_length: int = MAX_SEQID_LENGTH) -> SeqidReport:
+    """Runs the -parse_seqids preflight on a plain FASTA file on its own."""
+    checker = SeqidChecker(max_length)
+    for seq_id in seqids_of(path):
+        checker.add(seq_id)
+    return checker.finish(lambda: seqids_of(path))
+
+
+def header_suffix(config_entry: Dict) -> bytes:
+    """
+    Text appended to every header of the FASTA of an entry: "<seqcol> <genus> <species>" when
+    the entry has a seqcol, otherwise "<genus> <species> <version>".
+    """
+    if "seqcol" in config_entry:
+        fields = [config_entry["seqcol"], config_entry["genus"], config_entry["species"]]
+    else:
+        fields = [config_entry["genus"], config_entry["species"], config_entry["version"]]
+    return " ".join(str(field) for field in fields).encode("utf-8")
+
+
+def header_editor(config_entry: Dict) -> Callable[[bytes], bytes]:
+    """Edit of a header line (">" included, newline excluded) adding the suffix of the entry."""
+    suffix = b" " + header_suffix(config_entry)
+    return lambda header: header.strip() + suffix
+
+
+class HeaderRewriter:
+    """
+    Streaming rewrite of the header lines of a FASTA file.
+
+    Usage:
+        rewriter = HeaderRewriter(header_editor(entry))
+        for chunk in chunks:
+            sink.write(rewriter.feed(chunk))
+        sink.write(rewriter.finish())
+
+    edit is called with each header line, ">" included and newline excluded, and returns the
+    line to write instead. Chunks may split lines anywhere; sequence lines are passed through
+    as slices of the input.
+    """
+
+    def __init__(self, edit: Callable[[bytes], bytes]):
+        self.edit = edit
+        self.headers = 0
+        self._header: Optional[List[bytes]] = None  # parts of a header line being read
+        self._line_start = True
+
+    def feed(self, data: bytes) -> bytes:
+        """Rewrites the next chunk; returns the output it completes."""
+        out: List[bytes] = []
+        position, size = 0, len(data)
+        while position < size:
+            if self._header is not None:
+                newline = data.find(b"\n", position)
+                if newline == -1:
+                    self._header.append(data[position:])
+                    break
+                self._header.append(data[position:newline])
+                out.append(self._rewrite(b"".join(self._header)) + b"\n")
+                self._header = None
+                position = newline + 1
+                self._line_start = True
+            elif self._line_start and data[position] == 0x3E:  # ">"
+                self._header = []
+            else:
+                header = data.find(b"\n>", position)
+                end = size if header == -1 else header + 1
+                out.append(data[position:end])
+                self._line_start = data[end - 1] == 0x0A
+                position = end
+        return b"".join(out)
+
+    def _rewrite(self, header: bytes) -> bytes:
+        self.headers += 1
+        return self.edit(header.rstrip(b"\r"))
+
+    def finish(self) -> bytes:
+        """Output of a last header line that had no newline."""
+        if self._header is None:
+            return b""
+        header, self._header = b"".join(self._header), None
+        return self._rewrite(header)
+
+
+def rewrite_headers(
+    source: str,
+    dest: str,
+    edit: Callable[[bytes], bytes],
+    buffer_size: int = SCAN_BUFFER,
+) -> int:
+    """
+    Writes source to dest with every header line rewritten by edit, through a temporary file
+    that replaces dest only once it is complete (so source and dest may be the same file).
+
+    Returns:
+        int: Number of headers rewritten
+    """
+    rewriter = HeaderRewriter(edit)
+    tmp_file = f"{dest}.tmp"
+    try:
+        with open(source, "rb", buffering=0) as f, open(tmp_file, "wb") as sink:
+            while True:
+                chunk = f.read(buffer_size)
+                if not chunk:
+                    break
+                sink.write(rewriter.feed(chunk))
+            sink.write(rewriter.finish())
+        os.replace(tmp_file, dest)
+    except Exception:
+        Path(tmp_file).unlink(missing_ok=True)
+        raise
+    return rewriter.headers
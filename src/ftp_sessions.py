@@ -0,0 +1,291 @@
+"""
+ftp_sessions.py
+
+Persistent FTP sessions shared across database entries. Sessions are logged in once per host
+and reused for listings and retrievals, and each directory is listed once with MLSD so the
+sizes and modify times of every file in it come from a single round-trip.
+
+Authors: Paulo Nuin, Adam Wright
+Date: October 2026
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from ftplib import FTP, all_errors, error_perm
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+DEFAULT_SEGMENT_THRESHOLD = 256 * 1024 * 1024
+
+
+def split_ftp_uri(uri: str) -> Tuple[str, str, str]:
+    """
+    Splits an ftp:// URI into host, directory and file name.
+
+    Returns:
+        Tuple of (host, directory, file name); the directory is absolute
+    """
+    parts = urlsplit(uri)
+    path = unquote(parts.path)
+    directory, _, name = path.rpartition("/")
+    return parts.hostname, directory or "/", name
+
+
+class FtpSessionPool:
+    """
+    Logged-in FTP sessions kept per host, plus a cache of MLSD directory listings.
+
+    Sessions are checked out exclusively with session(), so the pool can be shared by the
+    download worker threads. A session that raised an error is closed instead of returned.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.idle: Dict[str, List[FTP]] = {}
+        self.listings: Dict[Tuple[str, str], Optional[Dict[str, Dict]]] = {}
+        self.stats = {
+            "logins": 0,
+            "sessions_reused": 0,
+            "listings": 0,
+            "listing_hits": 0,
+        }
+        self._lock = threading.Lock()
+        self._listing_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _connect(self, host: str) -> FTP:
+        ftp = FTP(host, timeout=self.timeout)
+        ftp.login()
+        self._count("logins")
+        return ftp
+
+    def _checkout(self, host: str) -> FTP:
+        """Takes a live idle session for host out of the pool, or logs in a new one."""
+        while True:
+            with self._lock:
+                candidate = self.idle.get(host, []).pop() if self.idle.get(host) else None
+            if candidate is None:
+                return self._connect(host)
+            try:
+                candidate.voidcmd("NOOP")
+                self._count("sessions_reused")
+                return candidate
+            except all_errors:
+                candidate.close()
+
+    def _checkin(self, host: str, ftp: FTP) -> None:
+        with self._lock:
+            self.idle.setdefault(host, []).append(ftp)
+
+    @contextmanager
+    def session(self, host: str):
+        """Checks out a logged-in session for host, returning it to the pool afterwards."""
+        ftp = self._checkout(host)
+        try:
+            yield ftp
+        except BaseException:
+            ftp.close()
+            raise
+        else:
+            self._checkin(host, ftp)
+
+    def list_directory(self, host: str, directory: str) -> Optional[Dict[str, Dict]]:
+        """
+        Returns {name: {"size": int, "modify": str}} for every file in a directory.
+
+        The listing is fetched with MLSD once and cached. None is returned (and cached) when
+        the server does not support MLSD.
+        """
+        key = (host, directory)
+        with self._lock:
+            if key in self.listings:
+                self.stats["listing_hits"] += 1
+                return self.listings[key]
+            listing_lock = self._listing_locks.setdefault(key, threading.Lock())
+
+        with listing_lock:
+            with self._lock:
+                if key in self.listings:
+                    self.stats["listing_hits"] += 1
+                    return self.listings[key]
+
+            listing: Optional[Dict[str, Dict]] = {}
+            try:
+                with self.session(host) as ftp:
+                    for name, facts in ftp.mlsd(directory, facts=["type", "size", "modify"]):
+                        if facts.get("type", "file") != "file":
+                            continue
+                        listing[name] = {
+                            "size": int(facts["size"]) if "size" in facts else None,
+                            "modify": facts.get("modify"),
+                        }
+                self._count("listings")
+            except error_perm:
+                listing = None
+
+            with self._lock:
+                self.listings[key] = listing
+            return listing
+
+    def file_info(self, uri: str) -> Optional[Dict]:
+        """
+        Returns {"size": int, "modify": str} for a remote file, or None if it does not exist.
+
+        Uses the cached directory listing when the server supports MLSD, otherwise falls
+        back to SIZE and MDTM on a pooled session.
+        """
+        host, directory, name = split_ftp_uri(uri)
+        listing = self.list_directory(host, directory)
+        if listing is not None:
+            return listing.get(name)
+
+        path = f"{directory.rstrip('/')}/{name}"
+        with self.session(host) as ftp:
+            ftp.voidcmd("TYPE I")
+            try:
+                size = ftp.size(path)
+            except error_perm:
+                return None
+            try:
+                modify = ftp.sendcmd(f"MDTM {path}").split()[-1]
+            except error_perm:
+                modify = None
+        return {"size": size, "modify": modify}
+
+    def retrieve(
+        self,
+        uri: str,
+        callback: Callable[[bytes], object],
+        rest: Optional[int] = None,
+        blocksize: int = DEFAULT_BLOCK_SIZE,
+    ) -> None:
+        """Streams a remote file to callback over a pooled session, optionally from offset rest."""
+        host, directory, name = split_ftp_uri(uri)
+        with self.session(host) as ftp:
+            ftp.retrbinary(
+                f"RETR {directory.rstrip('/')}/{name}", callback, blocksize, rest
+            )
+
+    def retrieve_segmented(
+        self,
+        uri: str,
+        dest: str,
+        size: int,
+        segments: int,
+        throttle: Optional[Callable[[int], float]] = None,
+    ) -> int:
+        """
+        Downloads a file of known size as concurrent REST-offset segments into a
+        preallocated local file, one session per segment. throttle, if given, is called
+        with each block size and returns the seconds to pause (bandwidth limit).
+
+        Returns:
+            int: Number of bytes written
+        """
+        host, directory, name = split_ftp_uri(uri)
+        path = f"{directory.rstrip('/')}/{name}"
+        segment_size = -(-size // segments)
+        bounds = [(start, min(start + segment_size, size)) for start in range(0, size, segment_size)]
+
+        fd = os.open(dest, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            with ThreadPoolExecutor(
+                max_workers=len(bounds), thread_name_prefix="ftp-segment"
+            ) as pool:
+                written = pool.map(
+                    lambda bound: self._retrieve_range(host, path, fd, *bound, throttle), bounds
+                )
+                return sum(written)
+        finally:
+            os.close(fd)
+
+    def _retrieve_range(
+        self,
+        host: str,
+        path: str,
+        fd: int,
+        start: int,
+        stop: int,
+        throttle: Optional[Callable[[int], float]] = None,
+    ) -> int:
+        """Retrieves bytes start..stop-1 of path and writes them at the same offset."""
+        ftp = self._checkout(host)
+        offset = start
+        try:
+            ftp.voidcmd("TYPE I")
+            with ftp.transfercmd(f"RETR {path}", rest=start or None) as conn:
+                while offset < stop:
+                    data = conn.recv(min(DEFAULT_BLOCK_SIZE, stop - offset))
+                    if not data:
+                        break
+                    os.pwrite(fd, data, offset)
+                    offset += len(data)
+                    if throttle is not None:
+                        time.sleep(throttle(len(data)))
+        except BaseException:
+            ftp.close()
+            raise
+
+        if offset != stop:
+            ftp.close()
+            raise EOFError(f"Segment {start}-{stop} of {path} ended at byte {offset:,}")
+
+        # Segments that stop before end of file abort the transfer; the session only goes
+        # back to the pool if the server still answers with a clean completion reply
+        try:
+            ftp.voidresp()
+            self._checkin(host, ftp)
+        except all_errors:
+            ftp.close()
+        return offset - start
+
+    def forget(self, uri: str) -> None:
+        """Drops the cached listing of the directory holding uri."""
+        host, directory, _ = split_ftp_uri(uri)
+        with self._lock:
+            self.listings.pop((host, directory), None)
+
+    def close(self) -> None:
+        """Logs out of all idle sessions."""
+        with self._lock:
+            sessions = [ftp for host_sessions in self.idle.values() for ftp in host_sessions]
+            self.idle.clear()
+        for ftp in sessions:
+            try:
+                ftp.quit()
+            except all_errors:
+                ftp.close()
+
+
+_POOL: Optional[FtpSessionPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_ftp_pool() -> FtpSessionPool:
+    """Returns the shared FTP session pool, creating it on first use."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = FtpSessionPool()
+        return _POOL
+
+
+def close_ftp_pool() -> Optional[Dict[str, int]]:
+    """Closes the shared FTP session pool and returns its counters, if it was started."""
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is None:
+        return None
+    stats = dict(pool.stats)
+    pool.close()
+    return stats
@@ -0,0 +1,200 @@
+"""
+locks.py
+
+Advisory file locks that let several create_dbs invocations share a host. Each lock is an flock
+on a small file, so it is released by the kernel if the holding process dies, and it excludes
+other threads of the same process as well as other processes. Locks are fine-grained:
+
+    output(mod, environment)   the BLAST databases, config and workspaces of one MOD/environment
+    file(path)                 a shared file updated by read-modify-write (genome browser maps)
+    DownloadCache              takes its own per-object and index locks inside the cache dir
+
+A run waiting for a lock held by another run logs who holds it and keeps waiting, unless the
+lock manager was given a timeout, in which case LockTimeout is raised.
+
+Authors: Paulo Nuin, Adam Wright
+Date: October 2026
+"""
+
+import fcntl
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+LOCK_DIR = "../data/locks"
+POLL_INTERVAL = 0.5  # seconds between attempts while waiting for a lock
+
+
+class LockTimeout(Exception):
+    """Raised when a lock could not be acquired within the timeout."""
+
+
+class FileLock:
+    """
+    Advisory lock on path, exclusive or shared.
+
+    Usage:
+        with FileLock("/data/locks/WB.dev.lock", logger=logger):
+            ... only one holder at a time ...
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        shared: bool = False,
+        timeout: Optional[float] = None,
+        logger=None,
+    ):
+        self.path = Path(path)
+        self.shared = shared
+        self.timeout = timeout
+        self.logger = logger
+        self.waited = 0.0
+        self._fd: Optional[int] = None
+
+    def _try_lock(self) -> bool:
+        mode = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+        try:
+            fcntl.flock(self._fd, mode | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def holder(self) -> str:
+        """Description of the process that last took the lock exclusively, for log messages."""
+        try:
+            return self.path.read_text().strip() or "unknown"
+        except OSError:
+            return "unknown"
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Takes the lock, waiting for other holders if blocking.
+
+        Returns:
+            bool: True once the lock is held, False if not blocking and it is taken
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o664)
+        started = time.monotonic()
+        if not self._try_lock():
+            if not blocking:
+                os.close(self._fd)
+                self._fd = None
+                return False
+            if self.logger is not None:
+                self.logger.info(f"Waiting for lock {self.path} (held by {self.holder()})")
+            while not self._try_lock():
+                if self.timeout is not None and time.monotonic() - started >= self.timeout:
+                    os.close(self._fd)
+                    self._fd = None
+                    raise LockTimeout(
+                        f"Lock {self.path} still held by {self.holder()} after {self.timeout:.0f} s"
+                    )
+                time.sleep(POLL_INTERVAL)
+        self.waited = time.monotonic() - started
+        if not self.shared:
+            os.ftruncate(self._fd, 0)
+            os.write(self._fd, f"pid {os.getpid()} on {os.uname().nodename}\n".encode())
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    @property
+    def locked(self) -> bool:
+        return self._fd is not None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+def lock_name(*parts: str) -> str:
+    """Turns the parts of a lock's identity into a safe file name."""
+    return ".".join(re.sub(r"[^\w.-]+", "_", str(part)).strip("_") or "_" for part in parts)
+
+
+class LockManager:
+    """
+    Hands out the run-level locks of a host, all kept under one lock directory.
+
+    Usage:
+        locks = get_lock_manager()
+        with locks.output(mod, environment, logger):
+            ... build and publish the databases of mod/environment ...
+        with locks.file(map_file, logger):
+            ... read, update and write map_file ...
+    """
+
+    def __init__(self, root: str = LOCK_DIR, timeout: Optional[float] = None):
+        self.root = Path(root)
+        self.timeout = timeout
+        self.stats = {"acquired": 0, "waited": 0, "wait_seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def _make(self, path: Path, shared: bool, logger) -> "_CountedLock":
+        return _CountedLock(self, path, shared, logger)
+
+    def output(self, mod: str, environment: Optional[str], logger=None) -> FileLock:
+        """Exclusive lock on the outputs of one MOD/environment."""
+        name = lock_name(mod, environment or "default")
+        return self._make(self.root / "output" / f"{name}.lock", False, logger)
+
+    def file(self, path: Union[str, Path], logger=None) -> FileLock:
+        """Exclusive lock on a shared file, keyed by its absolute path."""
+        name = lock_name(*Path(os.path.abspath(path)).parts[1:])
+        return self._make(self.root / "files" / f"{name}.lock", False, logger)
+
+    def _record(self, waited: float) -> None:
+        with self._lock:
+            self.stats["acquired"] += 1
+            if waited >= POLL_INTERVAL:
+                self.stats["waited"] += 1
+                self.stats["wait_seconds"] = round(self.stats["wait_seconds"] + waited, 3)
+
+
+class _CountedLock(FileLock):
+    """FileLock that reports to its LockManager how long it had to wait."""
+
+    def __init__(self, manager: LockManager, path: Path, shared: bool, logger):
+        super().__init__(path, shared, manager.timeout, logger)
+        self.manager = manager
+
+    def acquire(self, blocking: bool = True) -> bool:
+        acquired = super().acquire(blocking)
+        if acquired:
+            self.manager._record(self.waited)
+        return acquired
+
+
+_MANAGER: Optional[LockManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def configure_locks(root: str = LOCK_DIR, timeout: Optional[float] = None) -> LockManager:
+    """Replaces the lock manager of the process with one using root and timeout."""
+    global _MANAGER
+    with _MANAGER_LOCK:
+        _MANAGER = LockManager(root, timeout)
+        return _MANAGER
+
+
+def get_lock_manager() -> LockManager:
+    """Returns the lock manager of the process, creating a default one on first use."""
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = LockManager()
+        return _MANAGER
+
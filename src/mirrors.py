@@ -0,0 +1,226 @@
+"""
+mirrors.py
+
+Hedged downloads for entries whose file is published on several mirrors. Besides its "uri", an
+entry may list alternative sources of the same file, which share its "md5sum":
+
+    {
+      "uri": "https://ftp.ncbi.nlm.nih.gov/genomes/.../genomic.fna.gz",
+      "mirrors": ["ftp://ftp.ebi.ac.uk/pub/.../genomic.fna.gz"],
+      "md5sum": "..."
+    }
+
+All sources are probed concurrently and the download starts from the one that answered fastest.
+If that transfer stays below a throughput floor once its grace period is over, a second source
+is started alongside it; a source that fails makes way for the next one. The first source to
+finish a verified copy wins and the other transfer is cancelled. The settings come from the
+optional "mirrors" block of the "transfer" section of the global YAML:
+
+    transfer:
+      mirrors:
+        throughput_floor: 2MB     # per second; slower transfers get a hedge
+        grace_period: 20          # seconds a transfer may ramp up before it is judged
+
+Authors: Paulo Nuin, Adam Wright
+Date: October 2026
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from partial_downloads import PartialDownload
+from retry_policy import TransferCancelled, get_retry_policy
+from transfer_scheduler import parse_rate
+
+MIRROR_SETTINGS: Dict[str, Any] = {
+    "throughput_floor": 1024 * 1024,  # bytes per second below which a transfer is hedged
+    "grace_period": 20.0,  # seconds before a transfer's throughput is judged
+    "check_interval": 1.0,  # seconds between checks of the running transfers
+}
+
+
+def configure_mirrors(settings: Optional[Dict]) -> None:
+    """Sets the hedging settings from the "mirrors" block of the "transfer" settings."""
+    settings = settings or {}
+    if "throughput_floor" in settings:
+        MIRROR_SETTINGS["throughput_floor"] = parse_rate(settings["throughput_floor"]) or 0
+    if "grace_period" in settings:
+        MIRROR_SETTINGS["grace_period"] = float(settings["grace_period"])
+
+
+def entry_sources(entry: Dict) -> List[str]:
+    """Returns the URI of an entry followed by its mirrors, without duplicates."""
+    sources = [entry["uri"], *entry.get("mirrors", [])]
+    return list(dict.fromkeys(sources))
+
+
+def rank_sources(
+    sources: List[str], probe: Callable[[str], Dict[str, Any]], logger
+) -> List[str]:
+    """
+    Orders sources by how fast they answer a probe.
+
+    Sources that did not report a size come after the ones that did, and sources whose host
+    circuit is open are left out unless nothing else is left.
+
+    Args:
+        sources: Candidate URIs of the same file
+        probe: Returns the remote validators ("size", ...) of a URI
+        logger: Entry-specific logger
+
+    Returns:
+        List[str]: Sources, best first
+    """
+    policy = get_retry_policy()
+    candidates = [uri for uri in sources if policy.available(uri)] or sources
+
+    def _time(uri: str) -> float:
+        started = time.monotonic()
+        try:
+            answered = bool(probe(uri).get("size"))
+        except Exception:
+            answered = False
+        latency = time.monotonic() - started
+        logger.info(f"Mirror probe: {uri} {'answered' if answered else 'failed'} in {latency:.2f} s")
+        return latency if answered else float("inf")
+
+    with ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="probe") as pool:
+        latencies = list(pool.map(_time, candidates))
+    return [uri for _, uri in sorted(zip(latencies, candidates), key=lambda item: item[0])]
+
+
+class SourceTransfer:
+    """One source of a hedged download: its scratch file, progress and outcome."""
+
+    def __init__(self, uri: str, file_name: str):
+        self.uri = uri
+        self.file_name = file_name
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        self.success = False
+        self._lock = threading.Lock()
+
+    def progress(self, amount: int) -> None:
+        """Per-chunk callback of the download; aborts it once the transfer is cancelled."""
+        if self.cancelled.is_set():
+            raise TransferCancelled(self.uri)
+        with self._lock:
+            self.bytes += amount
+
+    def throughput(self) -> float:
+        return self.bytes / max(time.monotonic() - self.started, 1e-6)
+
+    def discard(self) -> None:
+        """Removes the scratch file and any partial download of it."""
+        PartialDownload(self.file_name, self.uri).discard()
+        Path(self.file_name).unlink(missing_ok=True)
+
+
+class HedgedDownload:
+    """
+    Downloads one file from the best of several sources, hedging slow transfers.
+
+    Usage:
+        hedge = HedgedDownload(sources, target, fetch, logger)
+        success = hedge.run()
+
+    fetch(uri, file_name, progress) downloads and verifies uri into file_name, calling
+    progress with every chunk received, and returns success.
+    """
+
+    def __init__(
+        self,
+        sources: List[str],
+        target: str,
+        fetch: Callable[[str, str, Callable[[int], None]], bool],
+        logger,
+    ):
+        self.sources = sources
+        self.target = target
+        self.fetch = fetch
+        self.logger = logger
+        self.transfers: List[SourceTransfer] = []
+        self.winner: Optional[SourceTransfer] = None
+        self._changed = threading.Condition()
+
+    def _start(self) -> None:
+        index = len(self.transfers)
+        transfer = SourceTransfer(self.sources[index], f"{self.target}.mirror{index}")
+        self.transfers.append(transfer)
+        self.logger.info(f"Downloading from source {index + 1}/{len(self.sources)}: {transfer.uri}")
+
+        def _run() -> None:
+            try:
+                transfer.success = self.fetch(transfer.uri, transfer.file_name, transfer.progress)
+            except Exception as e:
+                self.logger.error(f"Download from {transfer.uri} failed: {str(e)}")
+            with self._changed:
+                if transfer.cancelled.is_set():
+                    transfer.discard()
+                transfer.finished.set()
+                self._changed.notify_all()
+
+        threading.Thread(target=_run, name=f"mirror-{index}", daemon=True).start()
+
+    def _should_hedge(self, running: List[SourceTransfer]) -> bool:
+        if len(running) != 1 or len(self.transfers) >= len(self.sources):
+            return False
+        transfer = running[0]
+        if time.monotonic() - transfer.started < MIRROR_SETTINGS["grace_period"]:
+            return False
+        return transfer.throughput() < MIRROR_SETTINGS["throughput_floor"]
+
+    def run(self) -> bool:
+        """
+        Runs the hedged download.
+
+        Returns:
+            bool: True if a verified copy from one of the sources is at target
+        """
+        self._start()
+        with self._changed:
+            while self.winner is None:
+                running = [t for t in self.transfers if not t.finished.is_set()]
+                self.winner = next((t for t in self.transfers if t.success), None)
+                if self.winner is not None:
+                    break
+                if not running:
+                    if len(self.transfers) == len(self.sources):
+                        break
+                    self._start()
+                    continue
+                if self._should_hedge(running):
+                    slow = running[0]
+                    self.logger.warning(
+                        f"{slow.uri} is at {slow.throughput() / 1024 / 1024:.2f} MB/s, below the "
+                        f"floor of {MIRROR_SETTINGS['throughput_floor'] / 1024 / 1024:.2f} MB/s; "
+                        f"hedging with the next source"
+                    )
+                    self._start()
+                    continue
+                self._changed.wait(MIRROR_SETTINGS["check_interval"])
+
+            # Call off the other transfers; one still running cleans up after itself
+            for transfer in self.transfers:
+                if transfer is self.winner:
+                    continue
+                if transfer.finished.is_set():
+                    transfer.discard()
+                else:
+                    transfer.cancelled.set()
+
+        if self.winner is None:
+            self.logger.error(f"All {len(self.sources)} sources failed for {self.target}")
+            return False
+        os.replace(self.winner.file_name, self.target)
+        self.logger.info(
+            f"Source {self.winner.uri} won ({self.winner.bytes:,} bytes, "
+            f"{self.winner.throughput() / 1024 / 1024:.2f} MB/s)"
+        )
+        return True
@@ -0,0 +1,117 @@
+"""
+partial_downloads.py
+
+Bookkeeping for resumable downloads. Transfers are written to a ".part" file next to the final
+target, with a small JSON sidecar recording the validators (size, ETag, modify time) the remote
+file had when the transfer started. A later attempt resumes from the end of the ".part" file
+only if the remote still reports the same validators; otherwise it starts again from byte zero.
+
+Authors: Paulo Nuin, Adam Wright
+Date: October 2026
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+PART_SUFFIX = ".part"
+SIDECAR_SUFFIX = ".part.json"
+
+# Validators compared to decide whether a remote file is unchanged since the last attempt
+VALIDATOR_KEYS = ("size", "etag", "modified")
+
+
+def is_partial_file(path: Path) -> bool:
+    """True for ".part" files and their sidecars, which must survive FASTA cleanup."""
+    return path.name.endswith(PART_SUFFIX) or path.name.endswith(SIDECAR_SUFFIX)
+
+
+class PartialDownload:
+    """
+    The ".part" file and validator sidecar belonging to one download target.
+
+    Usage:
+        partial = PartialDownload(file_name, uri, validators)
+        offset = partial.resume_offset()   # 0 unless the remote is unchanged
+        partial.begin()
+        ... write to partial.part_file, appending from offset ...
+        partial.complete()                 # renames the .part file to file_name
+    """
+
+    def __init__(self, file_name: str, uri: str, validators: Optional[Dict] = None):
+        self.file_name = str(file_name)
+        self.part_file = self.file_name + PART_SUFFIX
+        self.sidecar_file = self.file_name + SIDECAR_SUFFIX
+        self.uri = uri
+        self.validators = {
+            key: (validators or {}).get(key) for key in VALIDATOR_KEYS
+        }
+
+    def load_sidecar(self) -> Optional[Dict]:
+        """Returns the recorded validators of an earlier attempt, or None."""
+        try:
+            with open(self.sidecar_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_unchanged(self, recorded: Optional[Dict]) -> bool:
+        """
+        True if the recorded validators match the current ones.
+
+        The size must be known and equal, and at least one of ETag or modify time must be
+        known on both sides and equal; a size match alone is not trusted.
+        """
+        if not recorded or recorded.get("uri") != self.uri:
+            return False
+        size = self.validators["size"]
+        if not size or recorded.get("size") != size:
+            return False
+
+        compared = False
+        for key in ("etag", "modified"):
+            current, previous = self.validators[key], recorded.get(key)
+            if current and previous:
+                if current != previous:
+                    return False
+                compared = True
+        return compared
+
+    def resume_offset(self) -> int:
+        """
+        Returns the byte offset a transfer can resume from.
+
+        Leftover ".part" files that cannot be resumed (remote changed, validators missing, or
+        already at full size) are discarded and 0 is returned.
+        """
+        part = Path(self.part_file)
+        if not part.exists():
+            return 0
+        offset = part.stat().st_size
+        if 0 < offset < (self.validators["size"] or 0) and self.is_unchanged(
+            self.load_sidecar()
+        ):
+            return offset
+        self.discard()
+        return 0
+
+    def begin(self) -> None:
+        """Records the current validators before any bytes are written."""
+        sidecar = {"uri": self.uri, **self.validators}
+        sidecar["started"] = datetime.now().isoformat(timespec="seconds")
+        tmp_file = self.sidecar_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(sidecar, f)
+        os.replace(tmp_file, self.sidecar_file)
+
+    def complete(self) -> None:
+        """Moves the finished ".part" file into place and removes the sidecar."""
+        os.replace(self.part_file, self.file_name)
+        Path(self.sidecar_file).unlink(missing_ok=True)
+
+    def discard(self) -> None:
+        """Removes the ".part" file and sidecar."""
+        Path(self.part_file).unlink(missing_ok=True)
+        Path(self.sidecar_file).unlink(missing_ok=True)
@@ -0,0 +1,262 @@
+"""
+retry_policy.py
+
+Retries for downloads. A failed transfer is retried a few times with exponential backoff and full
+jitter, drawing on a retry budget shared by the whole run so a bad day cannot multiply the run
+time. Consecutive failed transfers are counted per host (a transfer fails once all its attempts
+have failed): once a host has failed `failure_threshold` transfers in a row its circuit opens and
+further transfers from it fail immediately instead of each waiting out their own timeouts. After
+`reset_timeout` seconds a single trial transfer is let through; if it succeeds the circuit closes
+again.
+
+Settings come from the optional "retry" block of the "transfer" section of the global YAML:
+
+    transfer:
+      retry:
+        max_attempts: 3
+        base_delay: 2           # seconds, doubled per attempt (with jitter)
+        max_delay: 60
+        budget: 20              # retries allowed in the whole run
+        failure_threshold: 3    # consecutive failed transfers that open a host's circuit
+        reset_timeout: 300      # seconds before an open circuit lets a trial through
+
+Authors: Paulo Nuin, Adam Wright
+Date: October 2026
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from transfer_scheduler import host_of
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 2.0
+DEFAULT_MAX_DELAY = 60.0
+DEFAULT_RETRY_BUDGET = 20
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT = 300.0
+
+
+class TransferCancelled(Exception):
+    """Raised from a progress callback to call off a transfer that is no longer needed."""
+
+
+class PermanentError(Exception):
+    """
+    Raised by an attempt when the server refused the file outright (HTTP 4xx, FTP 550):
+    retrying cannot help, and the host answered, so it is not blamed.
+    """
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker: closed while a host works, open after failure_threshold
+    consecutive failures, half-open (one trial allowed) once reset_timeout has passed.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures: Dict[str, int] = {}
+        self.opened_at: Dict[str, float] = {}
+        self.trials: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def _cooling_down(self, host: str) -> bool:
+        opened = self.opened_at.get(host)
+        return opened is not None and time.monotonic() - opened < self.reset_timeout
+
+    def is_open(self, host: str) -> bool:
+        """True while transfers from host should fail fast (without taking a trial)."""
+        with self._lock:
+            return self._cooling_down(host) or self.trials.get(host, False)
+
+    def allow(self, host: str) -> bool:
+        """Whether a transfer from host may start; takes the trial of a half-open circuit."""
+        with self._lock:
+            if host not in self.opened_at:
+                return True
+            if self._cooling_down(host) or self.trials.get(host):
+                return False
+            self.trials[host] = True
+            return True
+
+    def release_trial(self, host: str) -> None:
+        """Gives back the trial of a half-open circuit whose transfer was called off."""
+        with self._lock:
+            self.trials.pop(host, None)
+
+    def record_success(self, host: str) -> None:
+        with self._lock:
+            self.failures.pop(host, None)
+            self.opened_at.pop(host, None)
+            self.trials.pop(host, None)
+
+    def record_failure(self, host: str) -> int:
+        """
+        Counts a failure of host.
+
+        Returns:
+            int: The consecutive failures of host if this failure opened (or re-opened) the
+            circuit, otherwise 0
+        """
+        with self._lock:
+            failures = self.failures[host] = self.failures.get(host, 0) + 1
+            trial = self.trials.pop(host, False)
+            if trial or failures >= self.failure_threshold:
+                self.opened_at[host] = time.monotonic()
+                return failures
+            return 0
+
+
+class RetryPolicy:
+    """
+    Runs transfer attempts with backoff, a run-wide retry budget and a per-host circuit breaker.
+
+    Usage:
+        policy = get_retry_policy()
+        if not policy.available(uri):
+            ... fail fast or pick another source ...
+        success = policy.call(uri, attempt, logger)   # attempt(number) -> bool
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        budget: int = DEFAULT_RETRY_BUDGET,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {"attempts": 0, "retries": 0, "failed_fast": 0, "circuits_opened": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, settings: Optional[Dict]) -> "RetryPolicy":
+        """Builds a policy from the "retry" block of the "transfer" settings."""
+        settings = settings or {}
+        return cls(
+            max_attempts=int(settings.get("max_attempts", DEFAULT_MAX_ATTEMPTS)),
+            base_delay=float(settings.get("base_delay", DEFAULT_BASE_DELAY)),
+            max_delay=float(settings.get("max_delay", DEFAULT_MAX_DELAY)),
+            budget=int(settings.get("budget", DEFAULT_RETRY_BUDGET)),
+            breaker=CircuitBreaker(
+                int(settings.get("failure_threshold", DEFAULT_FAILURE_THRESHOLD)),
+                float(settings.get("reset_timeout", DEFAULT_RESET_TIMEOUT)),
+            ),
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait after failed attempt number attempt (full jitter)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def available(self, uri: str) -> bool:
+        """False (counted as failing fast) while the circuit of the host of uri is open."""
+        if not self.breaker.is_open(host_of(uri)):
+            return True
+        with self._lock:
+            self.stats["failed_fast"] += 1
+        return False
+
+    def _take_retry(self) -> bool:
+        with self._lock:
+            if self.budget <= 0:
+                return False
+            self.budget -= 1
+            self.stats["retries"] += 1
+            return True
+
+    def call(self, uri: str, attempt: Callable[[int], bool], logger) -> bool:
+        """
+        Runs attempt(1), attempt(2), ... until one succeeds or the policy gives up.
+
+        Exceptions raised by attempt count as failed attempts, except TransferCancelled,
+        which is passed on without retrying or blaming the host, and PermanentError, which
+        ends the transfer at once without blaming the host. The host's circuit breaker
+        counts the transfer, not its attempts, so one dead file cannot open the circuit
+        for every other file on the same host.
+
+        Returns:
+            bool: True if an attempt succeeded
+        """
+        host = host_of(uri)
+        if not self.breaker.allow(host):
+            with self._lock:
+                self.stats["failed_fast"] += 1
+            logger.error(f"Circuit open for {host}, not trying {uri}")
+            return False
+
+        for number in range(1, self.max_attempts + 1):
+            with self._lock:
+                self.stats["attempts"] += 1
+            try:
+                success = attempt(number)
+            except TransferCancelled:
+                # Neither outcome is known, so a half-open circuit waits for another trial
+                self.breaker.release_trial(host)
+                raise
+            except PermanentError as e:
+                logger.error(f"{uri} cannot be downloaded: {str(e)}")
+                self.breaker.record_success(host)
+                return False
+            except Exception as e:
+                logger.error(f"Attempt {number} for {uri} failed: {str(e)}", exc_info=True)
+                success = False
+            if success:
+                self.breaker.record_success(host)
+                return True
+
+            if number == self.max_attempts:
+                break
+            if not self._take_retry():
+                logger.error(f"Retry budget of the run is exhausted, giving up on {uri}")
+                break
+            delay = self.backoff(number)
+            logger.warning(
+                f"Attempt {number}/{self.max_attempts} for {uri} failed, "
+                f"retrying in {delay:.1f} s"
+            )
+            time.sleep(delay)
+
+        failures = self.breaker.record_failure(host)
+        if failures:
+            with self._lock:
+                self.stats["circuits_opened"] += 1
+            logger.error(
+                f"Circuit opened for {host} after {failures} "
+                f"consecutive failed transfers; its transfers fail fast for "
+                f"{self.breaker.reset_timeout:.0f} s"
+            )
+        return False
+
+
+_POLICY: Optional[RetryPolicy] = None
+_POLICY_LOCK = threading.Lock()
+
+
+def configure_retries(settings: Optional[Dict]) -> RetryPolicy:
+    """Replaces the shared retry policy with one built from the "retry" settings."""
+    global _POLICY
+    with _POLICY_LOCK:
+        _POLICY = RetryPolicy.from_config(settings)
+        return _POLICY
+
+
+def get_retry_policy() -> RetryPolicy:
+    """Returns the shared retry policy, creating a default one on first use."""
+    global _POLICY
+    with _POLICY_LOCK:
+        if _POLICY is None:
+            _POLICY = RetryPolicy()
+        return _POLICY
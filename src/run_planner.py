@@ -0,0 +1,321 @@
+"""
+run_planner.py
+
+Planning pass over everything a run will process. Walks the providers and environments of the
+global YAML (or a single JSON), applies the same database filters as process_json_entries, and
+resolves the distinct set of (URI, md5) pairs so each file is fetched and verified once and then
+fanned out to every entry that references it. The same plan backs the --plan preflight, which
+resolves remote sizes concurrently and estimates the bytes, disk footprint and time of a run.
+
+Authors: Paulo Nuin, Adam Wright
+Date: October 2026
+"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import yaml
+
+from compression import COMPRESSED_SUFFIXES
+from download_cache import materialize
+
+SHARED_DIR = "../data/shared"
+
+# Rough factors behind the preflight estimates, from past runs of typical MOD FASTA files
+PREFLIGHT_WORKERS = 16
+DECOMPRESSION_RATIO = {"nucl": 3.5, "prot": 2.0}  # uncompressed / compressed FASTA size
+DOWNLOAD_RATE = 20 * 1024 * 1024  # bytes per second per download
+BUILD_RATE = {"nucl": 40 * 1024 * 1024, "prot": 15 * 1024 * 1024}  # makeblastdb input bytes/s
+
+
+def provider_json_file(config_yaml: str, provider_name: str, environment: str) -> Path:
+    """Returns the JSON configuration of one provider and environment of the global YAML."""
+    return (
+        Path(config_yaml).parent
+        / f"{provider_name}/databases.{provider_name}.{environment}.json"
+    )
+
+
+def config_json_files(
+    config_yaml: Optional[str], input_json: Optional[str], environment: Optional[str]
+) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Lists the JSON files a run processes.
+
+    Returns:
+        List of (json_file, environment, mod) tuples; mod is None for a single JSON file
+    """
+    if input_json:
+        return [(input_json, environment, None)]
+
+    with open(config_yaml) as f:
+        config = yaml.safe_load(f)
+    files = []
+    for provider in config["data_providers"]:
+        for env in provider["environments"]:
+            json_file = provider_json_file(config_yaml, provider["name"], env)
+            if json_file.exists():
+                files.append((str(json_file), env, provider["name"]))
+    return files
+
+
+def selected_entries(
+    json_file: str, db_list: Optional[List[str]] = None, limit_dbs: Optional[int] = None
+) -> List[Dict]:
+    """Returns the entries of a JSON file that process_json_entries would process."""
+    with open(json_file, "r") as f:
+        entries = json.load(f).get("data", [])
+    if limit_dbs is not None and limit_dbs > 0:
+        entries = entries[:limit_dbs]
+    return [
+        entry
+        for entry in entries
+        if not db_list or entry.get("blast_title", "Unknown") in db_list
+    ]
+
+
+def download_key(entry: Dict) -> Tuple[str, str]:
+    """Identifies the file an entry needs: its URI and expected checksum."""
+    return entry["uri"], entry.get("md5sum", "")
+
+
+class DownloadPlan:
+    """
+    The distinct downloads of a run and how many entries reference each one.
+    """
+
+    def __init__(self):
+        self.references: Dict[Tuple[str, str], List[Tuple[str, Optional[str], Dict]]] = {}
+
+    def add(self, json_file: str, environment: Optional[str], entry: Dict) -> None:
+        self.references.setdefault(download_key(entry), []).append(
+            (json_file, environment, entry)
+        )
+
+    def consumers(self, key: Tuple[str, str]) -> int:
+        """Number of entries that need the file identified by key."""
+        return len(self.references.get(key, []))
+
+    def distinct(self) -> int:
+        return len(self.references)
+
+    def total_references(self) -> int:
+        return sum(len(refs) for refs in self.references.values())
+
+
+def plan_downloads(
+    config_yaml: Optional[str],
+    input_json: Optional[str],
+    environment: Optional[str],
+    db_list: Optional[List[str]] = None,
+    limit_dbs: Optional[int] = None,
+) -> DownloadPlan:
+    """
+    Builds the download plan of a run from its configuration files.
+    """
+    plan = DownloadPlan()
+    for json_file, env, _ in config_json_files(config_yaml, input_json, environment):
+        for entry in selected_entries(json_file, db_list, limit_dbs):
+            if "uri" in entry:
+                plan.add(json_file, env, entry)
+    return plan
+
+
+class SharedDownloads:
+    """
+    Fetches each planned (URI, md5) once and fans the verified file out to later entries.
+
+    The first entry to need a file downloads it as usual; if other entries reference the
+    same file, a link to it is kept in SHARED_DIR and materialized into their download
+    target instead of fetching it again. The shared copy is removed once its last consumer
+    has taken it, or when the run closes.
+    """
+
+    def __init__(self, plan: DownloadPlan, shared_dir: str = SHARED_DIR):
+        self.plan = plan
+        self.shared_dir = Path(shared_dir)
+        self.results: Dict[Tuple[str, str], bool] = {}
+        self.remaining = {key: plan.consumers(key) for key in plan.references}
+        self.stats = {"downloads": 0, "fanned_out": 0, "bytes_saved": 0}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+    def _shared_path(self, key: Tuple[str, str]) -> Path:
+        uri, md5sum = key
+        return self.shared_dir / f"{md5sum or 'nomd5'}_{Path(uri).name}"
+
+    def fetch(self, entry: Dict, download: Callable[[], bool], target: str, logger) -> bool:
+        """
+        Provides the file of entry at target, downloading it only the first time.
+
+        Args:
+            entry: Database entry configuration
+            download: Downloads and verifies the file into target, returning success
+            target: Local path the entry expects the file at
+            logger: Entry-specific logger
+
+        Returns:
+            bool: True if the file is available at target
+        """
+        key = download_key(entry)
+        if key not in self.remaining:
+            return download()
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            shared = self._shared_path(key)
+            if key not in self.results:
+                success = download()
+                self.results[key] = success
+                self.stats["downloads"] += 1
+                if success and self.remaining[key] > 1:
+                    self.shared_dir.mkdir(parents=True, exist_ok=True)
+                    materialize(target, str(shared))
+            elif self.results[key] and shared.exists():
+                method = materialize(str(shared), target)
+                self.stats["fanned_out"] += 1
+                self.stats["bytes_saved"] += shared.stat().st_size
+                logger.info(f"Reusing file fetched earlier in this run ({method}): {target}")
+                success = True
+            elif self.results[key]:
+                # The shared copy was lost; fetch it again rather than fail the entry
+                success = download()
+            else:
+                logger.error(f"Earlier download of {entry['uri']} failed in this run")
+                success = False
+
+            self.remaining[key] -= 1
+            if self.remaining[key] <= 0:
+                shared.unlink(missing_ok=True)
+        return success
+
+    def close(self) -> Dict[str, int]:
+        """Removes shared copies that were not consumed and returns the counters."""
+        for key in self.plan.references:
+            self._shared_path(key).unlink(missing_ok=True)
+        try:
+            self.shared_dir.rmdir()
+        except OSError:
+            pass
+        return dict(self.stats)
+
+
+class PlanRow:
+    """Preflight result for one distinct file of the plan."""
+
+    def __init__(self, key: Tuple[str, str], references: List[Tuple[str, Optional[str], Dict]]):
+        self.uri, self.md5sum = key
+        self.titles = [entry.get("blast_title", "Unknown") for _, _, entry in references]
+        self.seqtype = references[0][2].get("seqtype", "nucl")
+        self.size: Optional[int] = None
+        self.cached = False
+        self.error: Optional[str] = None
+
+    @property
+    def consumers(self) -> int:
+        return len(self.titles)
+
+    def fetch_bytes(self) -> int:
+        """Bytes that have to be transferred (0 when the file is in the download cache)."""
+        return 0 if self.cached else self.size or 0
+
+    def decompressed_bytes(self) -> int:
+        """Estimated size of the uncompressed FASTA."""
+        if not self.size:
+            return 0
+        if self.uri.endswith(COMPRESSED_SUFFIXES):
+            return int(self.size * DECOMPRESSION_RATIO.get(self.seqtype, 3.0))
+        return self.size
+
+    def build_seconds(self) -> float:
+        """Estimated makeblastdb time of all entries built from this file."""
+        rate = BUILD_RATE.get(self.seqtype, BUILD_RATE["nucl"])
+        return self.decompressed_bytes() / rate * self.consumers
+
+
+def preflight(
+    plan: DownloadPlan,
+    probe: Callable[[str], Dict[str, Any]],
+    is_cached: Callable[[str, str], bool],
+    workers: int = PREFLIGHT_WORKERS,
+) -> List[PlanRow]:
+    """
+    Resolves the remote size of every distinct file of the plan concurrently.
+
+    Args:
+        plan: Download plan of the run
+        probe: Returns the remote validators ("size", ...) of a URI
+        is_cached: Tells whether (uri, md5sum) can be served from the download cache
+        workers: Number of concurrent probes
+
+    Returns:
+        List[PlanRow]: One row per distinct file, in plan order
+    """
+    rows = [PlanRow(key, refs) for key, refs in plan.references.items()]
+
+    def _resolve(row: PlanRow) -> None:
+        try:
+            row.cached = is_cached(row.uri, row.md5sum)
+            row.size = probe(row.uri).get("size")
+            if not row.size:
+                row.error = "size unknown"
+        except Exception as e:
+            row.error = str(e)
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(workers, len(rows))), thread_name_prefix="preflight"
+    ) as pool:
+        list(pool.map(_resolve, rows))
+    return rows
+
+
+def summarize_preflight(
+    rows: List[PlanRow], download_workers: int = 1, download_rate: int = DOWNLOAD_RATE
+) -> Dict[str, Any]:
+    """
+    Totals a preflight: bytes to fetch, disk footprint and predicted time.
+
+    Downloads are assumed to run download_workers at a time at download_rate each, and
+    builds to run one after another.
+    """
+    fetch_bytes = sum(row.fetch_bytes() for row in rows)
+    download_seconds = fetch_bytes / (download_rate * max(1, download_workers))
+    build_seconds = sum(row.build_seconds() for row in rows)
+    return {
+        "entries": sum(row.consumers for row in rows),
+        "distinct_files": len(rows),
+        "cached_files": sum(1 for row in rows if row.cached),
+        "unresolved_files": sum(1 for row in rows if row.error),
+        "fetch_bytes": fetch_bytes,
+        "decompressed_bytes": sum(row.decompressed_bytes() for row in rows),
+        "largest_decompressed_bytes": max(
+            (row.decompressed_bytes() for row in rows), default=0
+        ),
+        "download_seconds": download_seconds,
+        "build_seconds": build_seconds,
+    }
+
+
+def format_bytes(size: Optional[float]) -> str:
+    """Formats a byte count for the plan table."""
+    if size is None:
+        return "?"
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def format_seconds(seconds: float) -> str:
+    """Formats an estimated duration for the plan table."""
+    if seconds < 60:
+        return f"{seconds:.0f} s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f} min"
+    return f"{seconds / 3600:.1f} h"
@@ -6,7 +6,7 @@ and informative console output throughout the application.
 """
 
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from rich import box
 from rich.console import Console
@@ -89,6 +89,20 @@ def show_summary(
         console.print(details, style="dim")
 
 
+def show_table(title: str, columns: List[str], rows: List[List[Any]]) -> None:
+    """
+    Shows rows of values in a table with the given column headers.
+    """
+    table = Table(box=box.ROUNDED, title=f"[bold blue]{title}")
+    for column in columns:
+        table.add_column(column, style="cyan" if column == columns[0] else "white")
+
+    for row in rows:
+        table.add_row(*(str(value) for value in row))
+
+    console.print(table)
+
+
 def log_error(error_message: str, error: Optional[Exception] = None) -> None:
     """
     Displays an error message with optional exception details.
@@ -0,0 +1,447 @@
+"""
+transfer_scheduler.py
+
+Admission control for downloads. Every transfer takes connection slots on its host before it
+starts, so no host sees more than its configured number of concurrent connections, and the bytes
+it receives are paced through token buckets (one global, optionally one per host) to stay under
+the bandwidth mirrors tolerate.
+
+With adaptive concurrency enabled, an AIMD controller measures each host's aggregate throughput
+and raises its connection cap one step at a time while that keeps paying off, halving it when
+throughput collapses or transfers fail.
+
+Limits come from the optional "transfer" section of the global YAML:
+
+    transfer:
+      max_connections_per_host: 4
+      bandwidth_limit: 100MB          # bytes per second for the whole run
+      hosts:
+        ftp.ebi.ac.uk:
+          max_connections: 2
+          bandwidth_limit: 20MB
+      adaptive:                       # optional AIMD control of per-host connections
+        min_connections: 1
+        max_connections: 8
+        interval: 10                  # seconds of traffic per decision
+
+Authors: Paulo Nuin, Adam Wright
+Date: October 2026
+"""
+
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Union
+from urllib.parse import urlsplit
+
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 4
+DEFAULT_ADAPTIVE_INTERVAL = 10.0
+# Relative throughput change that counts as better or worse between two AIMD windows
+ADAPTIVE_TOLERANCE = 0.05
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def parse_rate(value: Union[int, float, str, None]) -> Optional[float]:
+    """
+    Parses a bandwidth limit such as 1048576, "512K", "20MB" or "1.5 GB/s" into bytes per second.
+
+    Returns:
+        Optional[float]: Bytes per second, or None for no limit
+    """
+    if value is None or value == 0:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMG]?)(?:i?B)?(?:/s)?\s*", str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid bandwidth limit: {value!r}")
+    return float(match.group(1)) * SIZE_UNITS[match.group(2).upper()]
+
+
+def host_of(uri: str) -> str:
+    """Returns the host name a URI connects to."""
+    return urlsplit(uri).hostname or ""
+
+
+class TokenBucket:
+    """
+    Bandwidth limiter. Callers reserve bytes and are told how long to wait before using them;
+    reservations may run into debt, so concurrent callers queue up fairly behind each other.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: int) -> float:
+        """Takes amount tokens and returns the seconds to wait before they are covered."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class HostLimiter:
+    """
+    Counts connections in use per host. Transfers can take several slots at once (segmented
+    downloads), atomically, so two large transfers never deadlock holding half of what they need.
+    """
+
+    def __init__(self, default_limit: int, host_limits: Optional[Dict[str, int]] = None):
+        self.default_limit = default_limit
+        self.host_limits = host_limits or {}
+        self.in_use: Dict[str, int] = {}
+        self._condition = threading.Condition()
+
+    def limit(self, host: str) -> int:
+        return self.host_limits.get(host, self.default_limit)
+
+    def acquire(self, host: str, count: int = 1) -> int:
+        """
+        Waits until count slots (at most the host limit) are free and takes them.
+
+        The limit is re-read on every wake-up, so a cap lowered while waiting shrinks the
+        request instead of leaving it waiting for more slots than the host will ever have.
+
+        Returns:
+            int: Number of slots taken
+        """
+        granted = 0
+
+        def free() -> bool:
+            nonlocal granted
+            granted = max(1, min(count, self.limit(host)))
+            return self.in_use.get(host, 0) + granted <= self.limit(host)
+
+        with self._condition:
+            self._condition.wait_for(free)
+            self.in_use[host] = self.in_use.get(host, 0) + granted
+        return granted
+
+    def release(self, host: str, count: int) -> None:
+        with self._condition:
+            self.in_use[host] -= count
+            self._condition.notify_all()
+
+    def set_limit(self, host: str, limit: int) -> None:
+        """Changes the cap of a host; waiting transfers are re-checked immediately."""
+        with self._condition:
+            self.host_limits[host] = limit
+            self._condition.notify_all()
+
+    def is_saturated(self, host: str) -> bool:
+        """True if every slot of the host is in use."""
+        with self._condition:
+            return self.in_use.get(host, 0) >= self.limit(host)
+
+
+class AimdController:
+    """
+    Additive-increase / multiplicative-decrease control of per-host connection caps.
+
+    Received bytes are counted per host, together with the time the host had at least one
+    transfer running, so idle time between files does not count against its throughput. Once
+    a window of `interval` seconds has passed, the host's aggregate throughput is compared with
+    the previous window (a window in which nothing was transferred decides nothing):
+
+    - transfers failed during the window: halve the cap (multiplicative decrease)
+    - throughput fell after the last increase: halve the cap, the extra connection hurt
+    - all slots were busy and throughput did not fall: one more connection (additive increase)
+    - otherwise: keep the cap
+    """
+
+    def __init__(
+        self,
+        min_limit: int,
+        max_limit: int,
+        interval: float = DEFAULT_ADAPTIVE_INTERVAL,
+        logger=None,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.interval = interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.windows: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _window(self, host: str) -> Dict:
+        return self.windows.setdefault(
+            host,
+            {
+                "started": time.monotonic(),
+                "active": 0,
+                "busy_since": None,
+                "busy": 0.0,
+                "bytes": 0,
+                "failures": 0,
+                "saturated": False,
+                "previous": None,
+                "last_action": None,
+            },
+        )
+
+    def clamp(self, limit: int) -> int:
+        return max(self.min_limit, min(self.max_limit, limit))
+
+    def transfer_started(self, host: str) -> None:
+        with self._lock:
+            window = self._window(host)
+            if not window["active"]:
+                window["busy_since"] = time.monotonic()
+            window["active"] += 1
+
+    def transfer_finished(self, host: str) -> None:
+        with self._lock:
+            window = self._window(host)
+            window["active"] -= 1
+            if not window["active"]:
+                window["busy"] += time.monotonic() - window["busy_since"]
+                window["busy_since"] = None
+
+    def record(self, host: str, amount: int) -> None:
+        with self._lock:
+            self._window(host)["bytes"] += amount
+
+    def record_failure(self, host: str) -> None:
+        with self._lock:
+            self._window(host)["failures"] += 1
+
+    def mark_saturated(self, host: str) -> None:
+        with self._lock:
+            self._window(host)["saturated"] = True
+
+    def evaluate(self, host: str, limit: int) -> Optional[int]:
+        """
+        Closes the host's window if it is due and decides on a new cap.
+
+        Returns:
+            Optional[int]: The new cap, or None if the window is still open or the cap stays
+        """
+        with self._lock:
+            window = self._window(host)
+            now = time.monotonic()
+            if now - window["started"] < self.interval:
+                return None
+
+            busy = window["busy"]
+            if window["active"]:
+                busy += now - window["busy_since"]
+                window["busy_since"] = now
+            if not busy and not window["failures"]:
+                # Idle throughout: nothing was measured, so the last decision stands
+                window.update(started=now, busy=0.0, bytes=0, saturated=False)
+                return None
+
+            throughput = window["bytes"] / busy if busy else 0.0
+            previous = window["previous"]
+            if window["failures"]:
+                new_limit, reason = self.clamp(limit // 2), f"{window['failures']} failed transfers"
+            elif (
+                window["last_action"] == "increase"
+                and previous
+                and throughput < previous * (1 - ADAPTIVE_TOLERANCE)
+            ):
+                new_limit, reason = self.clamp(limit // 2), "throughput fell after increase"
+            elif window["saturated"] and (
+                previous is None or throughput >= previous * (1 - ADAPTIVE_TOLERANCE)
+            ):
+                new_limit, reason = self.clamp(limit + 1), "all connections busy"
+            else:
+                new_limit, reason = limit, "steady"
+
+            if new_limit > limit:
+                window["last_action"] = "increase"
+            elif new_limit < limit:
+                window["last_action"] = "decrease"
+            else:
+                window["last_action"] = None
+            window.update(
+                started=now,
+                busy=0.0,
+                bytes=0,
+                failures=0,
+                saturated=False,
+                previous=throughput,
+            )
+
+        if new_limit == limit:
+            return None
+        self.logger.info(
+            f"Adaptive concurrency for {host}: {limit} -> {new_limit} connections "
+            f"({reason}; {throughput / 1024 / 1024:.2f} MB/s"
+            + (f", previously {previous / 1024 / 1024:.2f} MB/s)" if previous else ")")
+        )
+        return new_limit
+
+
+class TransferScheduler:
+    """
+    Per-host connection caps plus global and per-host token buckets.
+
+    Usage:
+        with scheduler.slot(uri, connections=4) as granted:
+            ... run the transfer on at most `granted` connections, calling
+            time.sleep(scheduler.reserve(uri, len(chunk))) for every chunk received ...
+    """
+
+    def __init__(
+        self,
+        max_connections_per_host: int = DEFAULT_MAX_CONNECTIONS_PER_HOST,
+        bandwidth_limit: Optional[float] = None,
+        hosts: Optional[Dict[str, Dict]] = None,
+        adaptive: Optional[Dict] = None,
+        logger=None,
+    ):
+        hosts = hosts or {}
+        self.limiter = HostLimiter(
+            max_connections_per_host,
+            {
+                host: int(settings["max_connections"])
+                for host, settings in hosts.items()
+                if settings.get("max_connections")
+            },
+        )
+        rate = parse_rate(bandwidth_limit)
+        self.bucket = TokenBucket(rate) if rate else None
+        self.host_buckets: Dict[str, TokenBucket] = {}
+        for host, settings in hosts.items():
+            host_rate = parse_rate(settings.get("bandwidth_limit"))
+            if host_rate:
+                self.host_buckets[host] = TokenBucket(host_rate)
+        self.adaptive: Optional[AimdController] = None
+        if adaptive:
+            self.adaptive = AimdController(
+                int(adaptive.get("min_connections", 1)),
+                int(adaptive.get("max_connections", max_connections_per_host * 2)),
+                float(adaptive.get("interval", DEFAULT_ADAPTIVE_INTERVAL)),
+                logger,
+            )
+            # Configured caps become starting points inside the adaptive bounds
+            self.limiter.default_limit = self.adaptive.clamp(self.limiter.default_limit)
+            for host, limit in self.limiter.host_limits.items():
+                self.limiter.host_limits[host] = self.adaptive.clamp(limit)
+        self.stats = {"transfers": 0, "waited_for_slot_s": 0.0, "throttled_s": 0.0}
+        if self.adaptive is not None:
+            self.stats.update(adaptive_decisions=0, host_limits={})
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, settings: Optional[Dict], logger=None) -> "TransferScheduler":
+        """Builds a scheduler from the "transfer" section of the global YAML."""
+        settings = settings or {}
+        return cls(
+            max_connections_per_host=int(
+                settings.get("max_connections_per_host", DEFAULT_MAX_CONNECTIONS_PER_HOST)
+            ),
+            bandwidth_limit=settings.get("bandwidth_limit"),
+            hosts=settings.get("hosts"),
+            adaptive=settings.get("adaptive"),
+            logger=logger,
+        )
+
+    def max_connections(self) -> int:
+        """Largest number of connections any host may get, now or after adaptation."""
+        if self.adaptive is not None:
+            return self.adaptive.max_limit
+        return max([self.limiter.default_limit, *self.limiter.host_limits.values()])
+
+    def connection_limit(self, uri: str) -> int:
+        """Maximum number of concurrent connections allowed to the host of uri."""
+        return self.limiter.limit(host_of(uri))
+
+    @contextmanager
+    def slot(self, uri: str, connections: int = 1):
+        """
+        Holds connection slots on the host of uri for the duration of a transfer.
+
+        Yields:
+            int: Number of connections granted (connections, capped at the host limit)
+        """
+        host = host_of(uri)
+        start = time.monotonic()
+        granted = self.limiter.acquire(host, connections)
+        with self._lock:
+            self.stats["transfers"] += 1
+            self.stats["waited_for_slot_s"] += time.monotonic() - start
+        if self.adaptive is not None:
+            self.adaptive.transfer_started(host)
+            if self.limiter.is_saturated(host):
+                self.adaptive.mark_saturated(host)
+        try:
+            yield granted
+        finally:
+            if self.adaptive is not None:
+                self.adaptive.transfer_finished(host)
+            self.limiter.release(host, granted)
+
+    def record_failure(self, uri: str) -> None:
+        """Reports a failed transfer to the adaptive controller."""
+        if self.adaptive is not None:
+            self.adaptive.record_failure(host_of(uri))
+            self._adapt(host_of(uri))
+
+    def _adapt(self, host: str) -> None:
+        new_limit = self.adaptive.evaluate(host, self.limiter.limit(host))
+        if new_limit is not None:
+            self.limiter.set_limit(host, new_limit)
+            with self._lock:
+                self.stats["adaptive_decisions"] += 1
+                self.stats["host_limits"][host] = new_limit
+
+    def reserve(self, uri: str, amount: int) -> float:
+        """Accounts amount received bytes and returns the seconds the receiver should pause."""
+        if self.adaptive is not None:
+            self.adaptive.record(host_of(uri), amount)
+            self._adapt(host_of(uri))
+        delays = [0.0]
+        if self.bucket is not None:
+            delays.append(self.bucket.reserve(amount))
+        host_bucket = self.host_buckets.get(host_of(uri))
+        if host_bucket is not None:
+            delays.append(host_bucket.reserve(amount))
+        delay = max(delays)
+        if delay:
+            with self._lock:
+                self.stats["throttled_s"] += delay
+        return delay
+
+    def throttle_for(self, uri: str) -> Optional[Callable[[int], float]]:
+        """
+        Returns a per-chunk callback that accounts received bytes and paces them, or None
+        when neither a bandwidth limit nor adaptive concurrency applies to uri.
+        """
+        if (
+            self.bucket is None
+            and self.adaptive is None
+            and host_of(uri) not in self.host_buckets
+        ):
+            return None
+        return lambda amount: self.reserve(uri, amount)
+
+
+_SCHEDULER: Optional[TransferScheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def configure_scheduler(settings: Optional[Dict], logger=None) -> TransferScheduler:
+    """Replaces the shared scheduler with one built from the "transfer" settings."""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        _SCHEDULER = TransferScheduler.from_config(settings, logger)
+        return _SCHEDULER
+
+
+def get_scheduler() -> TransferScheduler:
+    """Returns the shared transfer scheduler, creating a default one on first use."""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = TransferScheduler()
+        return _SCHEDULER
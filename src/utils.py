@@ -12,13 +12,16 @@ Date: started September 2023
 import hashlib
 import json
 import logging
-import re
+import os
+import time
 from datetime import datetime
-from ftplib import FTP
+from ftplib import error_perm
 from pathlib import Path
 from shutil import copyfile
 from subprocess import PIPE, Popen
-from typing import Any, Optional
+from tempfile import TemporaryFile
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import unquote, urlsplit
 
 from dotenv import dotenv_values
 from rich import print as rprint
@@ -26,13 +29,53 @@ from rich.console import Console
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 
+from download_cache import cache_key, get_download_cache, get_validator_store, materialize
+from fasta_tools import classify_headers, header_editor, rewrite_headers, scan_fasta
+from ftp_sessions import get_ftp_pool
+from http_transfer import get_engine
+from locks import get_lock_manager
+from partial_downloads import PartialDownload, is_partial_file
+from retry_policy import PermanentError, TransferCancelled, get_retry_policy
 from terminal import create_progress, log_error, print_status
+from transfer_scheduler import get_scheduler
 
 console = Console()
 
 # TODO: move to ENV
 MODS = ["FB", "SGD", "WB", "XB", "ZFIN", "RGD"]
 
+# Read buffer used for MD5 hashing, so memory use does not grow with file size
+MD5_CHUNK_SIZE = 8 * 1024 * 1024
+# Size of the reads taken from a download stream while hashing it
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Client errors worth retrying: request timeout and rate limiting
+RETRYABLE_4XX = (408, 429)
+
+# Download behaviour shared by get_files_http and get_files_ftp, set from the CLI
+DOWNLOAD_SETTINGS: Dict[str, Any] = {
+    "http_engine": "native",  # "native" (pooled asyncio engine) or "wget"
+    "http_connections_per_host": 4,
+    "ftp_engine": "native",  # "native" (pooled FTP sessions) or "wget"
+    "segments": 1,  # byte ranges fetched concurrently for large files (1 = single stream)
+    "segment_threshold": 256 * 1024 * 1024,  # minimum file size for a segmented download
+    "cache_dir": None,  # download cache and validator record directory (None disables both)
+    "cache_max_bytes": 50 * 1024 * 1024 * 1024,  # LRU eviction budget of the cache (0 disables it)
+    "local_mirror": None,  # directory of staged files consulted before the network
+}
+
+# How each URI was obtained in this run: "downloaded", "cached" or "not_modified"
+DOWNLOAD_STATUS: Dict[str, str] = {}
+
+
+def configure_downloads(**settings) -> None:
+    """
+    Updates DOWNLOAD_SETTINGS, rejecting unknown keys.
+    """
+    unknown = set(settings) - set(DOWNLOAD_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown download settings: {', '.join(sorted(unknown))}")
+    DOWNLOAD_SETTINGS.update(settings)
+
 
 def copy_config_file(json_file: Path, config_dir: Path, logger) -> bool:
     """
@@ -276,6 +319,8 @@ def cleanup_fasta_files(data_dir: Path, logger) -> None:
         fasta_files = []
         for pattern in fasta_patterns:
             fasta_files.extend(list(data_dir.glob(pattern)))
+        # Interrupted transfers are kept so the next run can resume them
+        fasta_files = [f for f in fasta_files if not is_partial_file(f)]
 
         if not fasta_files:
             logger.info("No FASTA files found for cleanup")
@@ -327,7 +372,32 @@ def extendable_logger(log_name, file_name, level=logging.INFO) -> Any:
     return specified_logger
 
 
-def check_md5sum(fasta_file: str, expected_md5: str, logger) -> bool:
+def compute_md5(file_path: str, chunk_size: int = MD5_CHUNK_SIZE) -> str:
+    """
+    Calculates the MD5 checksum of a file by streaming it through a fixed-size buffer.
+
+    Args:
+        file_path (str): Path to the file
+        chunk_size (int): Size of the read buffer in bytes
+
+    Returns:
+        str: Hex digest of the file contents
+    """
+    md5 = hashlib.md5()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            md5.update(view[:read])
+    return md5.hexdigest()
+
+
+def check_md5sum(
+    fasta_file: str, expected_md5: str, logger, chunk_size: int = MD5_CHUNK_SIZE
+) -> bool:
     """
     Checks MD5 checksum of a file with detailed logging.
 
@@ -335,31 +405,35 @@ def check_md5sum(fasta_file: str, expected_md5: str, logger) -> bool:
         fasta_file (str): Path to the file
         expected_md5 (str): Expected MD5 checksum
         logger (logging.Logger): Logger instance
+        chunk_size (int): Size of the read buffer in bytes
 
     Returns:
         bool: True if checksums match, False otherwise
     """
     logger.info(f"Calculating MD5 checksum for {fasta_file}")
     try:
-        with open(fasta_file, "rb") as f:
-            file_size = Path(fasta_file).stat().st_size
-            logger.info(f"File size: {file_size} bytes")
+        file_size = Path(fasta_file).stat().st_size
+        logger.info(f"File size: {file_size} bytes")
 
-            # Calculate MD5
-            start_time = datetime.now()
-            calculated_md5 = hashlib.md5(f.read()).hexdigest()
-            duration = datetime.now() - start_time
+        # Calculate MD5
+        start_time = datetime.now()
+        calculated_md5 = compute_md5(fasta_file, chunk_size)
+        duration = datetime.now() - start_time
 
-            logger.info(f"MD5 calculation completed in {duration}")
-            logger.info(f"Expected MD5: {expected_md5}")
-            logger.info(f"Calculated MD5: {calculated_md5}")
+        seconds = duration.total_seconds()
+        throughput = file_size / seconds / (1024 * 1024) if seconds > 0 else 0.0
+        logger.info(
+            f"MD5 calculation completed in {duration} ({throughput:.1f} MB/s)"
+        )
+        logger.info(f"Expected MD5: {expected_md5}")
+        logger.info(f"Calculated MD5: {calculated_md5}")
 
-            if calculated_md5 != expected_md5:
-                logger.error("MD5 checksums do not match")
-                return False
+        if calculated_md5 != expected_md5:
+            logger.error("MD5 checksums do not match")
+            return False
 
-            logger.info("MD5 checksums match")
-            return True
+        logger.info("MD5 checksums match")
+        return True
 
     except Exception as e:
         logger.error(f"MD5 checksum verification failed: {str(e)}", exc_info=True)
@@ -400,27 +474,11 @@ def get_mod_from_json(input_json) -> str:
 
 def edit_fasta(fasta_file: str, config_entry: dict) -> bool:
     """
-    Edits the FASTA file based on the configuration entry.
+    Edits the FASTA file based on the configuration entry, appending the seqcol or
+    genus/species/version of the entry to every header. The file is streamed through
+    a temporary file and replaced once complete.
     """
-    original_file = []
-
-    with open(fasta_file, "r") as fh:
-        lines = fh.readlines()
-
-        for line in lines:
-            if line.startswith(">"):
-                line = line.strip()
-                if "seqcol" in config_entry.keys():
-                    line += f" {config_entry['seqcol']} {config_entry['genus']} {config_entry['species']}\n"
-                else:
-                    line += f" {config_entry['genus']} {config_entry['species']} {config_entry['version']}\n"
-                original_file.append(line)
-            else:
-                original_file.append(line)
-
-    edited_file = open(fasta_file, "w")
-    edited_file.writelines(original_file)
-    edited_file.close()
+    rewrite_headers(fasta_file, fasta_file, header_editor(config_entry))
 
     return True
 
@@ -428,27 +486,10 @@ def edit_fasta(fasta_file: str, config_entry: dict) -> bool:
 def validate_fasta(filename: str) -> bool:
     """
     Validates if a file is in FASTA format without using Biopython.
+    Use fasta_tools.scan_fasta directly to also get the statistics of the file.
     """
     try:
-        with open(filename, "r") as f:
-            first_line = f.readline().strip()
-            if not first_line:
-                return False
-
-            if not first_line.startswith(">"):
-                return False
-
-            has_sequence = False
-            for line in f:
-                line = line.strip()
-                if line.startswith(">"):
-                    if not has_sequence:
-                        return False
-                    has_sequence = False
-                elif line:  # sequence line
-                    has_sequence = True
-
-            return has_sequence
+        return scan_fasta(filename).valid
 
     except Exception as e:
         console.log(f"[red]Error validating FASTA file: {e}[/red]")
@@ -570,44 +611,445 @@ def slack_message(messages: list, subject="BLAST Database Update") -> bool:
         return False
 
 
-def needs_parse_seqids(fasta_file: str, mod: str = None) -> bool:
+def needs_parse_seqids(
+    fasta_file: str, mod: str = None, sample: Optional[int] = None, verify: bool = False
+) -> bool:
     """
     Determines if a FASTA file needs the -parse_seqids flag by examining its headers.
     ZFIN files should NOT use parse_seqids, all others should check headers.
+
+    By default the file is read until the first header with a structured ID. With sample,
+    the decision is made from the first sample headers; with verify, every header is
+    classified (see fasta_tools.classify_headers for the fraction of matching headers).
     """
     # ZFIN files should NOT use parse_seqids
     if mod == "ZFIN":
         return False
-    id_patterns = [
-        r"^>.*\|.*\|",
-        r"^>lcl\|",
-        r"^>ref\|",
-        r"^>gb\|",
-        r"^>emb\|",
-        r"^>dbj\|",
-        r"^>pir\|",
-        r"^>prf\|",
-        r"^>sp\|",
-        r"^>pdb\|",
-        r"^>pat\|",
-        r"^>bbs\|",
-        r"^>gnl\|",
-        r"^>gi\|",
-    ]
-
-    patterns = [re.compile(pattern) for pattern in id_patterns]
 
     try:
-        with open(fasta_file, "r") as f:
-            for line in f:
-                if line.startswith(">"):
-                    if any(pattern.match(line) for pattern in patterns):
-                        return True
+        return classify_headers(fasta_file, sample, verify).needs_parse_seqids
+    except FileNotFoundError:
+        raise
     except Exception as e:
         console.log(f"Warning: Error checking FASTA headers: {e}")
         return True
 
-    return False
+
+class HashingWriter:
+    """
+    Writes a download to disk while computing its MD5 checksum, so the file never
+    has to be read back for verification.
+
+    With resume_from set, the first resume_from bytes of an existing file are kept
+    (and hashed once) and new data is appended after them. throttle, if given, is called
+    with each chunk size and returns the seconds to pause (bandwidth limit).
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        expected_size: Optional[int] = None,
+        resume_from: int = 0,
+        throttle: Optional[Callable[[int], float]] = None,
+    ):
+        self.file_path = file_path
+        self.expected_size = expected_size
+        self.throttle = throttle
+        self.bytes_written = resume_from
+        self.md5 = hashlib.md5()
+        if resume_from:
+            self.handle = open(file_path, "r+b")
+            remaining = resume_from
+            while remaining > 0:
+                chunk = self.handle.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    self.handle.close()
+                    raise EOFError(f"{file_path} is shorter than the resume offset")
+                self.md5.update(chunk)
+                remaining -= len(chunk)
+            self.handle.truncate(resume_from)
+        else:
+            self.handle = open(file_path, "wb")
+
+    def write(self, data: bytes) -> int:
+        """Writes a chunk, failing as soon as the data exceeds the expected size."""
+        self.bytes_written += len(data)
+        if self.expected_size and self.bytes_written > self.expected_size:
+            raise ValueError(
+                f"Received more data than expected ({self.bytes_written:,} > {self.expected_size:,} bytes)"
+            )
+        self.md5.update(data)
+        written = self.handle.write(data)
+        if self.throttle is not None:
+            delay = self.throttle(len(data))
+            if delay > 0:
+                time.sleep(delay)
+        return written
+
+    def hexdigest(self) -> str:
+        """Returns the MD5 checksum of everything written so far."""
+        return self.md5.hexdigest()
+
+    def close(self) -> None:
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def stream_download(
+    file_uri: str,
+    file_name: str,
+    logger,
+    expected_size: Optional[int] = None,
+    resume_from: int = 0,
+    throttle: Optional[Callable[[int], float]] = None,
+) -> Tuple[bool, Optional[str], int]:
+    """
+    Downloads a file with wget, hashing the bytes as they arrive.
+
+    wget writes the transfer to stdout and this function tees it into the target file
+    and an MD5 digest. When the remote size is known the transfer is aborted as soon as
+    more data than expected arrives, and a short transfer is reported as a failure.
+
+    Args:
+        file_uri (str): URI of the file (FTP, HTTP, or HTTPS)
+        file_name (str): Local path to write to
+        logger (logging.Logger): Logger instance
+        expected_size (int): Remote file size in bytes, if known
+        resume_from (int): Bytes of file_name to keep; wget starts at this offset
+        throttle (callable): Bandwidth pacing callback from the transfer scheduler
+
+    Returns:
+        Tuple[bool, Optional[str], int]: Success, MD5 checksum and total file size
+    """
+    wget_command = [
+        "wget",
+        "--timeout=30",
+        "--tries=1",  # retries are driven by the retry policy
+        "--no-verbose",
+        "-O",
+        "-",
+        file_uri,
+    ]
+    if resume_from:
+        wget_command.insert(-1, f"--start-pos={resume_from}")
+    logger.info(f"Running command: {' '.join(wget_command)} > {file_name}")
+
+    # stderr goes to a temporary file so a chatty wget can never block on a full pipe
+    with TemporaryFile() as stderr_file, HashingWriter(
+        file_name, expected_size, resume_from, throttle
+    ) as writer:
+        p = Popen(wget_command, stdout=PIPE, stderr=stderr_file)
+        try:
+            while True:
+                chunk = p.stdout.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+        except Exception as e:
+            p.kill()
+            logger.error(f"Download aborted: {str(e)}")
+            return False, None, writer.bytes_written
+        finally:
+            p.stdout.close()
+            p.wait()
+
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode("utf-8", errors="replace")
+
+    if p.returncode != 0:
+        logger.error(f"wget failed with return code {p.returncode}")
+        logger.error(f"Error: {stderr}")
+        return False, None, writer.bytes_written
+
+    if stderr:
+        logger.info(f"wget stderr: {stderr}")
+
+    if expected_size and writer.bytes_written != expected_size:
+        logger.error(
+            f"Size mismatch - Remote: {expected_size:,} bytes, Local: {writer.bytes_written:,} bytes"
+        )
+        return False, None, writer.bytes_written
+
+    return True, writer.hexdigest(), writer.bytes_written
+
+
+def native_http_download(
+    file_uri: str,
+    file_name: str,
+    logger,
+    expected_size: Optional[int] = None,
+    resume_from: int = 0,
+    if_range: Optional[str] = None,
+    segments: int = 1,
+    throttle: Optional[Callable[[int], float]] = None,
+) -> Tuple[bool, Optional[str], int]:
+    """
+    Downloads a file with the pooled in-process HTTP engine, hashing it as it arrives.
+
+    Args:
+        file_uri (str): HTTP or HTTPS URI of the file
+        file_name (str): Local path to write to
+        logger (logging.Logger): Logger instance
+        expected_size (int): Remote file size in bytes, if known
+        resume_from (int): Bytes of file_name to keep and resume after
+        if_range (str): ETag or Last-Modified value guarding the resumed range
+        segments (int): Byte ranges to fetch concurrently for files above the threshold
+        throttle (callable): Bandwidth pacing callback from the transfer scheduler
+
+    Returns:
+        Tuple[bool, Optional[str], int]: Success, MD5 checksum and total file size
+
+    Raises:
+        PermanentError: The server refused the file (4xx other than timeouts and rate limits)
+    """
+    engine = get_engine(DOWNLOAD_SETTINGS["http_connections_per_host"])
+    logger.info(f"Fetching {file_uri} with native HTTP engine")
+    if resume_from:
+        # A resumed single stream beats fetching the whole file again in segments
+        result = engine.download(
+            file_uri,
+            file_name,
+            expected_size=expected_size,
+            resume_from=resume_from,
+            if_range=if_range,
+            throttle=throttle,
+        )
+        if result.success and not result.resumed_from:
+            logger.warning("Server did not honour the resume range; downloaded from byte 0")
+    elif segments > 1:
+        result = engine.download_segmented(
+            file_uri,
+            file_name,
+            segments=segments,
+            threshold=DOWNLOAD_SETTINGS["segment_threshold"],
+            expected_size=expected_size,
+            throttle=throttle,
+        )
+    else:
+        result = engine.download(
+            file_uri, file_name, expected_size=expected_size, throttle=throttle
+        )
+    logger.info(f"Transfer stats: {json.dumps(result.as_dict())}")
+
+    if not result.success:
+        if result.status and 400 <= result.status < 500 and result.status not in RETRYABLE_4XX:
+            raise PermanentError(result.error)
+        logger.error(f"HTTP transfer failed: {result.error}")
+        return False, None, result.resumed_from + result.bytes_received
+    return True, result.md5, result.resumed_from + result.bytes_received
+
+
+def native_ftp_download(
+    fasta_uri: str,
+    file_name: str,
+    logger,
+    expected_size: Optional[int] = None,
+    resume_from: int = 0,
+    segments: int = 1,
+    throttle: Optional[Callable[[int], float]] = None,
+) -> Tuple[bool, Optional[str], int]:
+    """
+    Downloads a file over a pooled, already authenticated FTP session, hashing it as it arrives.
+
+    Args:
+        fasta_uri (str): FTP URI of the file
+        file_name (str): Local path to write to
+        logger (logging.Logger): Logger instance
+        expected_size (int): Remote file size in bytes, if known
+        resume_from (int): Bytes of file_name to keep; the transfer restarts (REST) there
+        segments (int): REST-offset segments to fetch concurrently for files above the threshold
+        throttle (callable): Bandwidth pacing callback from the transfer scheduler
+
+    Returns:
+        Tuple[bool, Optional[str], int]: Success, MD5 checksum and total file size
+
+    Raises:
+        PermanentError: The server refused the file (550: missing or not readable)
+    """
+    if not resume_from and segments > 1 and expected_size and expected_size >= DOWNLOAD_SETTINGS["segment_threshold"]:
+        logger.info(f"Fetching {fasta_uri} as {segments} parallel FTP segments")
+        try:
+            written = get_ftp_pool().retrieve_segmented(
+                fasta_uri, file_name, expected_size, segments, throttle
+            )
+        except Exception as e:
+            if isinstance(e, error_perm) and str(e).startswith("550"):
+                raise PermanentError(str(e)) from e
+            logger.error(f"Segmented FTP transfer failed: {str(e)}")
+            return False, None, 0
+        # Segments arrive out of order, so the checksum is taken from the assembled file
+        return True, compute_md5(file_name), written
+
+    logger.info(f"Fetching {fasta_uri} over pooled FTP session")
+    with HashingWriter(file_name, expected_size, resume_from, throttle) as writer:
+        try:
+            get_ftp_pool().retrieve(fasta_uri, writer.write, rest=resume_from or None)
+        except Exception as e:
+            if isinstance(e, error_perm) and str(e).startswith("550"):
+                raise PermanentError(str(e)) from e
+            logger.error(f"FTP transfer failed: {str(e)}")
+            return False, None, writer.bytes_written
+
+    if expected_size and writer.bytes_written != expected_size:
+        logger.error(
+            f"Size mismatch - Remote: {expected_size:,} bytes, Local: {writer.bytes_written:,} bytes"
+        )
+        return False, None, writer.bytes_written
+
+    return True, writer.hexdigest(), writer.bytes_written
+
+
+def restore_from_cache(key: Optional[str], file_name: str, logger) -> bool:
+    """
+    Materializes a cached copy of a download at file_name.
+
+    Returns:
+        bool: True on a cache hit, False on a miss or when caching is disabled
+    """
+    cache = get_download_cache(
+        DOWNLOAD_SETTINGS["cache_dir"], DOWNLOAD_SETTINGS["cache_max_bytes"]
+    )
+    if cache is None or key is None:
+        return False
+    try:
+        method = cache.get(key, file_name)
+    except Exception as e:
+        logger.warning(f"Download cache lookup failed: {str(e)}")
+        return False
+    if method is None:
+        logger.info(f"Download cache miss: {key}")
+        return False
+    logger.info(f"Download cache hit: {key} ({method} to {file_name}), skipping download")
+    return True
+
+
+def is_download_cached(uri: str, md5sum: Optional[str]) -> bool:
+    """
+    Tells whether the file with the expected checksum is already in the download cache.
+    """
+    cache = get_download_cache(
+        DOWNLOAD_SETTINGS["cache_dir"], DOWNLOAD_SETTINGS["cache_max_bytes"]
+    )
+    key = cache_key(uri, md5sum)
+    return bool(cache is not None and key is not None and key in cache.index)
+
+
+def add_to_cache(key: Optional[str], file_name: str, uri: str, logger) -> None:
+    """
+    Adds a completed (and, where possible, verified) download to the cache.
+    """
+    cache = get_download_cache(
+        DOWNLOAD_SETTINGS["cache_dir"], DOWNLOAD_SETTINGS["cache_max_bytes"]
+    )
+    if cache is None or key is None:
+        return
+    try:
+        if cache.put(key, file_name, uri):
+            logger.info(f"Added {file_name} to download cache as {key}")
+        else:
+            logger.info(f"{file_name} is larger than the download cache budget, not cached")
+    except Exception as e:
+        # The download itself succeeded, so a cache failure is not fatal
+        logger.warning(f"Could not add {file_name} to download cache: {str(e)}")
+
+
+def previous_download(uri: str) -> Optional[Dict]:
+    """Returns the validators and cache key recorded for uri by the last successful download."""
+    store = get_validator_store(DOWNLOAD_SETTINGS["cache_dir"])
+    return store.get(uri) if store else None
+
+
+def record_download(
+    uri: str,
+    key: Optional[str],
+    validators: Optional[Dict],
+    previous: Optional[Dict],
+    source: str,
+    logger,
+) -> str:
+    """
+    Records the validators of a completed download and its status for the run summary.
+
+    The file counts as "not_modified" when its content key matches the one recorded by the
+    previous run; otherwise the status is source ("downloaded" or "cached").
+
+    Returns:
+        str: The recorded status
+    """
+    if key is not None and previous and previous.get("key") == key:
+        status = "not_modified"
+    else:
+        status = source
+    DOWNLOAD_STATUS[uri] = status
+    logger.info(f"Download status: {status}")
+
+    store = get_validator_store(DOWNLOAD_SETTINGS["cache_dir"])
+    if store is not None:
+        try:
+            store.record(uri, validators, key)
+        except Exception as e:
+            logger.warning(f"Could not record validators for {uri}: {str(e)}")
+    return status
+
+
+def verify_download_md5(
+    file_name: str, calculated_md5: str, expected_md5: str, logger
+) -> bool:
+    """
+    Compares the MD5 computed during download with the expected checksum.
+    """
+    logger.info(f"Expected MD5: {expected_md5}")
+    logger.info(f"Calculated MD5: {calculated_md5}")
+    if calculated_md5 != expected_md5:
+        logger.error(
+            f"MD5 checksum verification failed:\n"
+            f"  File: {file_name}\n"
+            f"  Expected: {expected_md5}\n"
+            f"  Calculated: {calculated_md5}"
+        )
+        return False
+    logger.info("MD5 checksums match")
+    return True
+
+
+def download_connections(expected_size: Optional[int], resume_from: int = 0) -> int:
+    """
+    Number of connections a download will open: the configured segments for files at or
+    above the segment threshold, otherwise (or when resuming) a single stream.
+    """
+    segments = DOWNLOAD_SETTINGS["segments"]
+    if (
+        segments > 1
+        and not resume_from
+        and expected_size
+        and expected_size >= DOWNLOAD_SETTINGS["segment_threshold"]
+    ):
+        return segments
+    return 1
+
+
+def transfer_callback(
+    throttle: Optional[Callable[[int], float]],
+    progress: Optional[Callable[[int], None]],
+) -> Optional[Callable[[int], float]]:
+    """
+    Combines the scheduler's pacing callback with a caller's progress callback into the
+    per-chunk callback the download engines take. progress may raise TransferCancelled to
+    abort the transfer.
+    """
+    if progress is None:
+        return throttle
+
+    def callback(amount: int) -> float:
+        progress(amount)
+        return throttle(amount) if throttle is not None else 0.0
+
+    return callback
 
 
 def get_files_http(
@@ -617,9 +1059,15 @@ def get_files_http(
     mod: Optional[str] = None,
     store_files: bool = False,
     skip_md5_check: bool = False,
+    file_name: Optional[str] = None,
+    progress: Optional[Callable[[int], None]] = None,
 ) -> bool:
     """
     Downloads files from HTTP/HTTPS sites with controlled output.
+
+    The file is written to file_name (default ../data/<name of the URI>). progress, if given,
+    is called with the size of every chunk received and may cancel the transfer by raising
+    TransferCancelled.
     """
     logger.info(f"Starting HTTP download from: {file_uri}")
     if skip_md5_check:
@@ -629,49 +1077,100 @@ def get_files_http(
         # Ensure data directory exists
         Path("../data").mkdir(parents=True, exist_ok=True)
         
-        file_name = f"../data/{Path(file_uri).name}"
+        file_name = file_name or f"../data/{Path(file_uri).name}"
         logger.info(f"Download target: {file_name}")
 
-        # Download file with system wget for better handling
-        download_start = datetime.now()
+        # The expected MD5 identifies the content without touching the network
+        previous = previous_download(file_uri)
+        verify_md5 = not skip_md5_check and mod != "ZFIN"
+        key = cache_key(file_uri, md5sum) if verify_md5 else None
+        if restore_from_cache(key, file_name, logger):
+            record_download(file_uri, key, None, previous, "cached", logger)
+            if store_files:
+                store_fasta_files(file_name, logger)
+            return True
+
+        # Fail fast while the host's circuit is open rather than wait out its timeouts
+        if not get_retry_policy().available(file_uri):
+            logger.error(f"Skipping {file_uri}: its host failed repeatedly and is cooling down")
+            return False
+
+        validators = get_remote_validators(file_uri, logger, previous)
+        if key is None:
+            # A 304 vouches for the copy cached by the previous download: no body is fetched
+            if validators["not_modified"] and previous.get("key"):
+                key = previous["key"]
+            else:
+                key = cache_key(file_uri, validators=validators)
+            if restore_from_cache(key, file_name, logger):
+                record_download(file_uri, key, validators, previous, "cached", logger)
+                if store_files:
+                    store_fasta_files(file_name, logger)
+                return True
+
+        # Download file, hashing it as it arrives, within the host's connection and bandwidth
+        # limits; failed attempts are retried with backoff and resume from the .part file
+        partial = PartialDownload(file_name, file_uri, validators)
+        scheduler = get_scheduler()
+        transfer: Dict[str, Any] = {}
+
+        def attempt(number: int) -> bool:
+            if progress is not None:
+                progress(0)  # raises TransferCancelled if the transfer was called off
+            # Resume an interrupted transfer if the remote file is unchanged
+            resume_from = partial.resume_offset() if validators.get("ranges") else 0
+            if resume_from:
+                logger.info(f"Resuming {partial.part_file} from byte {resume_from:,}")
+            partial.begin()
+            wanted = 1 if DOWNLOAD_SETTINGS["http_engine"] == "wget" else download_connections(
+                validators.get("size"), resume_from
+            )
+            download_start = datetime.now()
+            with scheduler.slot(file_uri, wanted) as connections:
+                logger.info(f"Transfer slot granted: {connections} connection(s)")
+                throttle = transfer_callback(scheduler.throttle_for(file_uri), progress)
+                if DOWNLOAD_SETTINGS["http_engine"] == "wget":
+                    success, transfer["md5"], transfer["size"] = stream_download(
+                        file_uri,
+                        partial.part_file,
+                        logger,
+                        expected_size=validators.get("size"),
+                        resume_from=resume_from,
+                        throttle=throttle,
+                    )
+                else:
+                    success, transfer["md5"], transfer["size"] = native_http_download(
+                        file_uri,
+                        partial.part_file,
+                        logger,
+                        expected_size=validators.get("size"),
+                        resume_from=resume_from,
+                        if_range=validators.get("etag") or validators.get("modified"),
+                        segments=connections,
+                        throttle=throttle,
+                    )
+            transfer["duration"] = datetime.now() - download_start
+            if not success:
+                if progress is not None:
+                    progress(0)  # raises TransferCancelled if the transfer was called off
+                scheduler.record_failure(file_uri)
+            return success
+
         try:
-            # Use system wget with timeout and progress options
-            wget_command = [
-                "wget",
-                "--timeout=30",
-                "--tries=3",
-                "--no-verbose",
-                "--show-progress",
-                "-O",
-                file_name,
-                file_uri,
-            ]
-
-            logger.info(f"Running command: {' '.join(wget_command)}")
-            p = Popen(wget_command, stdout=PIPE, stderr=PIPE)
-            stdout, stderr = p.communicate()
-
-            download_duration = datetime.now() - download_start
-
-            if p.returncode != 0:
-                error_msg = stderr.decode("utf-8")
-                logger.error(f"wget failed with return code {p.returncode}")
-                logger.error(f"Error: {error_msg}")
+            if not get_retry_policy().call(file_uri, attempt, logger):
+                logger.info(f"Keeping {partial.part_file} for a later resume")
                 return False
-
-            logger.info(f"wget stdout: {stdout.decode('utf-8')}")
-            if stderr:
-                logger.info(f"wget stderr: {stderr.decode('utf-8')}")
-        except Exception as e:
-            logger.error(f"Download command failed: {str(e)}", exc_info=True)
+        except TransferCancelled:
+            logger.info(f"Download from {file_uri} cancelled")
             return False
+        partial.complete()
+        calculated_md5, file_size = transfer["md5"], transfer["size"]
+        download_duration = transfer["duration"]
 
-        # Rest of the function remains the same
-        file_size = Path(file_name).stat().st_size
         logger.info(
             f"Download completed | Size: {file_size:,} bytes | "
             f"Duration: {download_duration} | "
-            f"Speed: {file_size / download_duration.total_seconds() / 1024:.2f} KB/s"
+            f"Speed: {file_size / max(download_duration.total_seconds(), 1e-6) / 1024:.2f} KB/s"
         )
 
         if store_files:
@@ -681,17 +1180,17 @@ def get_files_http(
         # Skip MD5 check if explicitly disabled or for ZFIN
         if skip_md5_check:
             logger.warning("Skipping MD5 check (disabled via --skip-md5-check)")
-            return True
         elif mod == "ZFIN":
             logger.info("Skipping MD5 check for ZFIN")
-            return True
         else:
             logger.info(f"Verifying MD5 checksum: expected={md5sum}")
-            if not check_md5sum(file_name, md5sum, logger):
-                logger.error("MD5 checksum verification failed")
+            if not verify_download_md5(file_name, calculated_md5, md5sum, logger):
                 return False
             logger.info("MD5 checksum verified successfully")
-            return True
+
+        add_to_cache(key, file_name, file_uri, logger)
+        record_download(file_uri, key, validators, previous, "downloaded", logger)
+        return True
 
     except Exception as e:
         logger.error(f"Download failed: {str(e)}", exc_info=True)
@@ -705,9 +1204,13 @@ def get_files_ftp(
     mod: Optional[str] = None,
     store_files: bool = False,
     skip_md5_check: bool = False,
+    file_name: Optional[str] = None,
+    progress: Optional[Callable[[int], None]] = None,
 ) -> bool:
     """
     Downloads files from FTP sites with controlled output.
+
+    file_name and progress work as for get_files_http.
     """
     start_time = datetime.now()
     logger.info(f"Starting FTP download from: {fasta_uri}")
@@ -720,7 +1223,7 @@ def get_files_ftp(
         
         ftp_host = Path(fasta_uri).parts[1]
         ftp_path = "/".join(Path(fasta_uri).parts[2:-1])
-        fasta_file = f"../data/{Path(fasta_uri).name}"
+        fasta_file = file_name or f"../data/{Path(fasta_uri).name}"
         fasta_name = Path(fasta_uri).name
 
         logger.info("FTP Details:")
@@ -736,71 +1239,110 @@ def get_files_ftp(
                 logger.info(f"File already exists in storage: {stored_path}")
                 return False
 
-        # Get remote file size
-        try:
-            remote_size = get_ftp_file_size(fasta_uri, logger)
+        # The expected MD5 identifies the content without touching the network
+        previous = previous_download(fasta_uri)
+        verify_md5 = not skip_md5_check and mod != "ZFIN"
+        key = cache_key(fasta_uri, md5sum) if verify_md5 else None
+        if restore_from_cache(key, fasta_file, logger):
+            record_download(fasta_uri, key, None, previous, "cached", logger)
+            if store_files:
+                store_fasta_files(fasta_file, logger, store_files)
+            return True
+
+        # Get remote file size and modify time
+        # Fail fast while the host's circuit is open rather than wait out its timeouts
+        if not get_retry_policy().available(fasta_uri):
+            logger.error(f"Skipping {fasta_uri}: its host failed repeatedly and is cooling down")
+            return False
+
+        validators = get_remote_validators(fasta_uri, logger, previous)
+        if key is None:
+            # Size and modify time as listed last time: the cached copy is still current
+            if validators["not_modified"] and previous.get("key"):
+                key = previous["key"]
+            else:
+                key = cache_key(fasta_uri, validators=validators)
+            if restore_from_cache(key, fasta_file, logger):
+                record_download(fasta_uri, key, validators, previous, "cached", logger)
+                if store_files:
+                    store_fasta_files(fasta_file, logger, store_files)
+                return True
+        remote_size = validators.get("size")
+        if remote_size:
             logger.info(f"Remote file size: {remote_size:,} bytes")
-        except Exception as e:
-            logger.warning(f"Could not get remote file size: {str(e)}")
-            remote_size = None
+        else:
+            logger.warning("Could not get remote file size")
 
-        # Download file with system wget for better FTP handling
-        download_start = datetime.now()
+        # Download file, hashing it as it arrives; failed attempts are retried with backoff
+        # and resume from the .part file
         logger.info("Starting file download")
+        partial = PartialDownload(fasta_file, fasta_uri, validators)
+        scheduler = get_scheduler()
+        transfer: Dict[str, Any] = {}
+
+        def attempt(number: int) -> bool:
+            if progress is not None:
+                progress(0)  # raises TransferCancelled if the transfer was called off
+            # Resume an interrupted transfer if the remote file is unchanged
+            resume_from = partial.resume_offset()
+            if resume_from:
+                logger.info(f"Resuming {partial.part_file} from byte {resume_from:,}")
+            partial.begin()
+            wanted = 1 if DOWNLOAD_SETTINGS["ftp_engine"] == "wget" else download_connections(
+                remote_size, resume_from
+            )
+            download_start = datetime.now()
+            with scheduler.slot(fasta_uri, wanted) as connections:
+                logger.info(f"Transfer slot granted: {connections} connection(s)")
+                throttle = transfer_callback(scheduler.throttle_for(fasta_uri), progress)
+                if DOWNLOAD_SETTINGS["ftp_engine"] == "wget":
+                    success, transfer["md5"], transfer["size"] = stream_download(
+                        fasta_uri,
+                        partial.part_file,
+                        logger,
+                        expected_size=remote_size or None,
+                        resume_from=resume_from,
+                        throttle=throttle,
+                    )
+                else:
+                    success, transfer["md5"], transfer["size"] = native_ftp_download(
+                        fasta_uri,
+                        partial.part_file,
+                        logger,
+                        expected_size=remote_size or None,
+                        resume_from=resume_from,
+                        segments=connections,
+                        throttle=throttle,
+                    )
+            transfer["duration"] = datetime.now() - download_start
+            if not success:
+                if progress is not None:
+                    progress(0)  # raises TransferCancelled if the transfer was called off
+                scheduler.record_failure(fasta_uri)
+            return success
 
         try:
-            # Use system wget with timeout and progress options
-            wget_command = [
-                "wget",
-                "--timeout=30",
-                "--tries=3",
-                "--no-verbose",
-                "--show-progress",
-                "-O",
-                fasta_file,
-                fasta_uri,
-            ]
-
-            logger.info(f"Running command: {' '.join(wget_command)}")
-            p = Popen(wget_command, stdout=PIPE, stderr=PIPE)
-            stdout, stderr = p.communicate()
-
-            download_duration = datetime.now() - download_start
-
-            if p.returncode != 0:
-                error_msg = stderr.decode("utf-8")
-                logger.error(f"wget failed with return code {p.returncode}")
-                logger.error(f"Error: {error_msg}")
-                return False
-
-            logger.info(f"wget stdout: {stdout.decode('utf-8')}")
-            if stderr:
-                logger.info(f"wget stderr: {stderr.decode('utf-8')}")
-
-            # Rest of the verification code...
-            if Path(fasta_file).exists():
-                local_size = Path(fasta_file).stat().st_size
-                logger.info(
-                    f"Download completed:\n"
-                    f"  Duration: {download_duration}\n"
-                    f"  Local size: {local_size:,} bytes\n"
-                    f"  Speed: {local_size / download_duration.total_seconds() / 1024:.2f} KB/s"
-                )
-
-                if remote_size and remote_size != local_size:
-                    logger.error(
-                        f"Size mismatch - Remote: {remote_size:,} bytes, Local: {local_size:,} bytes"
-                    )
-                    return False
-            else:
-                logger.error("Downloaded file not found")
+            if not get_retry_policy().call(fasta_uri, attempt, logger):
+                logger.info(f"Keeping {partial.part_file} for a later resume")
                 return False
+            partial.complete()
+            calculated_md5, local_size = transfer["md5"], transfer["size"]
+            download_duration = transfer["duration"]
+
+            logger.info(
+                f"Download completed:\n"
+                f"  Duration: {download_duration}\n"
+                f"  Local size: {local_size:,} bytes\n"
+                f"  Speed: {local_size / max(download_duration.total_seconds(), 1e-6) / 1024:.2f} KB/s"
+            )
 
+        except TransferCancelled:
+            logger.info(f"Download from {fasta_uri} cancelled")
+            return False
         except Exception as e:
             logger.error(f"Download failed: {str(e)}", exc_info=True)
             return False
 
-        # Rest of the function remains the same...
         if store_files:
             logger.info("Storing original file (store_files=True)")
             try:
@@ -815,29 +1357,25 @@ def get_files_ftp(
             logger.warning("Skipping MD5 check (disabled via --skip-md5-check)")
             duration = datetime.now() - start_time
             logger.info(f"FTP download completed successfully in {duration}")
-            return True
         elif mod == "ZFIN":
             logger.info("Skipping MD5 check for ZFIN")
             duration = datetime.now() - start_time
             logger.info(f"FTP download completed successfully in {duration}")
-            return True
         else:
             logger.info(f"Verifying MD5 checksum: expected={md5sum}")
-            if check_md5sum(fasta_file, md5sum, logger):
+            if verify_download_md5(fasta_file, calculated_md5, md5sum, logger):
                 logger.info("MD5 checksum verification successful")
                 duration = datetime.now() - start_time
                 logger.info(
                     f"FTP download and verification completed successfully in {duration}"
                 )
-                return True
             else:
-                logger.error(
-                    f"MD5 checksum verification failed:\n"
-                    f"  File: {fasta_file}\n"
-                    f"  Expected: {md5sum}"
-                )
                 return False
 
+        add_to_cache(key, fasta_file, fasta_uri, logger)
+        record_download(fasta_uri, key, validators, previous, "downloaded", logger)
+        return True
+
     except Exception as e:
         logger.error(
             f"FTP download process failed:\n  URI: {fasta_uri}\n  Error: {str(e)}",
@@ -846,6 +1384,176 @@ def get_files_ftp(
         return False
 
 
+def local_source(uri: str) -> Optional[Path]:
+    """
+    Finds a copy of uri on local disk.
+
+    file:// URIs name the file directly. For other URIs the configured local mirror is
+    searched, first with the layout of `wget --mirror` (<root>/<host>/<path>), then flat
+    (<root>/<file name>).
+
+    Returns:
+        Optional[Path]: The local file, or None if there is none
+    """
+    parts = urlsplit(uri)
+    if parts.scheme == "file":
+        return Path(unquote(parts.path))
+    root = DOWNLOAD_SETTINGS["local_mirror"]
+    if not root:
+        return None
+    path = unquote(parts.path)
+    for candidate in (
+        Path(root) / (parts.hostname or "") / path.lstrip("/"),
+        Path(root) / Path(path).name,
+    ):
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def local_validators(path: Path) -> Dict[str, Any]:
+    """Returns the size and modify time of a local file in the form of remote validators."""
+    stat = path.stat()
+    return {
+        "size": stat.st_size,
+        "etag": None,
+        "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+        "ranges": True,
+    }
+
+
+def get_files_local(
+    file_uri: str,
+    md5sum: str,
+    logger,
+    mod: Optional[str] = None,
+    store_files: bool = False,
+    skip_md5_check: bool = False,
+    file_name: Optional[str] = None,
+) -> bool:
+    """
+    Provides a file from local disk: a file:// URI, or the local mirror copy of a remote URI.
+
+    The file is materialized at file_name (default ../data/<name of the URI>) by reflink,
+    hardlink or symlink, falling back to a copy, and verified against md5sum like a download.
+    A mirror copy that fails verification is removed from file_name again so the caller can
+    fall back to the network.
+    """
+    source = local_source(file_uri)
+    if source is None or not source.is_file():
+        logger.error(f"No local copy of {file_uri}")
+        return False
+
+    try:
+        file_name = file_name or f"../data/{Path(urlsplit(file_uri).path).name}"
+        Path(file_name).parent.mkdir(parents=True, exist_ok=True)
+        method = materialize(str(source), file_name, symlink=True)
+        logger.info(f"Materialized local copy {source} at {file_name} ({method})")
+
+        verify_md5 = not skip_md5_check and mod != "ZFIN"
+        if verify_md5:
+            logger.info(f"Verifying MD5 checksum: expected={md5sum}")
+            if not verify_download_md5(file_name, compute_md5(file_name), md5sum, logger):
+                Path(file_name).unlink(missing_ok=True)
+                return False
+
+        # Validators of a local mirror copy say nothing about the remote file, so only
+        # file:// URIs record theirs
+        validators = local_validators(source) if file_uri.startswith("file://") else None
+        key = cache_key(file_uri, md5sum) if verify_md5 else cache_key(file_uri, validators=validators)
+        record_download(file_uri, key, validators, previous_download(file_uri), "local", logger)
+
+        if store_files:
+            store_fasta_files(file_name, logger, store_files)
+        return True
+
+    except Exception as e:
+        logger.error(f"Local copy of {file_uri} failed: {str(e)}", exc_info=True)
+        return False
+
+
+def get_remote_validators(
+    file_uri: str, logger, previous: Optional[Dict] = None
+) -> Dict[str, Any]:
+    """
+    Gets the size and change validators of a remote file.
+
+    HTTP/HTTPS files are probed with a HEAD request on the pooled engine (size, ETag,
+    Last-Modified and whether byte ranges are accepted); FTP files are looked up in the
+    cached directory listing (size and modify time); file:// URIs are answered from the file
+    system.
+
+    When the validators of the previous download are given, the HEAD request is made
+    conditional (If-None-Match / If-Modified-Since), so a 304 answers in one round-trip that
+    the file has not changed; for FTP the listing is compared with them.
+
+    Args:
+        file_uri (str): URI of the file (FTP, HTTP, or HTTPS)
+        logger (logging.Logger): Logger instance
+        previous (dict): Validators recorded by the last successful download, if any
+
+    Returns:
+        Dict[str, Any]: "size", "etag", "modified", "ranges" and "not_modified"; missing
+        values are None
+    """
+    validators: Dict[str, Any] = {
+        "size": None,
+        "etag": None,
+        "modified": None,
+        "ranges": False,
+        "not_modified": False,
+    }
+    try:
+        if file_uri.startswith(("http://", "https://")):
+            headers = {}
+            if previous and previous.get("etag"):
+                headers["If-None-Match"] = previous["etag"]
+            if previous and previous.get("modified"):
+                headers["If-Modified-Since"] = previous["modified"]
+            probe = get_engine(DOWNLOAD_SETTINGS["http_connections_per_host"]).head(
+                file_uri, headers
+            )
+            if probe.status == 304 and previous:
+                validators.update(
+                    {name: previous.get(name) for name in ("size", "etag", "modified")},
+                    ranges=bool(previous.get("ranges")),
+                    not_modified=True,
+                )
+                logger.info(f"Remote file not modified since last download: {file_uri}")
+                return validators
+            if not probe.success:
+                logger.warning(f"HEAD request failed for {file_uri}: {probe.error}")
+                return validators
+            size = int(probe.headers.get("content-length", 0) or 0)
+            validators.update(
+                size=size or None,
+                etag=probe.headers.get("etag"),
+                modified=probe.headers.get("last-modified"),
+                ranges=probe.headers.get("accept-ranges", "").lower() == "bytes",
+            )
+        elif file_uri.startswith("file://"):
+            validators.update(local_validators(local_source(file_uri)))
+            validators["not_modified"] = bool(
+                previous
+                and (previous.get("size"), previous.get("modified"))
+                == (validators["size"], validators["modified"])
+            )
+        else:
+            info = get_ftp_pool().file_info(file_uri)
+            if info:
+                validators.update(size=info.get("size"), modified=info.get("modify"), ranges=True)
+                validators["not_modified"] = bool(
+                    previous
+                    and info.get("modify")
+                    and (previous.get("size"), previous.get("modified"))
+                    == (info.get("size"), info.get("modify"))
+                )
+    except Exception as e:
+        logger.warning(f"Could not get remote validators for {file_uri}: {str(e)}")
+    logger.info(f"Remote validators: {json.dumps(validators)}")
+    return validators
+
+
 def get_ftp_file_size(fasta_uri: str, logger) -> int:
     """
     Gets the size of a file from FTP or HTTP/HTTPS server with enhanced logging.
@@ -871,33 +1579,15 @@ def get_ftp_file_size(fasta_uri: str, logger) -> int:
                 logger.warning(f"Couldn't determine size for {fasta_uri}")
                 return 0
 
-        # Handle FTP URLs
+        # Handle FTP URLs from the cached directory listing
         logger.info(f"Getting file size from FTP: {fasta_uri}")
+        info = get_ftp_pool().file_info(fasta_uri)
 
-        # Parse FTP URI
-        ftp_host = Path(fasta_uri).parts[1]
-        ftp_path = "/".join(Path(fasta_uri).parts[2:-1])
-        filename = Path(fasta_uri).name
-
-        logger.info(f"Connecting to FTP server: {ftp_host}")
-
-        # Connect to FTP server
-        ftp = FTP(ftp_host)
-        ftp.login()
-
-        logger.info(f"Navigating to directory: {ftp_path}")
-        ftp.cwd(ftp_path)
-
-        # Get file size
-        size = ftp.size(filename)
-
-        if size is not None:
-            logger.info(f"File size retrieved: {size:,} bytes")
-            ftp.quit()
-            return size
+        if info and info.get("size") is not None:
+            logger.info(f"File size retrieved: {info['size']:,} bytes")
+            return info["size"]
         else:
             logger.error("File size not available")
-            ftp.quit()
             return 0
 
     except Exception as e:
@@ -953,64 +1643,66 @@ def update_genome_browser_map(
             f"Will write to:\n  JSON: {json_file.absolute()}\n  Ruby: {ruby_file.absolute()}"
         )
 
-        # Load existing mappings from JSON if it exists
-        mapping = {}
-        if json_file.exists():
+        # Other runs may update the same maps: read, merge and write them under a lock
+        with get_lock_manager().file(json_file, logger):
+            # Load existing mappings from JSON if it exists
+            mapping = {}
+            if json_file.exists():
+                try:
+                    with open(json_file, "r") as f:
+                        content = f.read()
+                        log_and_print(f"Existing JSON content: {content[:100]}...")
+                        if content.strip():
+                            mapping = json.loads(content)
+                    log_and_print(f"Loaded {len(mapping)} existing mappings")
+                except Exception as e:
+                    log_and_print(
+                        f"Starting fresh due to error reading JSON: {e}", "warning"
+                    )
+
+            # Add new mapping
+            mapping[filename] = browser_url
+            log_and_print(f"Added new mapping. Total mappings now: {len(mapping)}")
+
+            # Write JSON file
             try:
-                with open(json_file, "r") as f:
-                    content = f.read()
-                    log_and_print(f"Existing JSON content: {content[:100]}...")
-                    if content.strip():
-                        mapping = json.loads(content)
-                log_and_print(f"Loaded {len(mapping)} existing mappings")
-            except Exception as e:
+                json_content = json.dumps(mapping, indent=2, sort_keys=True)
+                log_and_print(f"Writing JSON content: {json_content[:100]}...")
+                with open(json_file, "w") as f:
+                    f.write(json_content)
                 log_and_print(
-                    f"Starting fresh due to error reading JSON: {e}", "warning"
+                    f"Wrote JSON file: {json_file} (size: {json_file.stat().st_size} bytes)"
                 )
+            except Exception as e:
+                log_and_print(f"Failed to write JSON file: {e}", "error")
+                return False
 
-        # Add new mapping
-        mapping[filename] = browser_url
-        log_and_print(f"Added new mapping. Total mappings now: {len(mapping)}")
-
-        # Write JSON file
-        try:
-            json_content = json.dumps(mapping, indent=2, sort_keys=True)
-            log_and_print(f"Writing JSON content: {json_content[:100]}...")
-            with open(json_file, "w") as f:
-                f.write(json_content)
-            log_and_print(
-                f"Wrote JSON file: {json_file} (size: {json_file.stat().st_size} bytes)"
-            )
-        except Exception as e:
-            log_and_print(f"Failed to write JSON file: {e}", "error")
-            return False
-
-        # Write Ruby file
-        try:
-            ruby_content = "GENOME_BROWSER_MAP = {\n"
-            for fname, url in sorted(mapping.items()):
-                ruby_content += f"  '{fname}' => '{url}',\n"
-            ruby_content += "}.freeze\n"
-
-            log_and_print(f"Writing Ruby content: {ruby_content[:100]}...")
-            with open(ruby_file, "w") as f:
-                f.write(ruby_content)
-            log_and_print(
-                f"Wrote Ruby file: {ruby_file} (size: {ruby_file.stat().st_size} bytes)"
-            )
-        except Exception as e:
-            log_and_print(f"Failed to write Ruby file: {e}", "error")
-            return False
+            # Write Ruby file
+            try:
+                ruby_content = "GENOME_BROWSER_MAP = {\n"
+                for fname, url in sorted(mapping.items()):
+                    ruby_content += f"  '{fname}' => '{url}',\n"
+                ruby_content += "}.freeze\n"
+
+                log_and_print(f"Writing Ruby content: {ruby_content[:100]}...")
+                with open(ruby_file, "w") as f:
+                    f.write(ruby_content)
+                log_and_print(
+                    f"Wrote Ruby file: {ruby_file} (size: {ruby_file.stat().st_size} bytes)"
+                )
+            except Exception as e:
+                log_and_print(f"Failed to write Ruby file: {e}", "error")
+                return False
 
-        # Final verification
-        if not json_file.exists() or not ruby_file.exists():
-            log_and_print("One or both files missing after writing!", "error")
-            log_and_print(f"JSON exists: {json_file.exists()}", "error")
-            log_and_print(f"Ruby exists: {ruby_file.exists()}", "error")
-            return False
+            # Final verification
+            if not json_file.exists() or not ruby_file.exists():
+                log_and_print("One or both files missing after writing!", "error")
+                log_and_print(f"JSON exists: {json_file.exists()}", "error")
+                log_and_print(f"Ruby exists: {ruby_file.exists()}", "error")
+                return False
 
-        log_and_print("✓ Successfully updated both mapping files")
-        return True
+            log_and_print("✓ Successfully updated both mapping files")
+            return True
 
     except Exception as e:
         log_and_print(f"Failed to update mapping: {str(e)}", "error")
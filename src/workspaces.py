@@ -0,0 +1,209 @@
+"""
+workspaces.py
+
+Per-entry scratch directories. Every entry of a run gets its own workspace under WORKSPACE_ROOT
+that holds its download, the decompressed FASTA and any temporary files of the build, so entries
+whose files share a name (in different MODs or environments) cannot overwrite each other and
+several entries can be in progress at once. The run tracks the workspaces it hands out, accounts
+for the disk space each one uses, and removes them when the entry is done.
+
+Workspaces are named after the entry (<mod>/<environment>/<blast title>), so an interrupted
+download left in one is resumed by the next run; ".part" files survive the removal of a workspace.
+
+Authors: Paulo Nuin, Adam Wright
+Date: October 2026
+"""
+
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from compression import decompressed_name
+from partial_downloads import is_partial_file
+
+WORKSPACE_ROOT = "../data/work"
+
+
+class EntryWorkspace:
+    """The scratch directory of one entry and the files the pipeline keeps in it."""
+
+    def __init__(self, path: Path, entry: Dict):
+        self.path = path
+        self.entry = entry
+        self.name = Path(entry["uri"]).name
+        self.bytes = 0
+        self.peak_bytes = 0
+
+    @property
+    def download_path(self) -> str:
+        """Where the source file of the entry is downloaded to."""
+        return str(self.path / self.name)
+
+    @property
+    def fasta_path(self) -> str:
+        """
+        Where the decompressed FASTA handed to makeblastdb is written. For a download whose
+        name has no compression suffix this is the download itself, decompressed in place if
+        its content turns out to be compressed.
+        """
+        return str(self.path / decompressed_name(self.name))
+
+    def file(self, name: str) -> str:
+        """Path of a temporary file of the entry."""
+        return str(self.path / name)
+
+    def create(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def disk_usage(self) -> int:
+        """Bytes currently used by the files of the workspace."""
+        if not self.path.exists():
+            return 0
+        return sum(f.stat().st_size for f in self.path.rglob("*") if f.is_file())
+
+    def measure(self) -> int:
+        """Records the current disk usage of the workspace and returns it."""
+        self.bytes = self.disk_usage()
+        self.peak_bytes = max(self.peak_bytes, self.bytes)
+        return self.bytes
+
+    def remove(self) -> int:
+        """
+        Deletes the files of the workspace, keeping interrupted downloads for the next run.
+
+        Returns:
+            int: Bytes freed
+        """
+        freed = 0
+        if not self.path.exists():
+            return freed
+        for item in sorted(self.path.rglob("*"), reverse=True):
+            if item.is_dir():
+                try:
+                    item.rmdir()
+                except OSError:
+                    pass
+            elif not is_partial_file(item):
+                freed += item.stat().st_size
+                item.unlink()
+        try:
+            self.path.rmdir()
+        except OSError:
+            pass
+        self.bytes = 0
+        return freed
+
+
+class RunWorkspaces:
+    """
+    Hands out and tracks the workspaces of a run.
+
+    Usage:
+        workspace = get_workspaces().acquire(entry, mod, environment)
+        workspace.create()
+        ... download to workspace.download_path, build from workspace.fasta_path ...
+        get_workspaces().release(workspace, logger)
+
+    Acquiring the same entry again while its workspace is held returns that workspace, so the
+    download and build stages of an entry share it.
+    """
+
+    def __init__(self, root: str = WORKSPACE_ROOT):
+        self.root = Path(root)
+        self.active: Dict[int, EntryWorkspace] = {}
+        self.stats = {"workspaces": 0, "peak_entry_bytes": 0, "peak_run_bytes": 0, "freed_bytes": 0}
+        self._lock = threading.Lock()
+
+    def _path_for(self, entry: Dict, mod: Optional[str], environment: Optional[str]) -> Path:
+        title = re.sub(r"\W+", "_", entry.get("blast_title", "entry")).strip("_") or "entry"
+        base = self.root / (mod or "default") / (environment or "default") / title
+        taken = {workspace.path for workspace in self.active.values()}
+        path, number = base, 1
+        while path in taken:
+            number += 1
+            path = base.with_name(f"{base.name}_{number}")
+        return path
+
+    def acquire(
+        self, entry: Dict, mod: Optional[str] = None, environment: Optional[str] = None
+    ) -> EntryWorkspace:
+        """Returns the workspace of entry, assigning one if it does not have one yet."""
+        with self._lock:
+            workspace = self.active.get(id(entry))
+            if workspace is None:
+                workspace = EntryWorkspace(self._path_for(entry, mod, environment), entry)
+                self.active[id(entry)] = workspace
+                self.stats["workspaces"] += 1
+            return workspace
+
+    def measure(self, workspace: EntryWorkspace) -> int:
+        """Updates the disk accounting of workspace and of the run; returns its usage."""
+        used = workspace.measure()
+        with self._lock:
+            self.stats["peak_entry_bytes"] = max(self.stats["peak_entry_bytes"], used)
+            in_use = sum(held.bytes for held in self.active.values())
+            self.stats["peak_run_bytes"] = max(self.stats["peak_run_bytes"], in_use)
+        return used
+
+    def release(self, workspace: EntryWorkspace, logger=None, keep_files: bool = False) -> None:
+        """
+        Hands back the workspace of a finished entry and deletes its files unless keep_files.
+        Kept workspaces are removed by cleanup().
+        """
+        self.measure(workspace)
+        if logger is not None:
+            logger.info(
+                f"Workspace {workspace.path}: peak usage {workspace.peak_bytes:,} bytes"
+            )
+        if keep_files:
+            return
+        freed = workspace.remove()
+        with self._lock:
+            self.stats["freed_bytes"] += freed
+            self.active.pop(id(workspace.entry), None)
+        self._prune(workspace.path.parent)
+
+    def held(self) -> List[EntryWorkspace]:
+        with self._lock:
+            return list(self.active.values())
+
+    def disk_usage(self) -> int:
+        """Bytes currently used by all workspaces of the run."""
+        return sum(workspace.disk_usage() for workspace in self.held())
+
+    def cleanup(self, logger=None) -> Dict[str, int]:
+        """Removes every workspace still held by the run and returns the counters."""
+        for workspace in self.held():
+            self.release(workspace, logger)
+        return dict(self.stats)
+
+    def _prune(self, directory: Path) -> None:
+        """Removes empty <mod>/<environment> directories left behind under the root."""
+        while directory != self.root and self.root in directory.parents:
+            try:
+                directory.rmdir()
+            except OSError:
+                return
+            directory = directory.parent
+
+
+_WORKSPACES: Optional[RunWorkspaces] = None
+_WORKSPACES_LOCK = threading.Lock()
+
+
+def configure_workspaces(root: str = WORKSPACE_ROOT) -> RunWorkspaces:
+    """Replaces the workspaces of the run with a fresh set under root."""
+    global _WORKSPACES
+    with _WORKSPACES_LOCK:
+        _WORKSPACES = RunWorkspaces(root)
+        return _WORKSPACES
+
+
+def get_workspaces() -> RunWorkspaces:
+    """Returns the workspaces of the run, creating them on first use."""
+    global _WORKSPACES
+    with _WORKSPACES_LOCK:
+        if _WORKSPACES is None:
+            _WORKSPACES = RunWorkspaces()
+        return _WORKSPACES
@@ -4,14 +4,23 @@ conftest.py
 Pytest configuration file with shared fixtures for the AGR BLAST DB Manager tests.
 """
 
+import functools
 import json
+import sys
 import tempfile
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import pytest
 import yaml
 
+# The modules in src import each other by bare name, as they do when run from inside src
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
 
 @pytest.fixture
 def temp_dir():
@@ -150,6 +159,64 @@ def fasta_file(temp_dir, sample_fasta_content):
     return fasta_path
 
 
+class QuietHTTPRequestHandler(SimpleHTTPRequestHandler):
+    """Static file handler speaking HTTP/1.1 (keep-alive) without request logging."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+
+class RangeHTTPRequestHandler(QuietHTTPRequestHandler):
+    """Static file handler that also answers single "Range: bytes=a-b" requests."""
+
+    def end_headers(self):
+        self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        path = Path(self.translate_path(self.path))
+        if not range_header or not path.is_file():
+            return super().do_GET()
+
+        data = path.read_bytes()
+        start, _, end = range_header.split("=", 1)[1].partition("-")
+        start, end = int(start), min(int(end or len(data) - 1), len(data) - 1)
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(data[start:end + 1])
+
+
+def _serve_directory(directory, handler_class):
+    handler = functools.partial(handler_class, directory=str(directory))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    return server
+
+
+@pytest.fixture
+def http_server(temp_dir):
+    """Serve temp_dir over HTTP/1.1 on localhost and yield the base URL."""
+    server = _serve_directory(temp_dir, QuietHTTPRequestHandler)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def range_http_server(temp_dir):
+    """Like http_server, but honouring Range requests."""
+    server = _serve_directory(temp_dir, RangeHTTPRequestHandler)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
 @pytest.fixture
 def mock_slack_client():
     """Mock Slack client."""
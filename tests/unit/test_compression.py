@@ -0,0 +1,248 @@
+"""
+test_compression.py
+
+Unit tests for format detection and decompression of downloaded FASTA files.
+"""
+
+import bz2
+import gzip
+import logging
+import lzma
+import shutil
+import struct
+import subprocess
+import zlib
+from pathlib import Path
+
+import pytest
+
+from src import compression
+from src.compression import (
+    DecompressionError,
+    decompress_file,
+    decompressed_name,
+    detect_format,
+    gzip_member_offsets,
+    implementation,
+    parallel_chunks,
+    stream_decompressed,
+)
+
+LOGGER = logging.getLogger("test_compression")
+FASTA = b">seq1 first\nACGTACGTAC\nGTACGT\n>seq2\nTTTTGGGG\n"
+
+
+def bgzf_block(data: bytes) -> bytes:
+    """One BGZF block: a gzip member whose extra field records the block size."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    deflated = compressor.compress(data) + compressor.flush()
+    header = (
+        b"\x1f\x8b\x08\x04" + b"\x00" * 4 + b"\x00\xff" + struct.pack("<H", 6)
+        + b"BC" + struct.pack("<HH", 2, 18 + len(deflated) + 8 - 1)
+    )
+    return header + deflated + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+def write_compressed(directory: Path, fmt: str) -> Path:
+    if fmt == "gzip":
+        path = directory / "genome.fa.gz"
+        path.write_bytes(gzip.compress(FASTA))
+    elif fmt == "bgzf":
+        path = directory / "genome.fa.gz"
+        path.write_bytes(bgzf_block(FASTA[:20]) + bgzf_block(FASTA[20:]) + bgzf_block(b""))
+    elif fmt == "xz":
+        path = directory / "genome.fa.xz"
+        path.write_bytes(lzma.compress(FASTA))
+    elif fmt == "bz2":
+        path = directory / "genome.fa.bz2"
+        path.write_bytes(bz2.compress(FASTA))
+    else:
+        path = directory / "genome.fa"
+        path.write_bytes(FASTA)
+    return path
+
+
+@pytest.fixture
+def python_only(monkeypatch):
+    """Pretends no decompression tools are installed."""
+    monkeypatch.setattr(compression.shutil, "which", lambda name: None)
+
+
+class TestDetection:
+    """Test recognizing formats by their magic bytes."""
+
+    @pytest.mark.parametrize("fmt", ["gzip", "bgzf", "xz", "bz2", "none"])
+    def test_detect_format(self, temp_dir, fmt):
+        assert detect_format(str(write_compressed(temp_dir, fmt))) == fmt
+
+    def test_extension_is_ignored(self, temp_dir):
+        path = temp_dir / "genome.fa.gz"
+        path.write_bytes(lzma.compress(FASTA))
+
+        assert detect_format(str(path)) == "xz"
+
+    def test_decompressed_name(self):
+        assert decompressed_name("genome.fa.gz") == "genome.fa"
+        assert decompressed_name("genome.fna.zst") == "genome.fna"
+        assert decompressed_name("genome.fa") == "genome.fa"
+
+    def test_implementation_falls_back_to_python(self, python_only):
+        assert implementation("gzip") == "python-gzip"
+        assert implementation("none") == "copy"
+
+
+class TestDecompression:
+    """Test decompressing to disk and into a stream."""
+
+    @pytest.mark.parametrize("fmt", ["gzip", "bgzf", "xz", "bz2"])
+    def test_python_decompression(self, temp_dir, python_only, fmt):
+        source = write_compressed(temp_dir, fmt)
+        dest = temp_dir / "genome.fa.out"
+
+        stats = decompress_file(str(source), str(dest), LOGGER)
+
+        assert dest.read_bytes() == FASTA
+        assert not source.exists()
+        assert stats.method == f"python-{fmt}"
+        assert stats.bytes == len(FASTA)
+
+    @pytest.mark.parametrize("fmt", ["gzip", "xz", "bz2"])
+    def test_tool_decompression(self, temp_dir, fmt):
+        if implementation(fmt).startswith("python-"):
+            pytest.skip(f"no {fmt} tool installed")
+        source = write_compressed(temp_dir, fmt)
+        dest = temp_dir / "genome.fa.out"
+
+        stats = decompress_file(str(source), str(dest), LOGGER, remove_source=False)
+
+        assert dest.read_bytes() == FASTA
+        assert source.exists()
+        assert not stats.method.startswith("python-")
+
+    def test_zstd(self, temp_dir):
+        if not shutil.which("zstd"):
+            pytest.skip("zstd not installed")
+        plain = write_compressed(temp_dir, "none")
+        source = temp_dir / "genome.fa.zst"
+        subprocess.run(["zstd", "-q", str(plain), "-o", str(source)], check=True)
+
+        assert detect_format(str(source)) == "zstd"
+        decompress_file(str(source), str(temp_dir / "out.fa"), LOGGER)
+        assert (temp_dir / "out.fa").read_bytes() == FASTA
+
+    def test_stream_with_header_edit(self, temp_dir, python_only):
+        source = write_compressed(temp_dir, "gzip")
+        dest = temp_dir / "edited.fa"
+
+        with open(dest, "wb") as sink:
+            stream_decompressed(str(source), sink, lambda header: header + b" Caenorhabditis")
+
+        assert dest.read_bytes().splitlines()[0] == b">seq1 first Caenorhabditis"
+        assert dest.read_bytes().splitlines()[3] == b">seq2 Caenorhabditis"
+
+    @pytest.mark.parametrize("tools", [True, False])
+    def test_corrupt_file(self, temp_dir, monkeypatch, tools):
+        if not tools:
+            monkeypatch.setattr(compression.shutil, "which", lambda name: None)
+        source = temp_dir / "genome.fa.gz"
+        source.write_bytes(gzip.compress(FASTA)[:-12])
+        dest = temp_dir / "genome.fa"
+
+        with pytest.raises(DecompressionError):
+            decompress_file(str(source), str(dest), LOGGER)
+
+        assert not dest.exists()
+        assert not Path(f"{dest}.tmp").exists()
+        assert source.exists()
+
+    def test_corrupt_deflate_data(self, temp_dir, python_only):
+        """Damaged compressed data (a zlib error, not a short file) is a DecompressionError."""
+        data = bytearray(gzip.compress(b">seq1\n" + bytes(range(256)) * 400))
+        for i in range(20, len(data) - 20, 7):
+            data[i] ^= 0xFF
+        source = temp_dir / "genome.fa.gz"
+        source.write_bytes(bytes(data))
+
+        with pytest.raises(DecompressionError):
+            decompress_file(str(source), str(temp_dir / "genome.fa"), LOGGER)
+
+    def test_consumer_errors_pass_through(self, temp_dir, python_only):
+        """A sink that stops reading is not mistaken for a corrupt file."""
+        source = write_compressed(temp_dir, "gzip")
+
+        class ClosedPipe:
+            def write(self, data):
+                raise BrokenPipeError(32, "Broken pipe")
+
+        with pytest.raises(BrokenPipeError):
+            stream_decompressed(str(source), ClosedPipe())
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    """Inflates even tiny test files on a thread pool."""
+    monkeypatch.setattr(compression.shutil, "which", lambda name: None)
+    monkeypatch.setattr(compression, "PARALLEL_WORKERS", 4)
+    monkeypatch.setattr(compression, "PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(compression, "BGZF_BATCH", 2)
+
+
+class TestParallelDecompression:
+    """Test inflating BGZF blocks and gzip members on a thread pool."""
+
+    def test_bgzf_blocks_in_order(self, temp_dir, parallel):
+        records = [b">seq%d\n%s\n" % (i, b"ACGT" * i) for i in range(50)]
+        source = temp_dir / "genome.fa.gz"
+        source.write_bytes(b"".join(bgzf_block(record) for record in records) + bgzf_block(b""))
+
+        assert implementation("bgzf", str(source)) == "parallel-bgzf"
+        assert b"".join(parallel_chunks(str(source), "bgzf", workers=4)) == b"".join(records)
+
+    def test_multimember_gzip(self, temp_dir, parallel):
+        members = [gzip.compress(b">seq%d\nACGT\n" % i) for i in range(20)]
+        source = temp_dir / "genome.fa.gz"
+        source.write_bytes(b"".join(members))
+        dest = temp_dir / "genome.fa"
+
+        stats = decompress_file(str(source), str(dest), LOGGER)
+
+        assert stats.method == "parallel-gzip"
+        assert dest.read_bytes() == b"".join(b">seq%d\nACGT\n" % i for i in range(20))
+
+    def test_header_signature_inside_member_is_skipped(self, temp_dir, parallel):
+        # Stored (uncompressed) deflate data lets a gzip signature appear inside a member
+        fake = b"\x1f\x8b\x08\x00junk"
+        first = gzip.compress(b">a\n" + fake + b"\n", compresslevel=0)
+        second = gzip.compress(b">b\nACGT\n")
+        source = temp_dir / "genome.fa.gz"
+        source.write_bytes(first + second)
+
+        assert len(gzip_member_offsets(source.read_bytes())) == 3
+        assert b"".join(parallel_chunks(str(source), "gzip", workers=4)) == (
+            b">a\n" + fake + b"\n>b\nACGT\n"
+        )
+
+    def test_large_member_is_streamed(self, temp_dir, parallel, monkeypatch):
+        monkeypatch.setattr(compression, "MAX_MEMBER_BYTES", 0)
+        source = temp_dir / "genome.fa.gz"
+        source.write_bytes(gzip.compress(FASTA) + gzip.compress(FASTA))
+
+        assert b"".join(parallel_chunks(str(source), "gzip", workers=2)) == FASTA * 2
+
+    def test_single_member_gzip_is_not_parallel(self, temp_dir, parallel):
+        source = write_compressed(temp_dir, "gzip")
+
+        assert implementation("gzip", str(source)) == "python-gzip"
+
+    @pytest.mark.parametrize("fmt", ["bgzf", "gzip"])
+    def test_corrupt_block(self, temp_dir, parallel, fmt):
+        source = temp_dir / "genome.fa.gz"
+        if fmt == "bgzf":
+            data = bgzf_block(FASTA) + bgzf_block(FASTA)
+        else:
+            data = gzip.compress(FASTA) + gzip.compress(FASTA)
+        source.write_bytes(data[:-6] + b"\xff" * 2 + data[-4:])
+
+        with pytest.raises(DecompressionError):
+            decompress_file(str(source), str(temp_dir / "genome.fa"), LOGGER)
+        assert not (temp_dir / "genome.fa").exists()
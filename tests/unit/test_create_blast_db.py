@@ -4,6 +4,7 @@ test_create_blast_db.py
 Unit tests for the main create_blast_db module functionality.
 """
 
+import gzip
 import json
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -20,6 +21,13 @@ except ImportError:
     # Fallback for different import structures
     pass
 
+try:
+    from src.create_blast_db import DownloadPrefetcher
+    from src.workspaces import RunWorkspaces
+    PIPELINE_AVAILABLE = True
+except ImportError:
+    PIPELINE_AVAILABLE = False
+
 
 class TestMakeBlastDB:
     """Test makeblastdb function."""
@@ -375,4 +383,257 @@ class TestSpecialMODHandling:
         # Verify copy
         for db_file in test_db_files:
             assert (dest_dir / db_file).exists()
-            assert (dest_dir / db_file).read_text() == "database file content"
\ No newline at end of file
+            assert (dest_dir / db_file).read_text() == "database file content"
+
+
+@pytest.mark.skipif(not PIPELINE_AVAILABLE, reason="Source code not available")
+class TestDownloadPrefetcher:
+    """Test the overlapped download/build pipeline."""
+
+    @pytest.fixture(autouse=True)
+    def workspaces(self, temp_dir, monkeypatch):
+        workspaces = RunWorkspaces(str(temp_dir / "work"))
+        monkeypatch.setattr("src.create_blast_db.get_workspaces", lambda: workspaces)
+        return workspaces
+
+    @staticmethod
+    def _entries(*names):
+        return [
+            {"blast_title": f"db{i}", "uri": f"https://example.com/{name}"}
+            for i, name in enumerate(names)
+        ]
+
+    @patch("src.create_blast_db.setup_entry_logger")
+    @patch("src.create_blast_db.download_entry")
+    def test_prefetch_respects_depth(self, mock_download, mock_logger):
+        """Only `depth` downloads are queued ahead of the entry being built."""
+        mock_download.return_value = True
+        entries = self._entries("a.fa.gz", "b.fa.gz", "c.fa.gz", "d.fa.gz")
+
+        prefetcher = DownloadPrefetcher(entries, "WB", depth=2, workers=2)
+        try:
+            future, _ = prefetcher.take(entries[0])
+            assert future.result() is True
+            queued = [entry["blast_title"] for entry, _, _ in prefetcher.in_flight.values()]
+            assert queued == ["db1", "db2"]
+
+            for entry in entries[1:]:
+                assert prefetcher.take(entry)[0].result() is True
+        finally:
+            prefetcher.close()
+
+        assert mock_download.call_count == 4
+
+    @patch("src.create_blast_db.setup_entry_logger")
+    @patch("src.create_blast_db.download_entry")
+    def test_prefetch_same_file_name_into_separate_workspaces(
+        self, mock_download, mock_logger, workspaces
+    ):
+        """Entries sharing a file name are prefetched together, each into its own workspace."""
+        mock_download.return_value = True
+        entries = self._entries("a.fa.gz", "a.fa.gz", "b.fa.gz")
+
+        prefetcher = DownloadPrefetcher(entries, "WB", depth=3, workers=2, environment="dev")
+        try:
+            prefetcher.take(entries[0])[0].result()
+            assert id(entries[1]) in prefetcher.in_flight
+
+            prefetcher.take(entries[1])[0].result()
+            prefetcher.take(entries[2])[0].result()
+        finally:
+            prefetcher.close()
+
+        targets = {call.args[5].download_path for call in mock_download.call_args_list}
+        assert len(targets) == 3
+
+
+try:
+    from src.create_blast_db import DOWNLOAD_SETTINGS, prefetch_to_cache
+    PREFETCH_AVAILABLE = True
+except ImportError:
+    PREFETCH_AVAILABLE = False
+
+
+@pytest.mark.skipif(not PREFETCH_AVAILABLE, reason="Source code not available")
+class TestPrefetchToCache:
+    """Test warming the download cache without building."""
+
+    @pytest.fixture
+    def config_yaml(self, temp_dir, monkeypatch):
+        entries = [
+            {"blast_title": "A", "uri": "https://example.org/a.fa.gz", "md5sum": "aaa"},
+            {"blast_title": "B", "uri": "https://example.org/b.fa.gz", "md5sum": "bbb"},
+            {"blast_title": "C", "uri": "https://example.org/c.fa.gz", "md5sum": "ccc"},
+            {"blast_title": "A2", "uri": "https://example.org/a.fa.gz", "md5sum": "aaa"},
+        ]
+        (temp_dir / "WB").mkdir()
+        with open(temp_dir / "WB" / "databases.WB.dev.json", "w") as f:
+            json.dump({"data": entries}, f)
+        config_yaml = temp_dir / "global.yaml"
+        with open(config_yaml, "w") as f:
+            yaml.dump({"data_providers": [{"name": "WB", "environments": ["dev"]}]}, f)
+
+        (temp_dir / "src").mkdir()
+        monkeypatch.chdir(temp_dir / "src")
+        monkeypatch.setattr("src.create_blast_db.PREFETCH_DIR", str(temp_dir / "prefetch"))
+        monkeypatch.setitem(DOWNLOAD_SETTINGS, "cache_dir", str(temp_dir / "cache"))
+        monkeypatch.setitem(DOWNLOAD_SETTINGS, "cache_max_bytes", 1024**3)
+        return str(config_yaml)
+
+    @patch("src.create_blast_db.setup_entry_logger")
+    @patch("src.create_blast_db.local_source")
+    @patch("src.create_blast_db.is_download_cached")
+    @patch("src.create_blast_db.fetch_entry_file")
+    def test_fetches_each_missing_file_once(
+        self, mock_fetch, mock_cached, mock_local, mock_logger, config_yaml, temp_dir
+    ):
+        """Cached and locally staged files are skipped; shared files are fetched once."""
+        mock_cached.side_effect = lambda uri, md5sum: uri.endswith("b.fa.gz")
+        mock_local.side_effect = lambda uri: "/staged/c.fa.gz" if uri.endswith("c.fa.gz") else None
+        mock_fetch.return_value = True
+
+        counts = prefetch_to_cache(config_yaml, None, None)
+
+        assert counts == {"fetched": 1, "cached": 1, "local": 1, "failed": 0}
+        assert mock_fetch.call_count == 1
+        entry, mod = mock_fetch.call_args[0][:2]
+        assert entry["uri"] == "https://example.org/a.fa.gz"
+        assert mod == "WB"
+        assert mock_fetch.call_args[1]["target"].startswith(str(temp_dir / "prefetch"))
+        assert not (temp_dir / "prefetch").exists()
+
+    @patch("src.create_blast_db.setup_entry_logger")
+    @patch("src.create_blast_db.local_source", return_value=None)
+    @patch("src.create_blast_db.is_download_cached", return_value=False)
+    @patch("src.create_blast_db.fetch_entry_file", return_value=False)
+    def test_reports_failures(self, mock_fetch, mock_cached, mock_local, mock_logger, config_yaml):
+        counts = prefetch_to_cache(config_yaml, None, None)
+
+        assert counts["failed"] == 3
+
+    def test_needs_the_cache(self, config_yaml, monkeypatch):
+        monkeypatch.setitem(DOWNLOAD_SETTINGS, "cache_dir", None)
+
+        with pytest.raises(ValueError):
+            prefetch_to_cache(config_yaml, None, None)
+
+
+@pytest.mark.skipif(not PIPELINE_AVAILABLE, reason="Source code not available")
+class TestStreamIntoMakeblastdb:
+    """Test piping a decompressed download into a command reading stdin."""
+
+    def test_pipes_decompressed_fasta(self, temp_dir):
+        from src.create_blast_db import stream_into_makeblastdb
+
+        fasta = b">seq1\nACGT\n>seq2\nTTTT\n"
+        workspace = RunWorkspaces(str(temp_dir / "work")).acquire(
+            {"blast_title": "db", "uri": "https://example.org/a.fa.gz"}, "WB", "dev"
+        )
+        workspace.create()
+        Path(workspace.download_path).write_bytes(gzip.compress(fasta))
+        received = temp_dir / "received.fa"
+
+        stdout, stderr, returncode = stream_into_makeblastdb(
+            f"cat > {received}; echo built", workspace.download_path, workspace, MagicMock()
+        )
+
+        assert returncode == 0
+        assert stdout == b"built\n"
+        assert received.read_bytes() == fasta
+        assert sorted(p.name for p in workspace.path.iterdir()) == ["a.fa.gz"]
+
+    def test_command_quitting_early(self, temp_dir, monkeypatch):
+        """A command that stops reading is reported as such, not as a corrupt download."""
+        from src.create_blast_db import stream_into_makeblastdb
+
+        monkeypatch.setattr("shutil.which", lambda name: None)
+        workspace = RunWorkspaces(str(temp_dir / "work")).acquire(
+            {"blast_title": "db", "uri": "https://example.org/a.fa.gz"}, "WB", "dev"
+        )
+        workspace.create()
+        fasta = b"".join(b">seq%d\n%s\n" % (i, b"ACGT" * 64) for i in range(20000))
+        Path(workspace.download_path).write_bytes(gzip.compress(fasta))
+        logger = MagicMock()
+
+        _, stderr, returncode = stream_into_makeblastdb(
+            "head -c 10 > /dev/null; exit 3", workspace.download_path, workspace, logger
+        )
+
+        assert returncode == 3
+        assert b"Decompression failed" not in stderr
+        logger.error.assert_called_once_with("makeblastdb stopped reading its input")
+
+    def test_scans_fasta_on_the_way_in(self, temp_dir):
+        from src.create_blast_db import stream_into_makeblastdb
+        from src.fasta_tools import FastaScanner
+
+        workspace = RunWorkspaces(str(temp_dir / "work")).acquire(
+            {"blast_title": "db", "uri": "https://example.org/a.fa.gz"}, "WB", "dev"
+        )
+        workspace.create()
+        Path(workspace.download_path).write_bytes(gzip.compress(b">seq1\nACGT\n>seq2\nTT\n"))
+        scanner = FastaScanner()
+
+        stream_into_makeblastdb(
+            "cat > /dev/null", workspace.download_path, workspace, MagicMock(), scanner
+        )
+
+        stats = scanner.finish()
+        assert stats.sequences == 2
+        assert stats.residues == 6
+
+    def test_seqids_in_download(self, temp_dir):
+        from src.create_blast_db import seqids_in_download
+
+        source = temp_dir / "a.fa.gz"
+        source.write_bytes(gzip.compress(b">seq1 x\nACGT\n>seq2\nTT\n"))
+
+        assert list(seqids_in_download(str(source))) == [b"seq1", b"seq2"]
+
+    def test_reports_corrupt_input(self, temp_dir):
+        from src.create_blast_db import stream_into_makeblastdb
+
+        workspace = RunWorkspaces(str(temp_dir / "work")).acquire(
+            {"blast_title": "db", "uri": "https://example.org/a.fa.gz"}, "WB", "dev"
+        )
+        workspace.create()
+        Path(workspace.download_path).write_bytes(gzip.compress(b">s\nACGT\n")[:-12])
+
+        _, stderr, returncode = stream_into_makeblastdb(
+            "cat > /dev/null", workspace.download_path, workspace, MagicMock()
+        )
+
+        assert b"Decompression failed" in stderr
+
+
+@pytest.mark.skipif(not PIPELINE_AVAILABLE, reason="Source code not available")
+class TestProcessEntry:
+    """Test preparing the FASTA of an entry for makeblastdb."""
+
+    def test_compressed_download_without_suffix(self, temp_dir, monkeypatch):
+        """A gzip download named like a plain FASTA is still decompressed."""
+        from src import create_blast_db
+
+        fasta = b">seq1\nACGT\n>seq2\nTT\n"
+        workspaces = RunWorkspaces(str(temp_dir / "work"))
+        built = []
+
+        def download(entry, mod, logger, store_files, skip_md5_check, workspace):
+            workspace.create()
+            Path(workspace.download_path).write_bytes(gzip.compress(fasta))
+            return True
+
+        def makeblastdb(entry, output_dir, logger, mod, workspace, stream_input):
+            built.append(Path(workspace.fasta_path).read_bytes())
+            return True
+
+        monkeypatch.setattr(create_blast_db, "get_workspaces", lambda: workspaces)
+        monkeypatch.setattr(create_blast_db, "download_entry", download)
+        monkeypatch.setattr(
+            create_blast_db, "create_db_structure", lambda *args: (str(temp_dir), str(temp_dir))
+        )
+        monkeypatch.setattr(create_blast_db, "run_makeblastdb", makeblastdb)
+        entry = {"blast_title": "db", "uri": "https://example.org/genome.fa", "md5sum": "x"}
+
+        assert create_blast_db.process_entry(entry, "WB", "dev", logger=MagicMock())
+        assert built == [fasta]
@@ -0,0 +1,167 @@
+"""
+test_download_cache.py
+
+Unit tests for the content-addressed download cache.
+"""
+
+import os
+import time
+
+from src import download_cache
+from src.download_cache import DownloadCache, ValidatorStore, cache_key, materialize
+from src.locks import FileLock
+
+MD5 = "0123456789abcdef0123456789abcdef"
+
+
+def make_file(directory, name, size):
+    path = directory / name
+    path.write_bytes(os.urandom(size))
+    return path
+
+
+class TestCacheKey:
+    """Test building cache keys."""
+
+    def test_md5_key(self):
+        """A valid checksum is the key, independent of the URI."""
+        assert cache_key("https://a/x.fa.gz", MD5.upper()) == f"md5-{MD5}"
+        assert cache_key("https://b/y.fa.gz", MD5) == f"md5-{MD5}"
+
+    def test_uri_key_needs_validators(self):
+        """Without a checksum the URI key needs a size and an ETag or modify time."""
+        validators = {"size": 10, "etag": '"abc"', "modified": None}
+        key = cache_key("https://a/x.fa.gz", None, validators)
+
+        assert key.startswith("uri-")
+        assert key != cache_key("https://a/x.fa.gz", None, {**validators, "etag": '"def"'})
+        assert cache_key("https://a/x.fa.gz", "not-a-checksum", {"size": 10}) is None
+
+
+class TestDownloadCache:
+    """Test storing, materializing and evicting cached downloads."""
+
+    def test_put_and_get(self, temp_dir):
+        """A stored file is materialized at the requested path."""
+        cache = DownloadCache(temp_dir / "cache", max_bytes=10_000)
+        src = make_file(temp_dir, "genome.fa.gz", 1000)
+
+        assert cache.put(f"md5-{MD5}", str(src), "https://a/genome.fa.gz")
+        dest = temp_dir / "restored.fa.gz"
+        method = cache.get(f"md5-{MD5}", str(dest))
+
+        assert method in ("reflink", "hardlink", "copy")
+        assert dest.read_bytes() == src.read_bytes()
+        assert cache.stats["hits"] == 1
+
+    def test_miss(self, temp_dir):
+        """Unknown keys are reported as misses."""
+        cache = DownloadCache(temp_dir / "cache", max_bytes=10_000)
+
+        assert cache.get("md5-unknown", str(temp_dir / "x")) is None
+        assert cache.stats["misses"] == 1
+
+    def test_lru_eviction(self, temp_dir):
+        """The least recently used entry is evicted when the budget is exceeded."""
+        cache = DownloadCache(temp_dir / "cache", max_bytes=2500)
+        for name in ("a", "b"):
+            cache.put(f"md5-{name}", str(make_file(temp_dir, name, 1000)))
+            time.sleep(0.01)
+        cache.get("md5-a", str(temp_dir / "restored"))
+
+        cache.put("md5-c", str(make_file(temp_dir, "c", 1000)))
+
+        assert set(cache.index) == {"md5-a", "md5-c"}
+        assert not (cache.objects / "md5-b").exists()
+        assert cache.stats["evicted"] == 1
+
+    def test_oversized_file_not_cached(self, temp_dir):
+        """Files larger than the whole budget are not stored."""
+        cache = DownloadCache(temp_dir / "cache", max_bytes=100)
+
+        assert not cache.put("md5-big", str(make_file(temp_dir, "big", 1000)))
+        assert cache.index == {}
+
+    def test_index_survives_restart(self, temp_dir):
+        """A new cache instance picks up entries from the index on disk."""
+        DownloadCache(temp_dir / "cache", max_bytes=10_000).put(
+            "md5-a", str(make_file(temp_dir, "a", 100))
+        )
+
+        reopened = DownloadCache(temp_dir / "cache", max_bytes=10_000)
+
+        assert "md5-a" in reopened.index
+
+    def test_caches_shared_between_runs(self, temp_dir):
+        """Two runs sharing a cache directory do not drop each other's index entries."""
+        first = DownloadCache(temp_dir / "cache", max_bytes=10_000)
+        second = DownloadCache(temp_dir / "cache", max_bytes=10_000)
+
+        first.put("md5-a", str(make_file(temp_dir, "a", 100)))
+        second.put("md5-b", str(make_file(temp_dir, "b", 100)))
+
+        assert set(DownloadCache(temp_dir / "cache", max_bytes=10_000).index) == {
+            "md5-a",
+            "md5-b",
+        }
+        assert first.get("md5-b", str(temp_dir / "restored")) is not None
+
+    def test_object_in_use_is_not_evicted(self, temp_dir):
+        """An object another run is reading stays, even if it is the least recently used."""
+        cache = DownloadCache(temp_dir / "cache", max_bytes=2500)
+        for name in ("a", "b"):
+            cache.put(f"md5-{name}", str(make_file(temp_dir, name, 1000)))
+            time.sleep(0.01)
+
+        with FileLock(cache.locks / "md5-a.lock", shared=True):
+            cache.put("md5-c", str(make_file(temp_dir, "c", 1000)))
+
+        assert set(cache.index) == {"md5-a", "md5-c"}
+
+    def test_materialize_replaces_existing(self, temp_dir):
+        """An existing destination file is replaced."""
+        src = make_file(temp_dir, "src", 100)
+        dest = temp_dir / "dest"
+        dest.write_bytes(b"old")
+
+        materialize(str(src), str(dest))
+
+        assert dest.read_bytes() == src.read_bytes()
+
+    def test_materialize_symlink_across_filesystems(self, temp_dir, monkeypatch):
+        """Without reflinks or hardlinks, a symlink is used only where allowed."""
+
+        def unsupported(*args):
+            raise OSError("cross-device link")
+
+        monkeypatch.setattr(download_cache, "reflink", unsupported)
+        monkeypatch.setattr(download_cache.os, "link", unsupported)
+        src = make_file(temp_dir, "src", 100)
+
+        assert materialize(str(src), str(temp_dir / "linked"), symlink=True) == "symlink"
+        assert (temp_dir / "linked").resolve() == src.resolve()
+        assert materialize(str(src), str(temp_dir / "copied")) == "copy"
+        assert not (temp_dir / "copied").is_symlink()
+
+
+class TestValidatorStore:
+    """Test recording the validators of previous downloads."""
+
+    def test_record_and_reload(self, temp_dir):
+        """Recorded validators are available to the next run."""
+        store = ValidatorStore(temp_dir / "validators.json")
+        store.record("https://a/x.fa.gz", {"size": 10, "etag": '"abc"', "modified": None}, "md5-a")
+
+        record = ValidatorStore(temp_dir / "validators.json").get("https://a/x.fa.gz")
+
+        assert record["etag"] == '"abc"'
+        assert record["key"] == "md5-a"
+
+    def test_cache_hit_keeps_validators(self, temp_dir):
+        """Recording without validators keeps the ones seen before."""
+        store = ValidatorStore(temp_dir / "validators.json")
+        store.record("https://a/x.fa.gz", {"size": 10, "etag": '"abc"'}, "md5-a")
+
+        store.record("https://a/x.fa.gz", None, "md5-a")
+
+        assert store.get("https://a/x.fa.gz")["etag"] == '"abc"'
@@ -0,0 +1,276 @@
+"""
+test_fasta_tools.py
+
+Unit tests for single-pass FASTA scanning.
+"""
+
+import gzip
+import io
+
+import pytest
+
+from src import fasta_tools
+from src.compression import stream_decompressed
+from src.fasta_tools import (
+    FastaScanner,
+    SeqidChecker,
+    check_seqids,
+    HeaderClassifier,
+    HeaderRewriter,
+    classify_headers,
+    header_editor,
+    header_suffix,
+    id_style,
+    read_seqids,
+    rewrite_headers,
+    scan_fasta,
+    seqids_of,
+)
+
+FASTA = (
+    b">gi|12345|ref|NM_000001.1| first gene\n"
+    b"ACGTACGTAC\nGTACGT\n"
+    b">chrI Caenorhabditis elegans\n"
+    b"NNNNACGT\n"
+    b">WBGene00000001|unc-1|protein\n"
+    b"MKLLVVDDAAAAAAAAAAAAAAAA\n"
+)
+
+
+def scan(data: bytes, chunk_size: int) -> "FastaStats":
+    scanner = FastaScanner()
+    for start in range(0, len(data), chunk_size):
+        scanner.feed(data[start : start + chunk_size])
+    return scanner.finish()
+
+ENTRY = {"genus": "Caenorhabditis", "species": "elegans", "version": "WS295"}
+
+
+class TestScanner:
+    """Test what one pass over a FASTA file collects."""
+
+    def test_statistics(self, temp_dir):
+        path = temp_dir / "genome.fa"
+        path.write_bytes(FASTA)
+
+        stats = scan_fasta(str(path))
+
+        assert stats.valid
+        assert stats.sequences == 3
+        assert stats.residues == 16 + 8 + 24
+        assert (stats.min_length, stats.max_length, stats.n50) == (8, 24, 24)
+        assert stats.longest_id == "WBGene00000001|unc-1|protein"
+        assert stats.header_styles == {"ncbi": 1, "pipe": 1, "plain": 1}
+        assert stats.seqid_headers == 2
+        assert stats.to_dict()["longest_id_length"] == 28
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 7, 64])
+    def test_chunk_boundaries_do_not_matter(self, chunk_size):
+        whole = scan(FASTA, len(FASTA)).to_dict()
+
+        assert scan(FASTA, chunk_size).to_dict() == whole
+
+    def test_crlf_and_blank_lines(self):
+        stats = scan(b">s1 x\r\nAC GT\r\n\r\n>s2\r\nTT\r\n", 5)
+
+        assert stats.valid
+        assert stats.residues == 6
+        assert stats.longest_id == "s1"
+
+    def test_last_line_without_newline(self):
+        assert scan(b">s1\nACGT", 3).residues == 4
+
+    @pytest.mark.parametrize(
+        "data, error",
+        [
+            (b"", "line 1: no sequences found"),
+            (b"ACGT\n>s1\nACGT\n", "line 1: sequence data before the first header"),
+            (b">s1\nACGT\n>s2\n>s3\nAC\n", "line 3: header without a sequence"),
+            (b">s1\nACGT\n>\nAC\n", "line 3: header without an ID"),
+        ],
+    )
+    def test_invalid(self, data, error):
+        stats = scan(data, 4)
+
+        assert not stats.valid
+        assert stats.error == error
+
+    def test_greater_than_inside_a_line_is_sequence(self):
+        stats = scan(b">s1\nAC>GT\n", 3)
+
+        assert stats.sequences == 1
+        assert stats.residues == 5
+
+    def test_id_style(self):
+        assert id_style(b"sp|P12345|NAME_HUMAN desc") == "ncbi"
+        assert id_style(b"lcl|contig1") == "ncbi"
+        assert id_style(b"gene|transcript|protein") == "pipe"
+        assert id_style(b"chrI a|b") == "plain"
+        assert id_style(b"chrI") == "plain"
+
+
+class TestHeaderRewriter:
+    """Test streaming rewrites of header lines."""
+
+    def test_suffix_rules(self):
+        assert header_suffix(ENTRY) == b"Caenorhabditis elegans WS295"
+        assert header_suffix({**ENTRY, "seqcol": "S288C"}) == b"S288C Caenorhabditis elegans"
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 16, 1024])
+    def test_only_headers_change(self, chunk_size):
+        rewriter = HeaderRewriter(header_editor(ENTRY))
+        out = b"".join(
+            rewriter.feed(FASTA[start : start + chunk_size])
+            for start in range(0, len(FASTA), chunk_size)
+        ) + rewriter.finish()
+
+        lines = out.splitlines()
+        assert lines[0] == b">gi|12345|ref|NM_000001.1| first gene Caenorhabditis elegans WS295"
+        assert lines[3] == b">chrI Caenorhabditis elegans Caenorhabditis elegans WS295"
+        assert [line for line in lines if not line.startswith(b">")] == [
+            line for line in FASTA.splitlines() if not line.startswith(b">")
+        ]
+        assert rewriter.headers == 3
+
+    def test_rewrite_in_place(self, temp_dir):
+        path = temp_dir / "genome.fa"
+        path.write_bytes(b">s1 \r\nACGT\r\n>s2")
+
+        assert rewrite_headers(str(path), str(path), header_editor(ENTRY), buffer_size=4) == 2
+        assert path.read_bytes() == (
+            b">s1 Caenorhabditis elegans WS295\nACGT\r\n>s2 Caenorhabditis elegans WS295"
+        )
+        assert not (temp_dir / "genome.fa.tmp").exists()
+
+    def test_edit_fasta(self, temp_dir):
+        from src.utils import edit_fasta
+
+        path = temp_dir / "genome.fa"
+        path.write_bytes(b">s1\nACGT\n")
+
+        assert edit_fasta(str(path), {**ENTRY, "seqcol": "N2"})
+        assert path.read_bytes() == b">s1 N2 Caenorhabditis elegans\nACGT\n"
+
+    def test_transform_in_decompression_pipe(self, temp_dir):
+        source = temp_dir / "genome.fa.gz"
+        source.write_bytes(gzip.compress(FASTA))
+        sink = io.BytesIO()
+        scanner = FastaScanner()
+
+        stream_decompressed(str(source), sink, header_editor(ENTRY), tap=scanner.feed)
+
+        assert sink.getvalue().count(b"WS295") == 3
+        assert scanner.finish().residues == 48
+
+
+class TestHeaderClassifier:
+    """Test deciding whether a file needs -parse_seqids."""
+
+    @pytest.mark.parametrize(
+        "header, structured",
+        [
+            (b">sp|P12345|NAME_HUMAN", True),
+            (b">lcl|contig1 assembly", True),
+            (b">WBGene00000001|unc-1|protein", True),
+            (b">chrI Caenorhabditis elegans", False),
+            (b">ref_like|one pipe", False),
+        ],
+    )
+    def test_patterns(self, temp_dir, header, structured):
+        path = temp_dir / "genome.fa"
+        path.write_bytes(header + b"\nACGT\n")
+
+        assert classify_headers(str(path)).needs_parse_seqids is structured
+
+    @pytest.mark.parametrize("chunk_size", [1, 5, 64, 4096])
+    def test_verify_counts_every_header(self, chunk_size):
+        data = (b">plain\nACGT" + b"A" * 100 + b"\n" + b">gi|1|x\nAC\n") * 10
+        classifier = HeaderClassifier(verify=True)
+        for start in range(0, len(data), chunk_size):
+            classifier.feed(data[start : start + chunk_size])
+        result = classifier.finish()
+
+        assert (result.headers, result.matched, result.complete) == (20, 10, True)
+        assert result.fraction == 0.5
+
+    def test_stops_at_first_structured_id(self, temp_dir):
+        path = temp_dir / "genome.fa"
+        path.write_bytes(b">a\nAC\n>b\nAC\n>gi|1|\nAC\n>c\nAC\n")
+
+        result = classify_headers(str(path), buffer_size=4)
+
+        assert (result.headers, result.matched, result.complete) == (3, 1, False)
+
+    def test_sample_decides_from_first_headers(self, temp_dir):
+        path = temp_dir / "genome.fa"
+        path.write_bytes(b">a\nAC\n>b\nAC\n>gi|1|\nAC\n")
+
+        assert not classify_headers(str(path), sample=2).needs_parse_seqids
+        assert classify_headers(str(path), sample=3).needs_parse_seqids
+
+    def test_last_header_without_newline(self):
+        classifier = HeaderClassifier(verify=True)
+        classifier.feed(b">a\nAC\n>gi|1|x")
+
+        assert classifier.finish().matched == 1
+
+
+class TestSeqidPreflight:
+    """Test catching IDs that make makeblastdb -parse_seqids fail."""
+
+    def test_clean_file(self, temp_dir):
+        path = temp_dir / "genome.fa"
+        path.write_bytes(FASTA)
+
+        report = check_seqids(str(path))
+
+        assert report.ok
+        assert report.ids == 3
+
+    def test_duplicates_listed(self, temp_dir):
+        path = temp_dir / "genome.fa"
+        path.write_bytes(b">a x\nAC\n>b\nAC\n>a y\nAC\n>c\nAC\n>b\nAC\n>b\nAC\n")
+
+        report = check_seqids(str(path))
+
+        assert not report.ok
+        assert report.duplicates == 2
+        assert sorted(report.duplicate_examples) == ["a", "b"]
+        assert "2 duplicated IDs" in report.describe()
+
+    def test_long_local_ids(self, temp_dir):
+        path = temp_dir / "genome.fa"
+        long_id = b"x" * 51
+        path.write_bytes(b">" + long_id + b"\nAC\n>gi|" + b"1" * 60 + b"|\nAC\n")
+
+        report = check_seqids(str(path))
+
+        assert report.too_long == 1
+        assert report.too_long_examples == [long_id.decode()]
+
+    def test_hash_collisions_are_rechecked(self, temp_dir, monkeypatch):
+        monkeypatch.setattr(fasta_tools, "hash", lambda seq_id: 1, raising=False)
+        path = temp_dir / "genome.fa"
+        path.write_bytes(b">a\nAC\n>b\nAC\n>c\nAC\n")
+
+        report = check_seqids(str(path))
+
+        assert report.ok
+        assert report.collisions == 1
+
+    def test_fed_by_scanner(self, temp_dir):
+        path = temp_dir / "genome.fa"
+        path.write_bytes(b">a\r\nAC\r\n>a\r\nAC\r\n")
+        checker = SeqidChecker()
+
+        scan_fasta(str(path), seqids=checker)
+
+        assert checker.finish(lambda: seqids_of(str(path))).duplicate_examples == ["a"]
+
+    def test_read_seqids_across_chunks(self):
+        data = b">" + b"a" * 30 + b" desc\n" + b"ACGT" * 100 + b"\n>  b\nAC\n>c"
+
+        assert list(read_seqids(io.BytesIO(data), buffer_size=7)) == [b"a" * 30, b"b", b"c"]
+
+    def test_no_ids(self):
+        assert SeqidChecker().finish().ok
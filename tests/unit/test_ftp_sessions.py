@@ -0,0 +1,152 @@
+"""
+test_ftp_sessions.py
+
+Unit tests for the pooled FTP sessions and MLSD listing cache.
+"""
+
+from ftplib import error_perm
+from unittest.mock import patch
+
+import pytest
+
+from src.ftp_sessions import FtpSessionPool, split_ftp_uri
+
+REMOTE_FILES = {
+    "/pub/wormbase/species": {
+        "a.fa.gz": b"A" * 100,
+        "b.fa.gz": b"B" * 200,
+    },
+}
+
+
+class FakeDataConnection:
+    """Data socket returned by FakeFTP.transfercmd."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def recv(self, size):
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeFTP:
+    """Minimal in-memory stand-in for ftplib.FTP."""
+
+    logins = 0
+    supports_mlsd = True
+
+    def __init__(self, host, timeout=None):
+        self.host = host
+
+    def login(self):
+        FakeFTP.logins += 1
+
+    def voidcmd(self, command):
+        return "200 OK"
+
+    def sendcmd(self, command):
+        return "213 20260101120000"
+
+    def mlsd(self, path, facts=None):
+        if not FakeFTP.supports_mlsd:
+            raise error_perm("500 Unknown command")
+        for name, data in REMOTE_FILES[path].items():
+            yield name, {"type": "file", "size": str(len(data)), "modify": "20260101120000"}
+
+    def size(self, path):
+        directory, _, name = path.rpartition("/")
+        if name not in REMOTE_FILES.get(directory, {}):
+            raise error_perm("550 No such file")
+        return len(REMOTE_FILES[directory][name])
+
+    def retrbinary(self, command, callback, blocksize=8192, rest=None):
+        directory, _, name = command.split(" ", 1)[1].rpartition("/")
+        data = REMOTE_FILES[directory][name][rest or 0:]
+        for start in range(0, len(data), 64):
+            callback(data[start:start + 64])
+
+    def transfercmd(self, command, rest=None):
+        directory, _, name = command.split(" ", 1)[1].rpartition("/")
+        return FakeDataConnection(REMOTE_FILES[directory][name][rest or 0:])
+
+    def voidresp(self):
+        return "226 Transfer complete"
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pool():
+    FakeFTP.logins = 0
+    FakeFTP.supports_mlsd = True
+    with patch("src.ftp_sessions.FTP", FakeFTP):
+        yield FtpSessionPool()
+
+
+class TestFtpSessionPool:
+    """Test session reuse and listing cache."""
+
+    def test_split_ftp_uri(self):
+        """URIs are split into host, directory and file name."""
+        assert split_ftp_uri("ftp://ftp.ebi.ac.uk/pub/wormbase/species/a.fa.gz") == (
+            "ftp.ebi.ac.uk",
+            "/pub/wormbase/species",
+            "a.fa.gz",
+        )
+
+    def test_one_listing_per_directory(self, pool):
+        """Sizes for every file in a directory come from a single MLSD call."""
+        base = "ftp://ftp.ebi.ac.uk/pub/wormbase/species"
+
+        assert pool.file_info(f"{base}/a.fa.gz")["size"] == 100
+        assert pool.file_info(f"{base}/b.fa.gz")["size"] == 200
+        assert pool.file_info(f"{base}/missing.fa.gz") is None
+
+        assert pool.stats["listings"] == 1
+        assert pool.stats["listing_hits"] == 2
+        assert FakeFTP.logins == 1
+
+    def test_retrieve_reuses_session(self, pool):
+        """Retrievals reuse the session that was logged in for the listing."""
+        uri = "ftp://ftp.ebi.ac.uk/pub/wormbase/species/b.fa.gz"
+        pool.file_info(uri)
+
+        chunks = []
+        pool.retrieve(uri, chunks.append)
+        pool.retrieve(uri, chunks.append, rest=150)
+
+        assert b"".join(chunks) == b"B" * 250
+        assert FakeFTP.logins == 1
+        assert pool.stats["sessions_reused"] == 2
+
+    def test_fallback_without_mlsd(self, pool):
+        """Servers without MLSD fall back to SIZE and MDTM."""
+        FakeFTP.supports_mlsd = False
+
+        info = pool.file_info("ftp://ftp.ebi.ac.uk/pub/wormbase/species/a.fa.gz")
+
+        assert info == {"size": 100, "modify": "20260101120000"}
+        assert pool.stats["listings"] == 0
+
+    def test_retrieve_segmented(self, pool, temp_dir):
+        """Segments fetched with REST offsets are assembled in the right order."""
+        REMOTE_FILES["/pub/wormbase/species"]["big.fa.gz"] = bytes(range(256)) * 10
+        target = temp_dir / "big.fa.gz"
+
+        written = pool.retrieve_segmented(
+            "ftp://ftp.ebi.ac.uk/pub/wormbase/species/big.fa.gz", str(target), 2560, 3
+        )
+
+        assert written == 2560
+        assert target.read_bytes() == bytes(range(256)) * 10
@@ -0,0 +1,168 @@
+"""
+test_http_transfer.py
+
+Unit tests for the pooled asyncio HTTP transfer engine.
+"""
+
+import hashlib
+
+import pytest
+
+from src.http_transfer import HttpTransferEngine
+
+
+@pytest.fixture
+def engine():
+    """A private transfer engine that is closed after the test."""
+    transfer_engine = HttpTransferEngine(max_connections_per_host=2, timeout=5)
+    yield transfer_engine
+    transfer_engine.close()
+
+
+class TestHttpTransferEngine:
+    """Test downloads through the transfer engine."""
+
+    def test_download_reports_counters(self, temp_dir, http_server, engine):
+        """A download returns the checksum, byte count and timings."""
+        content = b">seq1\nACGTACGT\n" * 10000
+        (temp_dir / "genome.fa.gz").write_bytes(content)
+        target = temp_dir / "downloaded.fa.gz"
+
+        result = engine.download(f"{http_server}/genome.fa.gz", str(target))
+
+        assert result.success
+        assert result.status == 200
+        assert result.md5 == hashlib.md5(content).hexdigest()
+        assert result.bytes_received == len(content)
+        assert result.time_to_first_byte is not None
+        assert result.as_dict()["bytes"] == len(content)
+        assert target.read_bytes() == content
+
+    def test_download_missing_file(self, temp_dir, http_server, engine):
+        """A 404 is reported as a failed transfer, not an exception."""
+        result = engine.download(f"{http_server}/missing.fa.gz", str(temp_dir / "out"))
+
+        assert not result.success
+        assert result.status == 404
+        assert result.error == "HTTP 404"
+
+    def test_download_size_mismatch(self, temp_dir, http_server, engine):
+        """A Content-Length that differs from the expected size fails early."""
+        (temp_dir / "genome.fa.gz").write_bytes(b"x" * 1000)
+
+        result = engine.download(
+            f"{http_server}/genome.fa.gz", str(temp_dir / "out"), expected_size=10
+        )
+
+        assert not result.success
+        assert result.bytes_received == 0
+
+    def test_connections_are_reused(self, temp_dir, http_server, engine):
+        """Concurrent transfers to one host share the pooled keep-alive connections."""
+        transfers = []
+        for i in range(8):
+            (temp_dir / f"file{i}.fa").write_bytes(f">seq{i}\nACGT\n".encode())
+            transfers.append((f"{http_server}/file{i}.fa", str(temp_dir / f"out{i}.fa")))
+
+        results = engine.download_many(transfers)
+
+        assert all(result.success for result in results)
+        stats = engine.pool_stats()
+        assert stats["transfers"] == 8
+        assert stats["connections_opened"] <= 2
+        assert stats["connections_reused"] >= 6
+
+    def test_head_request(self, temp_dir, http_server, engine):
+        """HEAD returns the headers without a body."""
+        (temp_dir / "genome.fa.gz").write_bytes(b"x" * 1234)
+
+        result = engine.head(f"{http_server}/genome.fa.gz")
+
+        assert result.success
+        assert result.headers["content-length"] == "1234"
+
+
+class TestSegmentedDownload:
+    """Test parallel byte-range downloads."""
+
+    def test_segmented_download(self, temp_dir, range_http_server, engine):
+        """A large file is fetched as several ranges and reassembled intact."""
+        content = bytes(range(256)) * 4000
+        (temp_dir / "genome.fa.gz").write_bytes(content)
+        target = temp_dir / "downloaded.fa.gz"
+
+        result = engine.download_segmented(
+            f"{range_http_server}/genome.fa.gz", str(target), segments=4, threshold=1024
+        )
+
+        assert result.success
+        assert result.segments == 4
+        assert result.bytes_received == len(content)
+        assert result.md5 == hashlib.md5(content).hexdigest()
+        assert target.read_bytes() == content
+
+    def test_falls_back_without_range_support(self, temp_dir, http_server, engine):
+        """Servers that do not advertise ranges are read as a single stream."""
+        content = b"ACGT" * 5000
+        (temp_dir / "genome.fa.gz").write_bytes(content)
+
+        result = engine.download_segmented(
+            f"{http_server}/genome.fa.gz", str(temp_dir / "out"), segments=4, threshold=1024
+        )
+
+        assert result.success
+        assert result.segments == 1
+        assert result.md5 == hashlib.md5(content).hexdigest()
+
+    def test_small_file_single_stream(self, temp_dir, range_http_server, engine):
+        """Files below the threshold are not split."""
+        (temp_dir / "small.fa").write_bytes(b">s\nACGT\n")
+
+        result = engine.download_segmented(
+            f"{range_http_server}/small.fa", str(temp_dir / "out"), segments=4, threshold=1024
+        )
+
+        assert result.success
+        assert result.segments == 1
+
+
+class TestResumedDownload:
+    """Test resuming a download from an existing prefix."""
+
+    def test_resume_appends_remaining_bytes(self, temp_dir, range_http_server, engine):
+        """Only the missing bytes are fetched and the checksum covers the whole file."""
+        content = bytes(range(256)) * 400
+        (temp_dir / "genome.fa.gz").write_bytes(content)
+        target = temp_dir / "genome.fa.gz.part"
+        target.write_bytes(content[:30000])
+
+        result = engine.download(
+            f"{range_http_server}/genome.fa.gz",
+            str(target),
+            expected_size=len(content),
+            resume_from=30000,
+        )
+
+        assert result.success
+        assert result.resumed_from == 30000
+        assert result.bytes_received == len(content) - 30000
+        assert result.md5 == hashlib.md5(content).hexdigest()
+        assert target.read_bytes() == content
+
+    def test_resume_restarts_without_range_support(self, temp_dir, http_server, engine):
+        """A server that ignores Range sends the whole file, which replaces the prefix."""
+        content = b"ACGT" * 5000
+        (temp_dir / "genome.fa.gz").write_bytes(content)
+        target = temp_dir / "genome.fa.gz.part"
+        target.write_bytes(b"stale prefix")
+
+        result = engine.download(
+            f"{http_server}/genome.fa.gz",
+            str(target),
+            expected_size=len(content),
+            resume_from=12,
+        )
+
+        assert result.success
+        assert result.resumed_from == 0
+        assert target.read_bytes() == content
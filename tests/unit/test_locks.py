@@ -0,0 +1,107 @@
+"""
+test_locks.py
+
+Unit tests for the advisory file locks shared by concurrent runs.
+"""
+
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from src import locks
+from src.locks import FileLock, LockManager, LockTimeout, lock_name
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(locks, "POLL_INTERVAL", 0.01)
+
+
+class TestFileLock:
+    """Test exclusive and shared advisory locks."""
+
+    def test_exclusive_lock_excludes_others(self, temp_dir):
+        path = temp_dir / "a.lock"
+
+        with FileLock(path):
+            other = FileLock(path)
+            assert other.acquire(blocking=False) is False
+        assert other.acquire(blocking=False) is True
+        other.release()
+
+    def test_shared_locks_coexist(self, temp_dir):
+        path = temp_dir / "a.lock"
+
+        with FileLock(path, shared=True), FileLock(path, shared=True):
+            assert FileLock(path).acquire(blocking=False) is False
+
+    def test_waits_for_holder(self, temp_dir):
+        path = temp_dir / "a.lock"
+        holder = FileLock(path)
+        holder.acquire()
+        threading.Timer(0.1, holder.release).start()
+
+        waiter = FileLock(path)
+        with waiter:
+            assert waiter.waited >= 0.05
+
+    def test_timeout(self, temp_dir):
+        path = temp_dir / "a.lock"
+
+        with FileLock(path):
+            with pytest.raises(LockTimeout, match="pid"):
+                FileLock(path, timeout=0.05).acquire()
+
+    def test_excludes_other_processes(self, temp_dir):
+        """A lock held by another process is only released when that process lets go."""
+        path = temp_dir / "a.lock"
+        child = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "import fcntl, sys, time\n"
+                f"f = open({str(path)!r}, 'w')\n"
+                "fcntl.flock(f, fcntl.LOCK_EX)\n"
+                "print('locked', flush=True)\n"
+                "time.sleep(0.3)\n",
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            assert child.stdout.readline().strip() == "locked"
+            assert FileLock(path).acquire(blocking=False) is False
+
+            started = time.monotonic()
+            with FileLock(path):
+                assert time.monotonic() - started > 0.05
+        finally:
+            child.wait(5)
+
+
+class TestLockManager:
+    """Test the run-level locks."""
+
+    def test_output_locks_are_per_mod_and_environment(self, temp_dir):
+        manager = LockManager(str(temp_dir / "locks"))
+
+        with manager.output("WB", "dev"):
+            assert manager.output("FB", "dev").acquire(blocking=False)
+            assert manager.output("WB", "dev").acquire(blocking=False) is False
+
+        assert (temp_dir / "locks" / "output" / "WB.dev.lock").exists()
+        assert manager.stats["acquired"] == 2
+
+    def test_file_lock_keyed_by_path(self, temp_dir):
+        manager = LockManager(str(temp_dir / "locks"))
+        map_file = temp_dir / "config" / "genome_browser_map.json"
+
+        with manager.file(map_file):
+            assert manager.file(str(map_file)).acquire(blocking=False) is False
+
+    def test_lock_name(self):
+        assert lock_name("WB", "dev") == "WB.dev"
+        assert lock_name("a b/c", "") == "a_b_c._"
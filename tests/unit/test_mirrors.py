@@ -0,0 +1,123 @@
+"""
+test_mirrors.py
+
+Unit tests for ranking mirror sources and hedged downloads.
+"""
+
+import logging
+import time
+from pathlib import Path
+
+import pytest
+
+from src import mirrors
+from src.mirrors import HedgedDownload, entry_sources, rank_sources
+from src.retry_policy import TransferCancelled
+
+LOGGER = logging.getLogger("test_mirrors")
+
+
+@pytest.fixture(autouse=True)
+def fast_hedging(monkeypatch):
+    """Judges transfers after a short grace period so tests run quickly."""
+    monkeypatch.setitem(mirrors.MIRROR_SETTINGS, "grace_period", 0.1)
+    monkeypatch.setitem(mirrors.MIRROR_SETTINGS, "throughput_floor", 1024 * 1024)
+    monkeypatch.setitem(mirrors.MIRROR_SETTINGS, "check_interval", 0.01)
+
+
+def fake_fetch(behaviour):
+    """
+    Returns a fetch function whose sources behave as described: "fast" writes the file at
+    once, "slow" trickles bytes until cancelled, "fail" fails.
+    """
+    started = []
+
+    def fetch(uri, file_name, progress):
+        started.append(uri)
+        kind = behaviour[uri]
+        if kind == "fail":
+            return False
+        if kind == "slow":
+            try:
+                for _ in range(500):
+                    progress(10)
+                    time.sleep(0.01)
+            except TransferCancelled:
+                Path(file_name + ".part").write_bytes(b"partial")
+                return False
+        Path(file_name).write_bytes(uri.encode())
+        progress(len(uri))
+        return True
+
+    return fetch, started
+
+
+class TestSources:
+    """Test listing and ranking the sources of an entry."""
+
+    def test_entry_sources(self):
+        entry = {
+            "uri": "https://a.org/f.fa.gz",
+            "mirrors": ["ftp://b.org/f.fa.gz", "https://a.org/f.fa.gz"],
+        }
+
+        assert entry_sources(entry) == ["https://a.org/f.fa.gz", "ftp://b.org/f.fa.gz"]
+        assert entry_sources({"uri": "https://a.org/f.fa.gz"}) == ["https://a.org/f.fa.gz"]
+
+    def test_rank_by_probe_latency(self):
+        delays = {"https://slow.org/f": 0.1, "https://fast.org/f": 0.0, "https://dead.org/f": 0.0}
+
+        def probe(uri):
+            time.sleep(delays[uri])
+            return {"size": None if "dead" in uri else 100}
+
+        ranked = rank_sources(list(delays), probe, LOGGER)
+
+        assert ranked == ["https://fast.org/f", "https://slow.org/f", "https://dead.org/f"]
+
+
+class TestHedgedDownload:
+    """Test downloading from the best of several sources."""
+
+    def test_first_source_wins(self, temp_dir):
+        fetch, started = fake_fetch({"https://a.org/f": "fast", "https://b.org/f": "fast"})
+        target = str(temp_dir / "f.fa.gz")
+
+        hedge = HedgedDownload(["https://a.org/f", "https://b.org/f"], target, fetch, LOGGER)
+
+        assert hedge.run() is True
+        assert started == ["https://a.org/f"]
+        assert Path(target).read_bytes() == b"https://a.org/f"
+
+    def test_failed_source_falls_over(self, temp_dir):
+        fetch, started = fake_fetch({"https://a.org/f": "fail", "https://b.org/f": "fast"})
+        target = str(temp_dir / "f.fa.gz")
+
+        hedge = HedgedDownload(["https://a.org/f", "https://b.org/f"], target, fetch, LOGGER)
+
+        assert hedge.run() is True
+        assert started == ["https://a.org/f", "https://b.org/f"]
+        assert hedge.winner.uri == "https://b.org/f"
+
+    def test_slow_source_is_hedged_and_cancelled(self, temp_dir):
+        """A source below the throughput floor gets a hedge; the loser is cleaned up."""
+        fetch, started = fake_fetch({"https://a.org/f": "slow", "https://b.org/f": "fast"})
+        target = str(temp_dir / "f.fa.gz")
+
+        hedge = HedgedDownload(["https://a.org/f", "https://b.org/f"], target, fetch, LOGGER)
+
+        assert hedge.run() is True
+        assert hedge.winner.uri == "https://b.org/f"
+        assert Path(target).read_bytes() == b"https://b.org/f"
+
+        hedge.transfers[0].finished.wait(5)
+        assert sorted(p.name for p in temp_dir.iterdir()) == ["f.fa.gz"]
+
+    def test_all_sources_fail(self, temp_dir):
+        fetch, started = fake_fetch({"https://a.org/f": "fail", "https://b.org/f": "fail"})
+        target = str(temp_dir / "f.fa.gz")
+
+        hedge = HedgedDownload(["https://a.org/f", "https://b.org/f"], target, fetch, LOGGER)
+
+        assert hedge.run() is False
+        assert not Path(target).exists()
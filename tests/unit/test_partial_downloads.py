@@ -0,0 +1,77 @@
+"""
+test_partial_downloads.py
+
+Unit tests for resumable ".part" downloads and their validator sidecars.
+"""
+
+from pathlib import Path
+
+from src.partial_downloads import PartialDownload, is_partial_file
+
+URI = "https://example.org/genome.fa.gz"
+VALIDATORS = {"size": 1000, "etag": '"abc"', "modified": None}
+
+
+def start_partial(temp_dir, validators=VALIDATORS, written=b"A" * 400):
+    """Simulates an interrupted transfer that wrote `written` before dying."""
+    partial = PartialDownload(temp_dir / "genome.fa.gz", URI, validators)
+    partial.begin()
+    Path(partial.part_file).write_bytes(written)
+    return partial
+
+
+class TestPartialDownload:
+    """Test deciding whether an interrupted transfer can be resumed."""
+
+    def test_resumes_when_remote_unchanged(self, temp_dir):
+        """An unchanged remote resumes from the end of the .part file."""
+        start_partial(temp_dir)
+
+        partial = PartialDownload(temp_dir / "genome.fa.gz", URI, VALIDATORS)
+
+        assert partial.resume_offset() == 400
+
+    def test_restarts_when_etag_changes(self, temp_dir):
+        """A changed ETag discards the .part file and sidecar."""
+        start_partial(temp_dir)
+
+        partial = PartialDownload(
+            temp_dir / "genome.fa.gz", URI, {**VALIDATORS, "etag": '"def"'}
+        )
+
+        assert partial.resume_offset() == 0
+        assert not Path(partial.part_file).exists()
+        assert not Path(partial.sidecar_file).exists()
+
+    def test_size_alone_is_not_trusted(self, temp_dir):
+        """Without an ETag or modify time on both sides the transfer starts over."""
+        validators = {"size": 1000, "etag": None, "modified": None}
+        start_partial(temp_dir, validators)
+
+        partial = PartialDownload(temp_dir / "genome.fa.gz", URI, validators)
+
+        assert partial.resume_offset() == 0
+
+    def test_full_size_part_is_discarded(self, temp_dir):
+        """A .part file that already holds every byte is not resumed."""
+        start_partial(temp_dir, written=b"A" * 1000)
+
+        partial = PartialDownload(temp_dir / "genome.fa.gz", URI, VALIDATORS)
+
+        assert partial.resume_offset() == 0
+
+    def test_complete_moves_file_into_place(self, temp_dir):
+        """Completing a download renames the .part file and drops the sidecar."""
+        partial = start_partial(temp_dir, written=b"A" * 1000)
+
+        partial.complete()
+
+        assert (temp_dir / "genome.fa.gz").read_bytes() == b"A" * 1000
+        assert not Path(partial.part_file).exists()
+        assert not Path(partial.sidecar_file).exists()
+
+    def test_is_partial_file(self):
+        """Part files and sidecars are recognised; finished downloads are not."""
+        assert is_partial_file(Path("genome.fa.gz.part"))
+        assert is_partial_file(Path("genome.fa.gz.part.json"))
+        assert not is_partial_file(Path("genome.fa.gz"))
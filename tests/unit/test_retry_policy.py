@@ -0,0 +1,195 @@
+"""
+test_retry_policy.py
+
+Unit tests for download retries with backoff, the retry budget and per-host circuit breakers.
+"""
+
+import logging
+
+import pytest
+
+from src import retry_policy
+from src.retry_policy import CircuitBreaker, PermanentError, RetryPolicy, TransferCancelled
+
+LOGGER = logging.getLogger("test_retry_policy")
+URI = "https://mirror.example.org/pub/genome.fa.gz"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Records backoff delays instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(retry_policy.time, "sleep", delays.append)
+    return delays
+
+
+def failing_attempts(failures):
+    """Returns an attempt function failing the first `failures` times, plus its call log."""
+    calls = []
+
+    def attempt(number):
+        calls.append(number)
+        return len(calls) > failures
+
+    return attempt, calls
+
+
+class TestRetryPolicy:
+    """Test retrying failed attempts."""
+
+    def test_success_after_retries(self, sleeps):
+        policy = RetryPolicy(max_attempts=3, base_delay=1, breaker=CircuitBreaker(10))
+        attempt, calls = failing_attempts(2)
+
+        assert policy.call(URI, attempt, LOGGER) is True
+        assert calls == [1, 2, 3]
+        assert len(sleeps) == 2
+        assert policy.stats["retries"] == 2
+
+    def test_gives_up_after_max_attempts(self, sleeps):
+        policy = RetryPolicy(max_attempts=2, breaker=CircuitBreaker(10))
+        attempt, calls = failing_attempts(5)
+
+        assert policy.call(URI, attempt, LOGGER) is False
+        assert calls == [1, 2]
+
+    def test_exception_counts_as_failure(self, sleeps):
+        policy = RetryPolicy(max_attempts=2, breaker=CircuitBreaker(10))
+        calls = []
+
+        def attempt(number):
+            calls.append(number)
+            if number == 1:
+                raise ConnectionResetError("reset by peer")
+            return True
+
+        assert policy.call(URI, attempt, LOGGER) is True
+        assert calls == [1, 2]
+
+    def test_backoff_is_capped_with_jitter(self):
+        policy = RetryPolicy(base_delay=2, max_delay=5)
+
+        for _ in range(50):
+            assert 0 <= policy.backoff(1) <= 2
+            assert 0 <= policy.backoff(10) <= 5
+
+    def test_budget_is_shared_by_the_run(self, sleeps):
+        """Once the run's retries are spent, failures are final."""
+        policy = RetryPolicy(max_attempts=5, budget=1, breaker=CircuitBreaker(10))
+
+        attempt, calls = failing_attempts(5)
+        assert policy.call(URI, attempt, LOGGER) is False
+        assert calls == [1, 2]
+
+        attempt, calls = failing_attempts(5)
+        assert policy.call("https://other.example.org/a.fa", attempt, LOGGER) is False
+        assert calls == [1]
+
+    def test_permanent_error_is_not_retried(self, sleeps):
+        policy = RetryPolicy(max_attempts=3, breaker=CircuitBreaker(failure_threshold=1))
+        calls = []
+
+        def attempt(number):
+            calls.append(number)
+            raise PermanentError("HTTP 404")
+
+        assert policy.call(URI, attempt, LOGGER) is False
+        assert calls == [1]
+        assert sleeps == []
+        # The host answered, so it is not blamed
+        assert policy.available(URI)
+
+
+class TestCircuitBreaker:
+    """Test failing fast on hosts that keep failing."""
+
+    def test_open_circuit_fails_fast(self, sleeps):
+        policy = RetryPolicy(max_attempts=2, breaker=CircuitBreaker(failure_threshold=2))
+
+        for uri in (URI, "https://mirror.example.org/pub/proteins.fa.gz"):
+            attempt, calls = failing_attempts(5)
+            assert policy.call(uri, attempt, LOGGER) is False
+            assert calls == [1, 2]
+        assert not policy.available(URI)
+
+        # Later transfers from the same host do not even try
+        attempt, calls = failing_attempts(0)
+        assert policy.call(URI, attempt, LOGGER) is False
+        assert calls == []
+        assert policy.stats["failed_fast"] == 2
+        assert policy.stats["circuits_opened"] == 1
+
+        # Other hosts are unaffected
+        assert policy.available("https://other.example.org/a.fa")
+
+    def test_dead_file_does_not_block_its_host(self, sleeps):
+        """Failed attempts at one file count once, not once per attempt."""
+        policy = RetryPolicy(max_attempts=3, breaker=CircuitBreaker(failure_threshold=2))
+
+        attempt, calls = failing_attempts(5)
+        assert policy.call(URI, attempt, LOGGER) is False
+        assert calls == [1, 2, 3]
+
+        healthy = "https://mirror.example.org/pub/proteins.fa.gz"
+        assert policy.available(healthy)
+        attempt, calls = failing_attempts(0)
+        assert policy.call(healthy, attempt, LOGGER) is True
+        assert calls == [1]
+        assert policy.stats["circuits_opened"] == 0
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+
+        breaker.record_failure("example.org")
+        breaker.record_success("example.org")
+        assert breaker.record_failure("example.org") == 0
+        assert breaker.allow("example.org")
+
+    def test_half_open_trial(self, monkeypatch):
+        """After the reset timeout one trial is let through; its outcome decides the state."""
+        now = [1000.0]
+        monkeypatch.setattr(retry_policy.time, "monotonic", lambda: now[0])
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+
+        assert breaker.record_failure("example.org") == 1
+        assert not breaker.allow("example.org")
+
+        now[0] += 60
+        assert breaker.allow("example.org")
+        # Only one trial at a time
+        assert not breaker.allow("example.org")
+        assert breaker.record_failure("example.org") == 2
+        assert breaker.is_open("example.org")
+
+        now[0] += 60
+        assert breaker.allow("example.org")
+        breaker.record_success("example.org")
+        assert not breaker.is_open("example.org")
+        assert breaker.allow("example.org")
+
+    def test_cancelled_trial_is_released(self, monkeypatch):
+        """A trial transfer called off (e.g. by hedging) does not leave the host blocked."""
+        now = [1000.0]
+        monkeypatch.setattr(retry_policy.time, "monotonic", lambda: now[0])
+        policy = RetryPolicy(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+        policy.breaker.record_failure("mirror.example.org")
+        now[0] += 60
+
+        def attempt(number):
+            raise TransferCancelled(URI)
+
+        with pytest.raises(TransferCancelled):
+            policy.call(URI, attempt, LOGGER)
+
+        assert not policy.breaker.is_open("mirror.example.org")
+        assert policy.breaker.allow("mirror.example.org")
+
+    def test_from_config(self):
+        policy = RetryPolicy.from_config(
+            {"max_attempts": 4, "budget": 7, "failure_threshold": 5, "reset_timeout": 30}
+        )
+
+        assert policy.max_attempts == 4
+        assert policy.budget == 7
+        assert policy.breaker.failure_threshold == 5
+        assert policy.breaker.reset_timeout == 30
@@ -0,0 +1,132 @@
+"""
+test_run_planner.py
+
+Unit tests for the run-wide download plan and de-duplication of shared files.
+"""
+
+import json
+from unittest.mock import MagicMock
+
+import yaml
+
+from src.run_planner import (
+    SharedDownloads,
+    format_bytes,
+    plan_downloads,
+    preflight,
+    summarize_preflight,
+)
+
+ENTRY_A = {"blast_title": "A", "uri": "https://example.org/a.fa.gz", "md5sum": "aaa"}
+ENTRY_B = {"blast_title": "B", "uri": "https://example.org/b.fa.gz", "md5sum": "bbb"}
+
+
+def write_config(temp_dir, environments):
+    """Writes a global YAML with one provider and a JSON per environment."""
+    (temp_dir / "WB").mkdir()
+    for env, entries in environments.items():
+        with open(temp_dir / "WB" / f"databases.WB.{env}.json", "w") as f:
+            json.dump({"data": entries}, f)
+    config_yaml = temp_dir / "global.yaml"
+    with open(config_yaml, "w") as f:
+        yaml.dump(
+            {"data_providers": [{"name": "WB", "environments": list(environments)}]}, f
+        )
+    return str(config_yaml)
+
+
+class TestDownloadPlan:
+    """Test resolving the distinct downloads of a run."""
+
+    def test_duplicates_across_environments(self, temp_dir):
+        """The same URI in several environments and twice in one JSON is one download."""
+        config_yaml = write_config(
+            temp_dir,
+            {"dev": [ENTRY_A, ENTRY_B, dict(ENTRY_A, blast_title="A2")], "prod": [ENTRY_A]},
+        )
+
+        plan = plan_downloads(config_yaml, None, None)
+
+        assert plan.total_references() == 4
+        assert plan.distinct() == 2
+        assert plan.consumers((ENTRY_A["uri"], "aaa")) == 3
+
+    def test_filters_match_processing(self, temp_dir):
+        """Database name filters and limits are applied like process_json_entries does."""
+        config_yaml = write_config(temp_dir, {"dev": [ENTRY_A, ENTRY_B]})
+
+        assert plan_downloads(config_yaml, None, None, db_list=["B"]).distinct() == 1
+        assert plan_downloads(config_yaml, None, None, limit_dbs=1).distinct() == 1
+
+
+class TestSharedDownloads:
+    """Test fetching planned files once and fanning them out."""
+
+    def test_fetches_once_and_fans_out(self, temp_dir):
+        """Later consumers get the file without calling the downloader."""
+        config_yaml = write_config(temp_dir, {"dev": [ENTRY_A], "prod": [ENTRY_A]})
+        shared = SharedDownloads(plan_downloads(config_yaml, None, None), temp_dir / "shared")
+        target = temp_dir / "a.fa.gz"
+        download = MagicMock(side_effect=lambda: target.write_bytes(b"ACGT") or True)
+
+        assert shared.fetch(ENTRY_A, download, str(target), MagicMock())
+        target.unlink()
+        assert shared.fetch(ENTRY_A, download, str(target), MagicMock())
+
+        assert download.call_count == 1
+        assert target.read_bytes() == b"ACGT"
+        assert shared.stats["fanned_out"] == 1
+        # The shared copy is dropped after its last consumer
+        assert not any((temp_dir / "shared").iterdir())
+
+    def test_failure_is_not_retried(self, temp_dir):
+        """A failed download is reported to every consumer without fetching again."""
+        config_yaml = write_config(temp_dir, {"dev": [ENTRY_A], "prod": [ENTRY_A]})
+        shared = SharedDownloads(plan_downloads(config_yaml, None, None), temp_dir / "shared")
+        download = MagicMock(return_value=False)
+
+        assert not shared.fetch(ENTRY_A, download, str(temp_dir / "a.fa.gz"), MagicMock())
+        assert not shared.fetch(ENTRY_A, download, str(temp_dir / "a.fa.gz"), MagicMock())
+        assert download.call_count == 1
+
+
+class TestPreflight:
+    """Test sizing a run before it starts."""
+
+    def test_preflight_totals(self, temp_dir):
+        """Sizes are resolved per distinct file and cached files are not fetched."""
+        config_yaml = write_config(
+            temp_dir, {"dev": [ENTRY_A, ENTRY_B], "prod": [ENTRY_A]}
+        )
+        sizes = {ENTRY_A["uri"]: 1000, ENTRY_B["uri"]: 500}
+
+        rows = preflight(
+            plan_downloads(config_yaml, None, None),
+            lambda uri: {"size": sizes[uri]},
+            lambda uri, md5sum: md5sum == "bbb",
+        )
+        totals = summarize_preflight(rows)
+
+        assert totals["entries"] == 3
+        assert totals["distinct_files"] == 2
+        assert totals["cached_files"] == 1
+        assert totals["fetch_bytes"] == 1000
+        assert totals["decompressed_bytes"] > 1500
+
+    def test_unresolved_size(self, temp_dir):
+        """Files whose size cannot be resolved are flagged rather than failing the plan."""
+        config_yaml = write_config(temp_dir, {"dev": [ENTRY_A]})
+
+        rows = preflight(
+            plan_downloads(config_yaml, None, None),
+            lambda uri: {"size": None},
+            lambda uri, md5sum: False,
+        )
+
+        assert rows[0].error == "size unknown"
+        assert summarize_preflight(rows)["unresolved_files"] == 1
+
+    def test_format_bytes(self):
+        assert format_bytes(None) == "?"
+        assert format_bytes(512) == "512 B"
+        assert format_bytes(3 * 1024 * 1024) == "3.0 MB"
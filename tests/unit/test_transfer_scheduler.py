@@ -0,0 +1,262 @@
+"""
+test_transfer_scheduler.py
+
+Unit tests for per-host connection caps, token-bucket bandwidth limits and adaptive concurrency.
+"""
+
+import threading
+import time
+
+import pytest
+
+from src import transfer_scheduler
+from src.transfer_scheduler import (
+    AimdController,
+    HostLimiter,
+    TokenBucket,
+    TransferScheduler,
+    parse_rate,
+)
+
+
+class TestParseRate:
+    """Test parsing bandwidth limits from the YAML."""
+
+    def test_units(self):
+        assert parse_rate(1000) == 1000
+        assert parse_rate("512K") == 512 * 1024
+        assert parse_rate("20MB") == 20 * 1024 * 1024
+        assert parse_rate("1.5 GB/s") == 1.5 * 1024**3
+
+    def test_no_limit(self):
+        assert parse_rate(None) is None
+        assert parse_rate(0) is None
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            parse_rate("fast")
+
+
+class TestTokenBucket:
+    """Test pacing received bytes."""
+
+    def test_burst_is_free_then_paced(self):
+        """The first second of bytes passes; further bytes must wait at the fill rate."""
+        bucket = TokenBucket(rate=1000)
+
+        assert bucket.reserve(1000) == 0
+        assert bucket.reserve(500) == pytest.approx(0.5, abs=0.05)
+        # Debt accumulates so concurrent callers queue behind each other
+        assert bucket.reserve(500) == pytest.approx(1.0, abs=0.05)
+
+
+class TestTransferScheduler:
+    """Test admission of transfers per host."""
+
+    def test_from_config(self):
+        """Host overrides take precedence over the defaults."""
+        scheduler = TransferScheduler.from_config(
+            {
+                "max_connections_per_host": 3,
+                "hosts": {"ftp.ebi.ac.uk": {"max_connections": 1, "bandwidth_limit": "1MB"}},
+            }
+        )
+
+        assert scheduler.connection_limit("ftp://ftp.ebi.ac.uk/pub/a.fa.gz") == 1
+        assert scheduler.connection_limit("https://example.org/a.fa.gz") == 3
+        assert scheduler.throttle_for("https://example.org/a.fa.gz") is None
+        assert scheduler.throttle_for("ftp://ftp.ebi.ac.uk/pub/a.fa.gz") is not None
+
+    def test_host_cap_limits_concurrency(self):
+        """No more than the host cap of transfers run at once."""
+        scheduler = TransferScheduler(max_connections_per_host=2)
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def transfer():
+            with scheduler.slot("https://example.org/file"):
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=transfer) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert peak[0] == 2
+
+    def test_segmented_request_is_capped(self):
+        """A transfer asking for more connections than the cap gets the cap."""
+        scheduler = TransferScheduler(max_connections_per_host=3)
+
+        with scheduler.slot("https://example.org/big", connections=8) as granted:
+            assert granted == 3
+
+    def test_cap_lowered_while_waiting(self):
+        """A waiter asking for more than a newly lowered cap gets the new cap."""
+        limiter = HostLimiter(default_limit=4)
+        limiter.acquire("h", 1)
+        granted = []
+        waiter = threading.Thread(target=lambda: granted.append(limiter.acquire("h", 4)))
+        waiter.start()
+        time.sleep(0.05)
+        assert granted == []
+
+        limiter.set_limit("h", 2)
+        limiter.release("h", 1)
+        waiter.join(timeout=2)
+
+        assert not waiter.is_alive()
+        assert granted == [2]
+        assert limiter.in_use == {"h": 2}
+
+
+class FakeClock:
+    """Stands in for time.monotonic so AIMD windows close on demand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAimdController:
+    """Test the throughput-driven connection cap decisions."""
+
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        clock = FakeClock()
+        monkeypatch.setattr(transfer_scheduler.time, "monotonic", clock)
+        return clock
+
+    def window(self, controller, clock, amount, saturated=True, failures=0):
+        controller.transfer_started("example.org")
+        controller.record("example.org", amount)
+        if saturated:
+            controller.mark_saturated("example.org")
+        for _ in range(failures):
+            controller.record_failure("example.org")
+        clock.now += controller.interval
+        controller.transfer_finished("example.org")
+
+    def test_increase_while_saturated(self, clock):
+        """Busy hosts gain one connection per window while throughput holds."""
+        controller = AimdController(1, 4, interval=10)
+
+        self.window(controller, clock, 100)
+        assert controller.evaluate("example.org", 2) == 3
+        self.window(controller, clock, 150)
+        assert controller.evaluate("example.org", 3) == 4
+        # Upper bound reached
+        self.window(controller, clock, 200)
+        assert controller.evaluate("example.org", 4) is None
+
+    def test_window_still_open(self, clock):
+        controller = AimdController(1, 4, interval=10)
+        controller.record("example.org", 100)
+        controller.mark_saturated("example.org")
+
+        assert controller.evaluate("example.org", 2) is None
+
+    def test_idle_connections_hold(self, clock):
+        """Without demand for more slots there is nothing to gain from raising the cap."""
+        controller = AimdController(1, 4, interval=10)
+
+        self.window(controller, clock, 100, saturated=False)
+        assert controller.evaluate("example.org", 2) is None
+
+    def test_decrease_when_increase_hurts(self, clock):
+        """Throughput falling after an increase halves the cap."""
+        controller = AimdController(1, 8, interval=10)
+
+        self.window(controller, clock, 1000)
+        assert controller.evaluate("example.org", 4) == 5
+        self.window(controller, clock, 600)
+        assert controller.evaluate("example.org", 5) == 2
+
+    def test_decrease_on_failures(self, clock):
+        """Failed transfers halve the cap, never below the lower bound."""
+        controller = AimdController(2, 8, interval=10)
+
+        self.window(controller, clock, 1000, failures=1)
+        assert controller.evaluate("example.org", 6) == 3
+        self.window(controller, clock, 1000, failures=2)
+        assert controller.evaluate("example.org", 3) == 2
+
+    def test_idle_time_is_not_measured(self, clock):
+        """A healthy host that sat idle between files is not mistaken for a slow one."""
+        controller = AimdController(1, 8, interval=10)
+
+        self.window(controller, clock, 1000)
+        assert controller.evaluate("example.org", 4) == 5
+        # The next file transfers as fast as before, but after 50 s with nothing to fetch
+        clock.now += 50
+        self.window(controller, clock, 1000, saturated=False)
+        assert controller.evaluate("example.org", 5) is None
+
+    def test_idle_window_decides_nothing(self, clock):
+        controller = AimdController(1, 8, interval=10)
+
+        self.window(controller, clock, 1000)
+        assert controller.evaluate("example.org", 4) == 5
+        clock.now += 10
+        assert controller.evaluate("example.org", 5) is None
+        assert controller.windows["example.org"]["previous"] == 100
+
+    def test_decisions_are_logged(self, clock):
+        messages = []
+
+        class Logger:
+            def info(self, message):
+                messages.append(message)
+
+        controller = AimdController(1, 4, interval=10, logger=Logger())
+        self.window(controller, clock, 100)
+        controller.evaluate("example.org", 1)
+
+        assert len(messages) == 1
+        assert "example.org: 1 -> 2" in messages[0]
+
+
+class TestAdaptiveScheduler:
+    """Test the scheduler applying AIMD decisions to host caps."""
+
+    def test_configured_caps_clamped_to_bounds(self):
+        scheduler = TransferScheduler.from_config(
+            {
+                "max_connections_per_host": 16,
+                "hosts": {"ftp.ebi.ac.uk": {"max_connections": 1}},
+                "adaptive": {"min_connections": 2, "max_connections": 6},
+            }
+        )
+
+        assert scheduler.connection_limit("https://example.org/a.fa.gz") == 6
+        assert scheduler.connection_limit("ftp://ftp.ebi.ac.uk/pub/a.fa.gz") == 2
+        assert scheduler.max_connections() == 6
+        # Bytes must be accounted even without a bandwidth limit
+        assert scheduler.throttle_for("https://example.org/a.fa.gz") is not None
+
+    def test_reserve_adjusts_host_cap(self, monkeypatch):
+        clock = FakeClock()
+        monkeypatch.setattr(transfer_scheduler.time, "monotonic", clock)
+        scheduler = TransferScheduler(
+            max_connections_per_host=1,
+            adaptive={"min_connections": 1, "max_connections": 3, "interval": 5},
+        )
+        uri = "https://example.org/a.fa.gz"
+
+        with scheduler.slot(uri):
+            scheduler.reserve(uri, 1000)
+            clock.now += 5
+            scheduler.reserve(uri, 1000)
+
+        assert scheduler.connection_limit(uri) == 2
+        assert scheduler.connection_limit("https://other.org/b.fa.gz") == 1
+        assert scheduler.stats["adaptive_decisions"] == 1
+        assert scheduler.stats["host_limits"] == {"example.org": 2}
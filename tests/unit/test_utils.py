@@ -16,13 +16,22 @@ import yaml
 # Try to import from source, skip if not available
 try:
     from src.utils import (
+        HashingWriter,
+        check_md5sum,
+        compute_md5,
         copy_config_file,
         extendable_logger,
         get_files_http,
+        get_files_local,
         get_mod_from_json,
+        get_engine,
+        get_remote_validators,
+        local_source,
         needs_parse_seqids,
         setup_detailed_logger,
+        stream_download,
     )
+    from src import utils
     UTILS_AVAILABLE = True
 except ImportError:
     UTILS_AVAILABLE = False
@@ -254,6 +263,174 @@ class TestFileValidation:
         assert '\n>seq3\n' in content
 
 
+@pytest.mark.skipif(not UTILS_AVAILABLE, reason="Source code not available")
+class TestMD5Verification:
+    """Test streaming MD5 verification."""
+
+    def test_compute_md5_small_buffer(self, temp_dir):
+        """Hashing in chunks smaller than the file gives the same digest."""
+        content = b"ACGT" * 10000
+        test_file = temp_dir / "test.fa.gz"
+        test_file.write_bytes(content)
+
+        assert compute_md5(str(test_file), chunk_size=1000) == hashlib.md5(content).hexdigest()
+
+    def test_check_md5sum(self, temp_dir):
+        """Matching and mismatching checksums are reported."""
+        test_file = temp_dir / "test.fa.gz"
+        test_file.write_bytes(b"test file content")
+        logger = MagicMock()
+
+        assert check_md5sum(str(test_file), hashlib.md5(b"test file content").hexdigest(), logger)
+        assert not check_md5sum(str(test_file), "wrong_md5_hash", logger)
+
+
+@pytest.mark.skipif(not UTILS_AVAILABLE, reason="Source code not available")
+class TestStreamingDownload:
+    """Test hashing downloads while they are written."""
+
+    def test_stream_download_hashes_content(self, temp_dir, http_server):
+        """The digest of the streamed bytes is returned with the file."""
+        content = b">seq1\nACGT\n" * 5000
+        (temp_dir / "remote.fa.gz").write_bytes(content)
+        target = temp_dir / "local.fa.gz"
+
+        success, md5, size = stream_download(
+            f"{http_server}/remote.fa.gz", str(target), MagicMock(), expected_size=len(content)
+        )
+
+        assert success is True
+        assert md5 == hashlib.md5(content).hexdigest()
+        assert size == len(content)
+        assert target.read_bytes() == content
+
+    def test_stream_download_aborts_on_oversize(self, temp_dir, http_server):
+        """A transfer larger than the known remote size is aborted."""
+        (temp_dir / "remote.fa.gz").write_bytes(b"x" * 10000)
+
+        success, md5, _ = stream_download(
+            f"{http_server}/remote.fa.gz", str(temp_dir / "local.fa.gz"), MagicMock(), expected_size=100
+        )
+
+        assert success is False
+        assert md5 is None
+
+    def test_hashing_writer_resumes(self, temp_dir):
+        """A resumed writer keeps the prefix and hashes the complete file."""
+        target = temp_dir / "local.fa.gz.part"
+        target.write_bytes(b"ACGT" * 100 + b"torn write")
+
+        with HashingWriter(str(target), expected_size=800, resume_from=400) as writer:
+            writer.write(b"TGCA" * 100)
+
+        assert target.read_bytes() == b"ACGT" * 100 + b"TGCA" * 100
+        assert writer.bytes_written == 800
+        assert writer.hexdigest() == hashlib.md5(b"ACGT" * 100 + b"TGCA" * 100).hexdigest()
+
+
+@pytest.mark.skipif(not UTILS_AVAILABLE, reason="Source code not available")
+class TestConditionalFetch:
+    """Test deciding whether a remote file changed since the last download."""
+
+    def test_conditional_head_not_modified(self, temp_dir, http_server):
+        """A conditional HEAD with the previous validators is answered with 304."""
+        (temp_dir / "remote.fa.gz").write_bytes(b"ACGT" * 100)
+        uri = f"{http_server}/remote.fa.gz"
+        try:
+            first = get_remote_validators(uri, MagicMock())
+            second = get_remote_validators(uri, MagicMock(), previous=first)
+        finally:
+            get_engine().close()
+
+        assert first["size"] == 400
+        assert first["not_modified"] is False
+        assert second["not_modified"] is True
+        assert second["size"] == 400
+        assert second["modified"] == first["modified"]
+
+    def test_not_modified_restores_without_fetching(self, temp_dir, http_server, monkeypatch):
+        """After a 304 the copy cached by the previous run is used and no body is fetched."""
+        content = b">seq1\nACGT\n" * 100
+        (temp_dir / "remote.fa.gz").write_bytes(content)
+        uri = f"{http_server}/remote.fa.gz"
+        work = temp_dir / "work"
+        work.mkdir()
+        monkeypatch.chdir(work)
+        monkeypatch.setitem(utils.DOWNLOAD_SETTINGS, "cache_dir", str(temp_dir / "cache"))
+        fetch = MagicMock(wraps=utils.native_http_download)
+        monkeypatch.setattr(utils, "native_http_download", fetch)
+        target = temp_dir / "local.fa.gz"
+        try:
+            assert get_files_http(uri, None, MagicMock(), mod="ZFIN", file_name=str(target))
+            assert fetch.call_count == 1
+            target.unlink()
+
+            logger = MagicMock()
+            assert get_files_http(uri, None, logger, mod="ZFIN", file_name=str(target))
+        finally:
+            get_engine().close()
+
+        assert any("not modified" in str(call) for call in logger.info.call_args_list)
+        assert fetch.call_count == 1
+        assert target.read_bytes() == content
+        assert utils.DOWNLOAD_STATUS[uri] == "not_modified"
+
+
+@pytest.mark.skipif(not UTILS_AVAILABLE, reason="Source code not available")
+class TestLocalSources:
+    """Test file:// URIs and the local mirror."""
+
+    @pytest.fixture
+    def mirror(self, temp_dir, monkeypatch):
+        root = temp_dir / "mirror"
+        (root / "ftp.example.org" / "pub").mkdir(parents=True)
+        (root / "ftp.example.org" / "pub" / "genome.fa.gz").write_bytes(b"ACGT" * 100)
+        (root / "flat.fa.gz").write_bytes(b"TTTT")
+        monkeypatch.setitem(utils.DOWNLOAD_SETTINGS, "local_mirror", str(root))
+        return root
+
+    def test_local_source_layouts(self, mirror):
+        assert local_source("file:///data/my%20genome.fa") == Path("/data/my genome.fa")
+        assert local_source("ftp://ftp.example.org/pub/genome.fa.gz") == (
+            mirror / "ftp.example.org" / "pub" / "genome.fa.gz"
+        )
+        assert local_source("https://other.org/any/path/flat.fa.gz") == mirror / "flat.fa.gz"
+        assert local_source("https://other.org/missing.fa.gz") is None
+
+    def test_get_files_local_links_and_verifies(self, temp_dir, mirror):
+        uri = "ftp://ftp.example.org/pub/genome.fa.gz"
+        target = temp_dir / "data" / "genome.fa.gz"
+        md5sum = hashlib.md5(b"ACGT" * 100).hexdigest()
+
+        assert get_files_local(uri, md5sum, MagicMock(), file_name=str(target)) is True
+        assert target.read_bytes() == b"ACGT" * 100
+        # Materialized without copying the data
+        assert target.stat().st_ino == local_source(uri).stat().st_ino
+        assert utils.DOWNLOAD_STATUS[uri] == "local"
+
+    def test_get_files_local_checksum_mismatch(self, temp_dir, mirror):
+        """A stale mirror copy is not left behind for the build."""
+        target = temp_dir / "data" / "flat.fa.gz"
+
+        result = get_files_local(
+            "https://other.org/flat.fa.gz", "0" * 32, MagicMock(), file_name=str(target)
+        )
+
+        assert result is False
+        assert not target.exists()
+
+    def test_file_uri_validators(self, temp_dir):
+        source = temp_dir / "local.fa"
+        source.write_bytes(b">s\nACGT\n")
+
+        first = get_remote_validators(f"file://{source}", MagicMock())
+        second = get_remote_validators(f"file://{source}", MagicMock(), previous=first)
+
+        assert first["size"] == 8
+        assert first["not_modified"] is False
+        assert second["not_modified"] is True
+
+
 @pytest.mark.skipif(not UTILS_AVAILABLE, reason="Source code not available")
 class TestSpecialCases:
     """Test special case handling."""
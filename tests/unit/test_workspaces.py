@@ -0,0 +1,74 @@
+"""
+test_workspaces.py
+
+Unit tests for per-entry workspaces and their disk accounting.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from src.workspaces import RunWorkspaces
+
+ENTRY = {"blast_title": "C. elegans genome", "uri": "https://example.org/genome.fa.gz"}
+
+
+@pytest.fixture
+def workspaces(temp_dir):
+    return RunWorkspaces(str(temp_dir / "work"))
+
+
+class TestWorkspaces:
+    """Test handing out and releasing entry workspaces."""
+
+    def test_same_file_name_in_different_mods(self, workspaces, temp_dir):
+        worm = workspaces.acquire(ENTRY, "WB", "dev")
+        fly = workspaces.acquire(dict(ENTRY), "FB", "dev")
+
+        assert worm.path == temp_dir / "work" / "WB" / "dev" / "C_elegans_genome"
+        assert worm.download_path != fly.download_path
+        assert Path(worm.fasta_path).name == "genome.fa"
+
+    def test_acquire_returns_held_workspace(self, workspaces):
+        first = workspaces.acquire(ENTRY, "WB", "dev")
+
+        assert workspaces.acquire(ENTRY, "WB", "dev") is first
+        # A different entry with the same title gets its own directory
+        assert workspaces.acquire(dict(ENTRY), "WB", "dev").path.name == "C_elegans_genome_2"
+        assert workspaces.stats["workspaces"] == 2
+
+    def test_release_keeps_partial_downloads(self, workspaces, temp_dir):
+        workspace = workspaces.acquire(ENTRY, "WB", "dev")
+        workspace.create()
+        Path(workspace.fasta_path).write_bytes(b"x" * 100)
+        Path(workspace.download_path + ".part").write_bytes(b"x" * 10)
+
+        assert workspaces.measure(workspace) == 110
+        workspaces.release(workspace)
+
+        assert [p.name for p in workspace.path.iterdir()] == ["genome.fa.gz.part"]
+        assert workspaces.stats["peak_entry_bytes"] == 110
+        assert workspaces.stats["freed_bytes"] == 100
+        assert workspaces.held() == []
+
+    def test_release_removes_empty_directories(self, workspaces, temp_dir):
+        workspace = workspaces.acquire(ENTRY, "WB", "dev")
+        workspace.create()
+        Path(workspace.download_path).write_bytes(b"data")
+
+        workspaces.release(workspace)
+
+        assert list((temp_dir / "work").iterdir()) == []
+
+    def test_kept_files_removed_by_cleanup(self, workspaces):
+        workspace = workspaces.acquire(ENTRY, "WB", "dev")
+        workspace.create()
+        Path(workspace.download_path).write_bytes(b"data")
+
+        workspaces.release(workspace, keep_files=True)
+        assert Path(workspace.download_path).exists()
+        assert workspaces.disk_usage() == 4
+
+        stats = workspaces.cleanup()
+        assert not workspace.path.exists()
+        assert stats["freed_bytes"] == 4